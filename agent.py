@@ -1,14 +1,37 @@
 """This module contains SQLAgent Class."""
+import asyncio
 import os
+import threading
 from config import EXAMPLE, Config
 from langchain_community.agent_toolkits import create_sql_agent
+from langchain_core.agents import AgentAction
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_community.callbacks import StreamlitCallbackHandler
-from langchain_core.runnables import RunnableConfig
-from langchain.cache import SQLiteCache
-from langchain.globals import set_llm_cache
-from typing import Any, Dict, Optional
+from langchain_core.runnables import RunnableConfig, RunnablePassthrough
+from typing import Any, Dict, List, Optional
 
+from agent_utils.chart_renderer import shared_chart_renderer
 from agent_utils.extra_tools import visualize_data
+from agent_utils.plan_cache import PlanCache, shared_plan_cache
+from agent_utils.scratchpad import scratchpad_compactor
+from db_connector.abstract_sql_connector import AbstractSQLConnector
+from db_connector.result_store import result_store_scope
+from llms.llm_cache import shared_llm_cache
+
+PLAN_CACHE_SUMMARY_PROMPT = """Answer the question using the result of the SQL query, be concise.
+
+Question: {question}
+
+SQL query:
+{sql}
+
+Result:
+{result}
+
+Answer:"""
+
+# The output of an agent executor stopped by `max_iterations` or `max_execution_time`.
+AGENT_STOPPED_OUTPUT = "Agent stopped due to"
 
 
 def set_env_vars(env_file_path='.env'):
@@ -22,9 +45,24 @@ def set_env_vars(env_file_path='.env'):
       os.environ[key] = value
 
 
-set_env_vars('.env')
+_INITIALIZED = False
+_INIT_LOCK = threading.Lock()
 
-set_llm_cache(SQLiteCache(database_path="data/.langchain.db"))
+
+def init(env_file_path='.env'):
+  """
+  Runs the process setup that is kept out of import time: loads the .env file if it exists.
+
+  It runs once per process, `get_agent` calls it before creating a config. Call it before
+  calling a `Config` factory directly.
+  """
+  global _INITIALIZED
+  with _INIT_LOCK:
+    if _INITIALIZED:
+      return
+    if os.path.exists(env_file_path):
+      set_env_vars(env_file_path)
+    _INITIALIZED = True
 
 
 class SQLAgent():
@@ -42,6 +80,16 @@ class SQLAgent():
     Args:
       config (Config): The configuration for processing queries.
     """
+    if config.llm_cache is not None:
+      config.llm.cache = shared_llm_cache(**config.llm_cache.dict())
+    self.llm = config.llm
+    self.enable_chart = config.enable_chart
+    self.sql_connector = config.sql_connector
+    self.plan_cache_summarize = config.plan_cache_summarize
+    self.plan_cache: Optional[PlanCache] = None
+    if config.enable_plan_cache and isinstance(config.sql_connector, AbstractSQLConnector):
+      self.plan_cache = shared_plan_cache(config.sql_connector.catalog_key(), config.plan_cache_path,
+                                          config.plan_cache_max_plans)
     self.agent_executor = create_sql_agent(llm=config.llm,
                                            toolkit=config.sql_connector,
                                            agent_type=config.agent_type,
@@ -54,26 +102,154 @@ class SQLAgent():
                                                "return_intermediate_steps": True,
                                                "handle_parsing_errors": True,
                                            })
+    agent = self.agent_executor.agent
+    if config.scratchpad_token_budget is not None and hasattr(agent, "runnable"):
+      # Compacts the previous steps before the agent formats them into the scratchpad of the prompt.
+      compactor = scratchpad_compactor(config.scratchpad_token_budget, config.scratchpad_keep_recent)
+      agent.runnable = RunnablePassthrough.assign(intermediate_steps=compactor) | agent.runnable
+
+  def warmup(self):
+    """
+    Prepares the connector, e.g. reflects the schema and opens connections, and starts the
+    chart workers ahead of the first question.
+    """
+    if isinstance(self.sql_connector, AbstractSQLConnector):
+      self.sql_connector.warmup()
+    if self.enable_chart:
+      shared_chart_renderer().warmup()
 
   def run(self, user_query: str,
-          st_callback: Optional[StreamlitCallbackHandler] = None) -> Dict[str, Any]:
+          st_callback: Optional[StreamlitCallbackHandler] = None,
+          callbacks: Optional[List[BaseCallbackHandler]] = None) -> Dict[str, Any]:
     """
     Processes a user query and returns a list of processing steps.
 
     Args:
       user_query (str): The user query to process.
+      st_callback (Optional[StreamlitCallbackHandler]): Renders the steps in the Streamlit app.
+      callbacks (Optional[List[BaseCallbackHandler]]): More handlers of the run, e.g. a `PerfCallbackHandler`.
 
     Returns:
       Result of the agent invocation.
     """
-    if st_callback:
-      return self.agent_executor.invoke(user_query, config=RunnableConfig(callbacks=[st_callback]))
+    cached_sql = self._lookup_plan(user_query)
+    if cached_sql is not None:
+      return self._run_plan(user_query, cached_sql)
+
+    # Query results of the run are registered by handle, so charts never copy the data through the LLM.
+    handlers = ([st_callback] if st_callback else []) + (callbacks or [])
+    with result_store_scope():
+      if handlers:
+        result = self.agent_executor.invoke(user_query, config=RunnableConfig(callbacks=handlers))
+      else:
+        result = self.agent_executor.invoke(user_query)
+    self._record_plan(user_query, result)
+    return result
+
+  async def arun(self, user_query: str,
+                 st_callback: Optional[StreamlitCallbackHandler] = None,
+                 callbacks: Optional[List[BaseCallbackHandler]] = None) -> Dict[str, Any]:
+    """
+    Async version of `run`, so one process can serve many questions concurrently.
+
+    LLM calls use the native async client of the LLM and the connector tools run on
+    the connector's thread pool, so no thread is blocked for the whole agent loop.
 
-    return self.agent_executor.invoke(user_query)
+    Args:
+      user_query (str): The user query to process.
+
+    Returns:
+      Result of the agent invocation.
+    """
+    cached_sql = self._lookup_plan(user_query)
+    if cached_sql is not None:
+      return await self._arun_plan(user_query, cached_sql)
+
+    handlers = ([st_callback] if st_callback else []) + (callbacks or [])
+    with result_store_scope():
+      if handlers:
+        result = await self.agent_executor.ainvoke(user_query, config=RunnableConfig(callbacks=handlers))
+      else:
+        result = await self.agent_executor.ainvoke(user_query)
+    self._record_plan(user_query, result)
+    return result
+
+  def _lookup_plan(self, user_query: str) -> Optional[str]:
+    if self.plan_cache is None:
+      return None
+    return self.plan_cache.lookup(user_query, self.sql_connector.schema_version())
+
+  def _record_plan(self, user_query: str, result: Dict[str, Any]):
+    """Records the plan of a run that ended with a final answer. Runs stopped at the iteration limit are not."""
+    steps = result.get("intermediate_steps", [])
+    max_iterations = self.agent_executor.max_iterations
+    stopped = ((max_iterations is not None and len(steps) >= max_iterations)
+               or str(result.get("output", "")).startswith(AGENT_STOPPED_OUTPUT))
+    if self.plan_cache is not None and not stopped:
+      self.plan_cache.record(user_query, steps, self.sql_connector.schema_version())
+
+  def _plan_result(self, user_query: str, sql: str, observation: str, output: str) -> Dict[str, Any]:
+    """A result shaped like the agent's, with the cached query as the only step."""
+    action = AgentAction(tool="query_database", tool_input=sql,
+                         log=f"Answered from the plan cache.\nAction: query_database\nAction Input: {sql}")
+    return {"input": user_query, "output": output, "intermediate_steps": [(action, observation)],
+            "plan_cache_hit": True}
+
+  def _run_plan(self, user_query: str, sql: str) -> Dict[str, Any]:
+    """Runs the cached SQL of the question directly, with at most one LLM call to summarize it."""
+    try:
+      observation = self.sql_connector.guarded_fetch(sql)
+    except Exception as e:
+      observation = f"Error: {e}"
+    output = observation
+    if self.plan_cache_summarize and not observation.startswith("Error"):
+      prompt = PLAN_CACHE_SUMMARY_PROMPT.format(question=user_query, sql=sql, result=observation)
+      output = self.llm.invoke(prompt).content
+    return self._plan_result(user_query, sql, observation, output)
+
+  async def _arun_plan(self, user_query: str, sql: str) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    try:
+      observation = await loop.run_in_executor(self.sql_connector.query_executor(),
+                                               self.sql_connector.guarded_fetch, sql)
+    except Exception as e:
+      observation = f"Error: {e}"
+    output = observation
+    if self.plan_cache_summarize and not observation.startswith("Error"):
+      prompt = PLAN_CACHE_SUMMARY_PROMPT.format(question=user_query, sql=sql, result=observation)
+      output = (await self.llm.ainvoke(prompt)).content
+    return self._plan_result(user_query, sql, observation, output)
+
+
+_AGENTS: Dict[str, SQLAgent] = {}
+_AGENTS_LOCK = threading.Lock()
+
+
+def get_agent(config_name: str, **config_kwargs) -> SQLAgent:
+  """
+  Returns the process-wide agent of a `Config` factory, creating and warming it up on first use.
+
+  Agents are safe to share between threads, so every request and Streamlit session of the process
+  reuses the same executor, LLM client and connector with its connection pool and caches.
+
+  Args:
+    config_name (str): Name of the `Config` factory, e.g. create_custom_openai_custom_sqllite.
+    **config_kwargs: Arguments of the factory, part of the registry key.
+
+  Returns:
+    SQLAgent: The shared agent.
+  """
+  init()
+  key = f"{config_name}:{sorted(config_kwargs.items())!r}"
+  with _AGENTS_LOCK:
+    if key not in _AGENTS:
+      sql_agent = SQLAgent(config=getattr(Config, config_name)(**config_kwargs))
+      sql_agent.warmup()
+      _AGENTS[key] = sql_agent
+    return _AGENTS[key]
 
 
 # DEMO
 if __name__ == "__main__":
-  demo_config = Config.create_custom_openai_custom_sqllite_with_chart()
-  demo_sql_agent = SQLAgent(config=demo_config)
+  demo_sql_agent = get_agent("create_custom_openai_custom_sqllite_with_chart")
   demo_sql_agent.run(EXAMPLE.query)
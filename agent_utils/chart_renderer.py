@@ -0,0 +1,278 @@
+"""Renders chart code in worker processes with matplotlib already imported."""
+import hashlib
+import os
+import socket
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from multiprocessing.connection import Connection
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+if TYPE_CHECKING:
+  import pandas as pd
+
+# Seconds the parent waits on top of the worker's own timeout before it kills the worker.
+_KILL_GRACE_SECONDS = 5.0
+# Seconds a new worker may take to start and import matplotlib, not counted against its first job.
+_STARTUP_SECONDS = 60.0
+
+
+class ChartTimeoutError(TimeoutError):
+  """Raised when chart code runs longer than the renderer's timeout."""
+
+
+def _init_worker(memory_limit_bytes: Optional[int]):
+  """Limits the worker's memory and imports matplotlib once, so jobs only pay for their own code."""
+  if memory_limit_bytes:
+    try:
+      import resource
+      resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+    except (ImportError, ValueError, OSError):
+      pass
+  import matplotlib
+  matplotlib.use("Agg")
+  import matplotlib.pyplot  # noqa: F401
+  import pandas  # noqa: F401
+
+
+def _raise_timeout(signum, frame):
+  raise ChartTimeoutError("chart code exceeded the time limit")
+
+
+def _render(df: "pd.DataFrame", code: str, timeout_seconds: float) -> str:
+  """Runs the chart code in a worker with `df` in scope and returns its `html_str`."""
+  import signal
+  import matplotlib.pyplot as plt
+  has_timer = hasattr(signal, "setitimer")
+  if has_timer:
+    signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout_seconds)
+  try:
+    namespace = {'df': df}
+    exec(code, namespace, namespace)
+    return namespace['html_str']
+  finally:
+    if has_timer:
+      signal.setitimer(signal.ITIMER_REAL, 0)
+    # Figures the code did not close would otherwise pile up in the long lived worker.
+    plt.close('all')
+
+
+def _warm() -> bool:
+  return True
+
+
+def _worker_loop(connection: Connection, memory_limit_bytes: Optional[int]):
+  """Runs the jobs sent over the connection until it receives None or the parent goes away."""
+  _init_worker(memory_limit_bytes)
+  connection.send((True, None))
+  while True:
+    try:
+      job = connection.recv()
+    except EOFError:
+      return
+    if job is None:
+      return
+    function, args = job
+    try:
+      connection.send((True, function(*args)))
+    except BaseException as e:
+      try:
+        connection.send((False, e))
+      except Exception:
+        # The exception could not be pickled.
+        connection.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _WorkerTimeout(Exception):
+  """Raised when a worker does not answer in time."""
+
+
+# The directory holding `agent_utils`, so the worker imports it wherever the agent was started from.
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _Worker:
+  """
+  A worker process and the socket its jobs go through.
+
+  The worker is a fresh interpreter running `agent_utils.chart_worker`, so it inherits neither the
+  threads and locks of the agent process, as a fork would, nor re-runs its `__main__`, as a
+  multiprocessing spawn would.
+  """
+
+  def __init__(self, memory_limit_bytes: Optional[int]):
+    parent_socket, child_socket = socket.socketpair()
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(filter(None, [_ROOT, environment.get("PYTHONPATH")]))
+    self.process = subprocess.Popen(
+      [sys.executable, "-m", "agent_utils.chart_worker", str(child_socket.fileno()), str(memory_limit_bytes or 0)],
+      pass_fds=[child_socket.fileno()], env=environment, stdin=subprocess.DEVNULL)
+    child_socket.close()
+    self.connection = Connection(parent_socket.detach())
+    self.started = False
+
+  def run(self, function: Callable, args: tuple, timeout_seconds: float) -> tuple[bool, Any]:
+    """
+    Runs the job and returns whether it succeeded, with its result or its exception.
+
+    Raises:
+      _WorkerTimeout: If the worker did not answer within `timeout_seconds`.
+      EOFError: If the worker died.
+    """
+    if not self.started:
+      if not self.connection.poll(_STARTUP_SECONDS):
+        raise _WorkerTimeout()
+      self.connection.recv()
+      self.started = True
+    self.connection.send((function, args))
+    if not self.connection.poll(timeout_seconds):
+      raise _WorkerTimeout()
+    return self.connection.recv()
+
+  def kill(self):
+    self.process.kill()
+    self.process.wait()
+    self.connection.close()
+
+  def stop(self):
+    try:
+      self.connection.send(None)
+    except OSError:
+      pass
+    try:
+      self.process.wait(timeout=_KILL_GRACE_SECONDS)
+    except subprocess.TimeoutExpired:
+      self.process.kill()
+      self.process.wait()
+    self.connection.close()
+
+
+def data_hash(df: "pd.DataFrame") -> str:
+  import pandas as pd
+  digest = hashlib.sha256(repr(list(df.columns)).encode())
+  digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+  return digest.hexdigest()
+
+
+class ChartRenderer:
+  """
+  Renders chart code out of the agent's process, with a time and memory limit per job.
+
+  The workers are started with matplotlib imported and the Agg backend set, and close all
+  figures after every job. A job running longer than `timeout_seconds` is interrupted in the
+  worker, and the worker is killed and replaced if it does not come back, without touching
+  the jobs of other workers. Rendered charts are cached by the hash of the data and of the code.
+
+  Attributes:
+    max_workers (int): Number of worker processes.
+    timeout_seconds (float): Wall-clock limit of a single chart.
+    memory_limit_bytes (Optional[int]): Address space limit of every worker, None for no limit.
+    cache_entries (int): Number of rendered charts kept.
+  """
+
+  def __init__(self, max_workers: int = 2, timeout_seconds: float = 20.0,
+               memory_limit_bytes: Optional[int] = 1024 * 1024 * 1024, cache_entries: int = 128):
+    self.max_workers = max_workers
+    self.timeout_seconds = timeout_seconds
+    self.memory_limit_bytes = memory_limit_bytes
+    self.cache_entries = cache_entries
+    self._slots = threading.BoundedSemaphore(max_workers)
+    self._idle: list[_Worker] = []
+    self._lock = threading.Lock()
+    self._cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def _run(self, function: Callable, *args) -> Any:
+    """
+    Runs the job on an idle worker, starting one if there is none. The worker only goes back to the
+    idle workers once its answer was received, it is killed on a timeout, a death or any other error,
+    e.g. a KeyboardInterrupt, which would leave an unread answer for the next job.
+    """
+    with self._slots:
+      with self._lock:
+        worker = self._idle.pop() if self._idle else None
+      if worker is None:
+        worker = _Worker(self.memory_limit_bytes)
+      try:
+        ok, result = worker.run(function, args, self.timeout_seconds + _KILL_GRACE_SECONDS)
+      except _WorkerTimeout:
+        worker.kill()
+        raise ChartTimeoutError("chart code exceeded the time limit") from None
+      except (EOFError, OSError):
+        worker.kill()
+        raise RuntimeError("the chart worker died, the chart likely exceeded the memory limit") from None
+      except BaseException:
+        worker.kill()
+        raise
+      self._release(worker)
+    if not ok:
+      raise result
+    return result
+
+  def _release(self, worker: _Worker):
+    with self._lock:
+      self._idle.append(worker)
+
+  def warmup(self):
+    """Starts every worker, so the first chart does not wait for processes and imports."""
+    threads = [threading.Thread(target=self._run, args=(_warm,)) for _ in range(self.max_workers)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+  def render(self, df: "pd.DataFrame", code: str) -> str:
+    """
+    Returns the `html_str` the chart code produces for `df`.
+
+    Raises:
+      ChartTimeoutError: If the code runs longer than `timeout_seconds`.
+      RuntimeError: If the worker died, e.g. because it exceeded the memory limit.
+    """
+    key = (data_hash(df), hashlib.sha256(code.encode()).hexdigest())
+    with self._lock:
+      if key in self._cache:
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return self._cache[key]
+      self.misses += 1
+
+    try:
+      html = self._run(_render, df, code, self.timeout_seconds)
+    except MemoryError:
+      raise RuntimeError("the chart exceeded the memory limit") from None
+
+    with self._lock:
+      self._cache[key] = html
+      while len(self._cache) > self.cache_entries:
+        self._cache.popitem(last=False)
+    return html
+
+  def stats(self) -> dict[str, Any]:
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+              "entries": len(self._cache)}
+
+  def shutdown(self):
+    """Stops the idle workers."""
+    with self._lock:
+      workers, self._idle = self._idle, []
+    for worker in workers:
+      worker.stop()
+
+
+_RENDERER: Optional[ChartRenderer] = None
+_RENDERER_LOCK = threading.Lock()
+
+
+def shared_chart_renderer() -> ChartRenderer:
+  """Returns the process-wide chart renderer, creating it if needed."""
+  global _RENDERER
+  with _RENDERER_LOCK:
+    if _RENDERER is None:
+      _RENDERER = ChartRenderer()
+    return _RENDERER
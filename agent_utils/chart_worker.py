@@ -0,0 +1,20 @@
+"""
+Entry point of the chart worker processes, see `ChartRenderer`.
+
+Workers are started with `python -m agent_utils.chart_worker <fd> <memory limit>` instead of a
+multiprocessing spawn, which would import the parent's `__main__` again. Under `streamlit run`
+that is the app script, which has no main guard and would build a whole agent in every worker.
+"""
+import sys
+from multiprocessing.connection import Connection
+
+from agent_utils.chart_renderer import _worker_loop
+
+
+def main(argv: list[str]):
+  fd, memory_limit_bytes = int(argv[0]), int(argv[1])
+  _worker_loop(Connection(fd), memory_limit_bytes or None)
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
@@ -3,9 +3,13 @@
 from ast import literal_eval
 import ast
 from langchain.agents import tool
-import pandas as pd
 import re
 
+import pandas as pd
+
+from agent_utils.chart_renderer import shared_chart_renderer
+from db_connector.result_store import HANDLE_PATTERN, current_result_store
+
 SAFE_IMPORTS = set(["matplotlib.pyplot",
                     "pandas",
                     "BytesIO",
@@ -20,26 +24,39 @@ def parse_to_df_and_code(data_and_charting_code: str) -> tuple:
     data_and_charting_code (str): The input string containing data and charting code.
 
   Returns:
-    tuple: A tuple containing a pandas DataFrame and the extracted code block.
+    tuple: A tuple containing a pandas DataFrame, the extracted code block and a warning when
+      the DataFrame holds only part of the query result, None otherwise.
 
   Raises:
     ValueError: If the input string contains more than one dataframe or code block,
-      or if the data is not in dictionary format.
+      if the handle is unknown, or if the data is not in dictionary format.
   """
   # Transform Data
   datas = re.findall(r"<df>(.*?)</df>", data_and_charting_code, re.DOTALL)
   if len(datas) != 1:
     raise ValueError(f"Error: Generated {len(datas)} dataframes but expected 1.")
-  data = literal_eval(datas[0])
-  if not isinstance(data, dict):
-    return ValueError("Error: Input is not data in dictionary format.")
-  df = pd.DataFrame(data)
+  warning = None
+  if HANDLE_PATTERN.fullmatch(datas[0].strip()):
+    store = current_result_store()
+    result = store.chart_data(datas[0]) if store is not None else None
+    if result is None:
+      raise ValueError(f"Error: Unknown result handle {datas[0].strip()}, query the database first.")
+    df = result.df.copy()
+    if result.truncated:
+      total = result.total_rows if result.total_rows is not None else f"more than {result.min_total_rows or len(df)}"
+      warning = (f"Warning: the chart only shows the first {len(df)} of {total} rows of {datas[0].strip()}, "
+                 "aggregate in SQL to chart the whole result.")
+  else:
+    data = literal_eval(datas[0])
+    if not isinstance(data, dict):
+      raise ValueError("Error: Input is not data in dictionary format.")
+    df = pd.DataFrame(data)
 
   # Transform Code block
   code_blocks = re.findall(r"```python(.*?)```", data_and_charting_code, re.DOTALL)
   if len(code_blocks) != 1:
-    return ValueError(f"Error: Generated {len(code_blocks)} codeblocks but expected 1.")
-  return df, code_blocks[0].strip()
+    raise ValueError(f"Error: Generated {len(code_blocks)} codeblocks but expected 1.")
+  return df, code_blocks[0].strip(), warning
 
 
 def validate_imports(chart_code):
@@ -54,13 +71,13 @@ def validate_imports(chart_code):
 
 @tool
 def visualize_data(data_and_charting_code: str) -> str:
-  """ Visualize the data with matplotlib via python_charting_code, return an html as string.
+  """ Visualize the data with matplotlib via python_charting_code and show the chart to the user.
 
   This should usually be run after a successful query of the database.
 
   Example Input:
 
-  <df>{dict_str_of_dataframe}</df>
+  <df>{result_handle}</df>
 
   <chart>```python
   import matplotlib.pyplot as plt
@@ -78,18 +95,22 @@ def visualize_data(data_and_charting_code: str) -> str:
 
   Args:
     data_and_charting_code (str): a string that has two xml objects following the example input.
-      - dict_str_of_dataframe (dict): A string representation of a dictionary of the dataframe.
+      - result_handle (str): The result handle returned by query_database, e.g. result_1.
+          Do not copy the data itself, the handle is all that is needed.
       - python_charting_code (str): The python that uses provided imports in example input to create chart.
           - Do not create `df` again in the python code, `df` is already initialized.
           - Do not show the chart with plt.show(), save it to a svg_buffer then put it in an `html_str` variable
           - fig size should not exceed 7x7
   """
   try:
-    df, code = parse_to_df_and_code(data_and_charting_code)
+    df, code, warning = parse_to_df_and_code(data_and_charting_code)
     validate_imports(code)
-    namespace = {'df': df}
-    exec(code, namespace, namespace)
-    html_output = namespace['html_str']
+    html_output = shared_chart_renderer().render(df, code)
   except Exception as e:
     return f"Error: {e}"
-  return html_output
+  store = current_result_store()
+  if store is None:
+    return html_output
+  # The callbacks render the stored chart, the LLM only needs to know it worked.
+  output = f"Chart handle: {store.put_chart(html_output, code)}. The chart was rendered and shown to the user."
+  return output if warning is None else f"{output}\n\n{warning}"
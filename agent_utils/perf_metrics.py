@@ -0,0 +1,197 @@
+"""Per-step performance spans of agent runs, exported as JSONL and Prometheus text."""
+import hashlib
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from agent_utils.scratchpad import estimate_tokens
+from db_connector.abstract_sql_connector import maybe_extract_sql
+from db_connector.result_cache import normalize_sql
+from llms.llm_cache import CACHE_HIT_KEY
+
+# Upper bounds in seconds of the Prometheus latency histograms.
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CHART_TOOL = "visualize_data"
+QUERY_TOOL = "query_database"
+
+_ROWS_PATTERN = re.compile(r"(?:Result|Chart) handle: \w+ \((\d+) rows")
+
+
+def sql_hash(query: str) -> str:
+  """Short hash of the normalized SQL, equal for queries that only differ in formatting."""
+  return hashlib.sha256(normalize_sql(maybe_extract_sql(query)).encode()).hexdigest()[:16]
+
+
+class PerfMetrics:
+  """
+  Collects the spans of agent runs and aggregates them.
+
+  Every finished span is appended to `jsonl_path` right away, so slow questions can be found
+  even if the process dies. Aggregates are kept per span kind and name for the report and the
+  Prometheus export. Safe to share between threads and concurrent runs.
+
+  Attributes:
+    jsonl_path (Optional[str]): File the spans are appended to, one JSON object per line.
+  """
+
+  def __init__(self, jsonl_path: Optional[str] = None):
+    self.jsonl_path = jsonl_path
+    self._lock = threading.Lock()
+    self._durations: Dict[tuple[str, str], List[float]] = defaultdict(list)
+    self._counters: Dict[tuple[str, str, str], float] = defaultdict(float)
+
+  def record(self, span: Dict[str, Any]):
+    key = (span["kind"], span["name"])
+    with self._lock:
+      self._durations[key].append(span["duration_s"])
+      for counter in ("prompt_tokens", "completion_tokens", "rows", "bytes"):
+        if span.get(counter):
+          self._counters[(*key, counter)] += span[counter]
+      if span.get("cache_hit"):
+        self._counters[(*key, "cache_hits")] += 1
+      if span.get("error"):
+        self._counters[(*key, "errors")] += 1
+      if self.jsonl_path:
+        with open(self.jsonl_path, 'a') as file:
+          file.write(json.dumps(span, default=str) + "\n")
+
+  def report(self) -> str:
+    """One line per span kind and name with count, latency percentiles and total."""
+    lines = ["kind | name | count | p50_ms | p90_ms | max_ms | total_ms"]
+    with self._lock:
+      items = sorted(self._durations.items())
+    for (kind, name), durations in items:
+      ordered = sorted(durations)
+      p90 = ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))]
+      lines.append(f"{kind} | {name} | {len(ordered)} | {statistics.median(ordered) * 1000:.1f} | "
+                   f"{p90 * 1000:.1f} | {ordered[-1] * 1000:.1f} | {sum(ordered) * 1000:.1f}")
+    return "\n".join(lines)
+
+  def prometheus_text(self) -> str:
+    """The aggregates in the Prometheus text exposition format."""
+    lines = ["# HELP sql_agent_span_seconds Duration of agent runs, LLM calls and tool calls.",
+             "# TYPE sql_agent_span_seconds histogram"]
+    with self._lock:
+      durations = sorted(self._durations.items())
+      counters = sorted(self._counters.items())
+    for (kind, name), values in durations:
+      labels = f'kind="{kind}",name="{name}"'
+      for bound in LATENCY_BUCKETS:
+        lines.append(f'sql_agent_span_seconds_bucket{{{labels},le="{bound}"}} '
+                     f'{sum(value <= bound for value in values)}')
+      lines.append(f'sql_agent_span_seconds_bucket{{{labels},le="+Inf"}} {len(values)}')
+      lines.append(f'sql_agent_span_seconds_sum{{{labels}}} {sum(values)}')
+      lines.append(f'sql_agent_span_seconds_count{{{labels}}} {len(values)}')
+    for counter in ("prompt_tokens", "completion_tokens", "rows", "bytes", "cache_hits", "errors"):
+      lines.append(f"# TYPE sql_agent_{counter}_total counter")
+      for (kind, name, name_of_counter), value in counters:
+        if name_of_counter == counter:
+          lines.append(f'sql_agent_{counter}_total{{kind="{kind}",name="{name}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+  def write_prometheus(self, path: str):
+    """Writes the Prometheus text atomically, e.g. for the node exporter textfile collector."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+      file.write(self.prometheus_text())
+    os.replace(tmp_path, path)
+
+
+class PerfCallbackHandler(BaseCallbackHandler):
+  """
+  Records a span for the agent run, every LLM call and every tool call.
+
+  LLM spans hold the prompt and completion tokens, reported by the provider or estimated,
+  and whether the response came from the LLM cache. Tool spans hold the hash of the SQL,
+  the rows returned and the bytes of the output, `visualize_data` calls are recorded as
+  chart spans.
+
+  Use one handler per run, concurrent runs can share the `PerfMetrics`.
+
+  Attributes:
+    metrics (PerfMetrics): Where the finished spans go.
+    run_label (Optional[str]): Added to every span, e.g. the question id.
+  """
+
+  def __init__(self, metrics: PerfMetrics, run_label: Optional[str] = None):
+    self.metrics = metrics
+    self.run_label = run_label
+    self._spans: Dict[UUID, Dict[str, Any]] = {}
+    self._root_run_id: Optional[UUID] = None
+
+  def _start(self, run_id: UUID, kind: str, name: str, **fields: Any):
+    self._spans[run_id] = {"kind": kind, "name": name, "run_label": self.run_label,
+                           "root_run_id": str(self._root_run_id) if self._root_run_id else None,
+                           "start": time.time(), "_start": time.perf_counter(), **fields}
+
+  def _finish(self, run_id: UUID, **fields: Any):
+    span = self._spans.pop(run_id, None)
+    if span is None:
+      return
+    span["duration_s"] = time.perf_counter() - span.pop("_start")
+    span.update(fields)
+    self.metrics.record(span)
+
+  def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID,
+                     parent_run_id: Optional[UUID] = None, **kwargs: Any):
+    if parent_run_id is None:
+      self._root_run_id = run_id
+      question = inputs.get("input") if isinstance(inputs, dict) else inputs
+      self._start(run_id, "run", "agent", question=question)
+
+  def on_chain_end(self, outputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any):
+    if run_id == self._root_run_id:
+      steps = outputs.get("intermediate_steps", []) if isinstance(outputs, dict) else []
+      self._finish(run_id, iterations=len(steps))
+
+  def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+    if run_id == self._root_run_id:
+      self._finish(run_id, error=f"{type(error).__name__}: {error}")
+
+  def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any):
+    self._start(run_id, "llm", serialized.get("name") or "llm",
+                prompt_tokens=sum(estimate_tokens(prompt) for prompt in prompts))
+
+  def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                          **kwargs: Any):
+    self._start(run_id, "llm", serialized.get("name") or "chat_model",
+                prompt_tokens=sum(estimate_tokens(str(message.content))
+                                  for batch in messages for message in batch))
+
+  def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+    generation = response.generations[0][0] if response.generations and response.generations[0] else None
+    fields: Dict[str, Any] = {"tokens_estimated": True}
+    if generation is not None:
+      fields["completion_tokens"] = estimate_tokens(generation.text)
+      fields["cache_hit"] = (generation.generation_info or {}).get(CACHE_HIT_KEY)
+    usage = (response.llm_output or {}).get("token_usage")
+    if usage:
+      fields.update(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"),
+                    tokens_estimated=False)
+    self._finish(run_id, **fields)
+
+  def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+    self._finish(run_id, error=f"{type(error).__name__}: {error}")
+
+  def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any):
+    name = serialized.get("name", "tool")
+    fields = {"sql_hash": sql_hash(input_str)} if name == QUERY_TOOL else {}
+    self._start(run_id, "chart" if name == CHART_TOOL else "tool", name, **fields)
+
+  def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+    output = str(output)
+    rows = _ROWS_PATTERN.match(output)
+    self._finish(run_id, bytes=len(output.encode()), rows=int(rows.group(1)) if rows else None,
+                 error=output if output.startswith("Error") else None)
+
+  def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+    self._finish(run_id, error=f"{type(error).__name__}: {error}")
@@ -0,0 +1,215 @@
+"""Question to SQL plan cache, so repeated questions skip the agent loop."""
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+import sqlparse
+from sqlparse import tokens as T
+
+from db_connector.abstract_sql_connector import maybe_extract_sql, validate_sql_statement
+
+STRING = "string"
+NUMBER = "number"
+_NUMBER_PATTERN = re.compile(r"-?\d+(\.\d+)?")
+_FIRST_WORD = re.compile(r"(\w+)\W")
+
+
+def _normalize_question(question: str) -> str:
+  return " ".join(question.split())
+
+
+def _first_word(text: str) -> Optional[str]:
+  """The lower cased first word of the text, None if the text does not start with a complete word."""
+  match = _FIRST_WORD.match(text + " ")
+  return match.group(1).lower() if match else None
+
+
+def _sql_literals(sql: str) -> list[tuple[int, str, str]]:
+  """The (token index, kind, value) of every string and number literal of the SQL."""
+  literals = []
+  for index, token in enumerate(sqlparse.parse(sql)[0].flatten()):
+    if token.ttype in T.Literal.String.Single:
+      literals.append((index, STRING, token.value[1:-1].replace("''", "'")))
+    elif token.ttype in T.Literal.Number:
+      literals.append((index, NUMBER, token.value))
+  return literals
+
+
+def _render_literal(kind: str, value: str) -> str:
+  if kind == NUMBER:
+    return value
+  return "'" + value.replace("'", "''") + "'"
+
+
+class Plan:
+  """
+  A validated SQL statement for a question template.
+
+  Literals of the SQL that also appear in the question are turned into slots. The question
+  template is a regex with one group per slot, so "albums by Queen" and "albums by AC/DC"
+  share the plan and only differ in the value substituted into the SQL. `first_word` is the
+  first word of questions the plan can match, None if the template starts with a slot.
+  """
+
+  def __init__(self, pattern: str, sql: str, slots: list[dict], schema_version: Any,
+               first_word: Optional[str] = None):
+    self.pattern = pattern
+    self.sql = sql
+    self.slots = slots
+    self.schema_version = schema_version
+    self.first_word = first_word
+    self._regex = re.compile(pattern, re.IGNORECASE)
+
+  @classmethod
+  def from_question(cls, question: str, sql: str, schema_version: Any) -> "Plan":
+    question = _normalize_question(question)
+    slots, spans = [], []
+    for token_index, kind, value in _sql_literals(sql):
+      existing = next((slot for slot in slots if slot["kind"] == kind and slot["value"] == value), None)
+      if existing is not None:
+        existing["token_indexes"].append(token_index)
+        continue
+      if not value.strip():
+        continue
+      match = re.search(rf"(?<!\w){re.escape(value)}(?!\w)", question, re.IGNORECASE)
+      if match is None or any(match.start() < end and start < match.end() for start, end in spans):
+        continue
+      spans.append((match.start(), match.end()))
+      slots.append({"kind": kind, "value": value, "token_indexes": [token_index],
+                    "start": match.start(), "end": match.end()})
+
+    # Build the question regex with the slots in question order.
+    slots.sort(key=lambda slot: slot["start"])
+    pattern, position = "", 0
+    for number, slot in enumerate(slots):
+      pattern += re.escape(question[position:slot["start"]])
+      pattern += rf"(?P<s{number}>-?\d+(?:\.\d+)?)" if slot["kind"] == NUMBER else rf"(?P<s{number}>.+?)"
+      position = slot["end"]
+    pattern = "^" + pattern + re.escape(question[position:]) + "$"
+    first_word = _first_word(question[:slots[0]["start"]] if slots else question)
+    slots = [{"kind": slot["kind"], "token_indexes": slot["token_indexes"]} for slot in slots]
+    return cls(pattern=pattern, sql=sql, slots=slots, schema_version=schema_version, first_word=first_word)
+
+  def match(self, question: str) -> Optional[str]:
+    """Returns the SQL for the question with its values substituted, None if the question does not match."""
+    match = self._regex.match(_normalize_question(question))
+    if match is None:
+      return None
+    replacements = {}
+    for number, slot in enumerate(self.slots):
+      value = match.group(f"s{number}")
+      if slot["kind"] == NUMBER and not _NUMBER_PATTERN.fullmatch(value):
+        return None
+      for token_index in slot["token_indexes"]:
+        replacements[token_index] = _render_literal(slot["kind"], value)
+    tokens = sqlparse.parse(self.sql)[0].flatten()
+    return "".join(replacements.get(index, token.value) for index, token in enumerate(tokens))
+
+  def to_dict(self) -> dict:
+    return {"pattern": self.pattern, "sql": self.sql, "slots": self.slots,
+            "schema_version": self.schema_version, "first_word": self.first_word}
+
+
+class PlanCache:
+  """
+  Maps questions to the final SQL the agent validated for them.
+
+  Plans are keyed by their question pattern and dropped once the schema version differs
+  from the one they were recorded at. A lookup only tries the plans of questions with the
+  same first word. With a path, plans are persisted as JSON.
+
+  Attributes:
+    max_plans (int): Number of plans kept, the least recently used ones are dropped first.
+  """
+
+  def __init__(self, path: Optional[str] = None, max_plans: int = 1000):
+    self.path = path
+    self.max_plans = max_plans
+    self._lock = threading.Lock()
+    self._plans: OrderedDict[str, Plan] = OrderedDict()
+    self._by_first_word: dict[Optional[str], dict[str, Plan]] = {}
+    self.hits = 0
+    self.misses = 0
+    if path and os.path.exists(path):
+      with open(path, 'r') as file:
+        for plan in json.load(file)[-max_plans:]:
+          self._plans[plan["pattern"]] = Plan(**plan)
+      self._index()
+
+  def _index(self):
+    self._by_first_word = {}
+    for pattern, plan in self._plans.items():
+      self._by_first_word.setdefault(plan.first_word, {})[pattern] = plan
+
+  def lookup(self, question: str, schema_version: Any) -> Optional[str]:
+    """Returns the SQL for the question if a plan matches it."""
+    first_word = _first_word(_normalize_question(question))
+    with self._lock:
+      plans = [*self._by_first_word.get(first_word, {}).values(), *self._by_first_word.get(None, {}).values()]
+    for plan in plans:
+      if plan.schema_version != schema_version:
+        continue
+      sql = plan.match(question)
+      if sql is not None:
+        with self._lock:
+          if plan.pattern in self._plans:
+            self._plans.move_to_end(plan.pattern)
+          self.hits += 1
+        return sql
+    with self._lock:
+      self.misses += 1
+    return None
+
+  def record(self, question: str, intermediate_steps: list[tuple], schema_version: Any):
+    """
+    Stores the last successful `query_database` SQL of an agent run as the plan of the question.
+    Only pass runs that ended with a final answer, the SQL of a run stopped at the iteration or
+    time limit did not answer the question.
+    """
+    sql = None
+    for action, observation in intermediate_steps:
+      if action.tool == "query_database" and not str(observation).startswith("Error"):
+        sql = maybe_extract_sql(str(action.tool_input)).strip()
+    if not sql:
+      return
+    try:
+      validate_sql_statement(sql)
+    except ValueError:
+      return
+    plan = Plan.from_question(question, sql, schema_version)
+    with self._lock:
+      self._plans = OrderedDict((pattern, existing) for pattern, existing in self._plans.items()
+                                if existing.schema_version == schema_version and pattern != plan.pattern)
+      self._plans[plan.pattern] = plan
+      while len(self._plans) > self.max_plans:
+        self._plans.popitem(last=False)
+      self._index()
+      if self.path:
+        self._save([existing.to_dict() for existing in self._plans.values()])
+
+  def _save(self, plans: list[dict]):
+    """Writes a temporary file next to the cache file and renames it, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+    try:
+      with os.fdopen(fd, 'w') as file:
+        json.dump(plans, file)
+      os.replace(tmp_path, self.path)
+    except BaseException:
+      os.remove(tmp_path)
+      raise
+
+
+_PLAN_CACHES: dict[str, PlanCache] = {}
+_PLAN_CACHES_LOCK = threading.Lock()
+
+
+def shared_plan_cache(key: str, path: Optional[str] = None, max_plans: int = 1000) -> PlanCache:
+  """Returns the process-wide plan cache for the given database key, creating it if needed."""
+  with _PLAN_CACHES_LOCK:
+    if key not in _PLAN_CACHES:
+      _PLAN_CACHES[key] = PlanCache(path=path, max_plans=max_plans)
+    return _PLAN_CACHES[key]
@@ -0,0 +1,98 @@
+"""Compaction of the agent's previous steps, so the prompt stops growing with every iteration."""
+import re
+from typing import Any, Callable
+
+from langchain_core.agents import AgentAction
+
+TABLE_INFO_TOOL = "get_table_info_and_sample_rows"
+QUERY_TOOL = "query_database"
+MIN_OBSERVATION_CHARS = 200
+
+_TABLE_BLOCK_PATTERN = re.compile(r"#### Table: (\S+)\n\n(?:```sql\n(.*?)\n```)?", re.DOTALL)
+
+Step = tuple[AgentAction, Any]
+
+
+def estimate_tokens(text: str) -> int:
+  """Rough token count, about 4 characters per token for English text and SQL."""
+  return len(text) // 4 + 1
+
+
+def _truncate(text: str, max_chars: int, source: str = "an earlier step") -> str:
+  if len(text) <= max_chars:
+    return text
+  return text[:max_chars] + f"\n(... {len(text) - max_chars} more characters of {source} omitted)"
+
+
+def _table_names(step: Step) -> set[str]:
+  return {name.strip() for name in str(step[0].tool_input).split(",") if name.strip()}
+
+
+def _digest_table_info(observation: str) -> str:
+  """Keeps the DDL of every table and drops the sample rows."""
+  blocks = [f"#### Table: {name}\n\n```sql\n{ddl}\n```" if ddl else f"#### Table: {name}"
+            for name, ddl in _TABLE_BLOCK_PATTERN.findall(observation)]
+  if not blocks:
+    return observation
+  return "\n\n".join(blocks) + "\n\n(Sample rows of an earlier step omitted.)"
+
+
+def _digest_old_step(steps: list[Step], index: int) -> str:
+  """The observation of an older step, digested when later steps supersede it."""
+  action, observation = steps[index]
+  observation = str(observation)
+  later = steps[index + 1:]
+  if action.tool == TABLE_INFO_TOOL:
+    tables = _table_names(steps[index])
+    shown_later = set().union(*(_table_names(step) for step in later if step[0].tool == TABLE_INFO_TOOL))
+    if tables and tables <= shown_later:
+      return "(Schema shown again in a later step.)"
+    return _digest_table_info(observation)
+  if action.tool == QUERY_TOOL and any(step[0].tool == QUERY_TOOL for step in later):
+    if observation.startswith("Error"):
+      return _truncate(observation.splitlines()[0], MIN_OBSERVATION_CHARS)
+    return _truncate(observation, 4 * MIN_OBSERVATION_CHARS, "a result superseded by a later query")
+  return observation
+
+
+def _size(steps: list[Step]) -> int:
+  return sum(estimate_tokens(action.log) + estimate_tokens(str(observation)) for action, observation in steps)
+
+
+def compact_steps(steps: list[Step], token_budget: int, keep_recent: int = 2) -> list[Step]:
+  """
+  Compacts the observations of the previous steps to fit the token budget.
+
+  The last `keep_recent` observations are kept verbatim. Older schema blocks lose their sample
+  rows, or are dropped once the same tables are shown again, and older query results and errors
+  superseded by a later query are truncated. If the steps still exceed `token_budget`, the older
+  observations are truncated further, oldest first, down to `MIN_OBSERVATION_CHARS` each. The
+  recent observations are never truncated, even if they alone exceed the budget.
+
+  Args:
+    steps (list[Step]): The (action, observation) pairs of the agent so far.
+    token_budget (int): The estimated number of tokens the steps may take in the prompt.
+    keep_recent (int): Number of latest observations that are never digested or truncated.
+
+  Returns:
+    list[Step]: The steps with the same actions and compacted observations.
+  """
+  recent_start = max(0, len(steps) - keep_recent)
+  compacted = [(action, _digest_old_step(steps, index) if index < recent_start else observation)
+               for index, (action, observation) in enumerate(steps)]
+
+  excess = _size(compacted) - token_budget
+  for index, (action, observation) in enumerate(compacted[:recent_start]):
+    if excess <= 0:
+      break
+    observation = str(observation)
+    max_chars = max(MIN_OBSERVATION_CHARS, len(observation) - 4 * excess)
+    truncated = _truncate(observation, max_chars)
+    excess -= estimate_tokens(observation) - estimate_tokens(truncated)
+    compacted[index] = (action, truncated)
+  return compacted
+
+
+def scratchpad_compactor(token_budget: int, keep_recent: int = 2) -> Callable[[dict], list[Step]]:
+  """Returns the function to assign to `intermediate_steps` in front of an agent runnable."""
+  return lambda inputs: compact_steps(inputs["intermediate_steps"], token_budget, keep_recent)
@@ -0,0 +1,140 @@
+"""
+Runs a file of questions through SQLAgent concurrently and streams the results as JSONL.
+
+The questions file has one question per line, or one JSON object with `question` and
+an optional `id` per line. Every result is written as soon as it completes, followed by a
+summary line with latency percentiles, so a slow question never blocks the others.
+
+  python batch_runner.py questions.txt --output results.jsonl --concurrency 8 --requests-per-minute 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, TextIO
+
+from agent import SQLAgent, init
+from agent_utils.perf_metrics import PerfCallbackHandler, PerfMetrics
+from config import Config
+from llms.abstract_llm import AbstractLLM
+from llms.rate_limit import TokenBucket
+
+DEFAULT_CONFIG = "create_custom_openai_custom_sqllite"
+
+
+def read_questions(path: str) -> List[Dict[str, str]]:
+  """Reads plain text or JSONL questions, giving questions without an id their line number as id."""
+  questions = []
+  with open(path, 'r') as file:
+    for line_number, line in enumerate(file, start=1):
+      line = line.strip()
+      if not line:
+        continue
+      question = json.loads(line) if line.startswith("{") else {"question": line}
+      question.setdefault("id", str(line_number))
+      questions.append(question)
+  return questions
+
+
+def serialize_steps(intermediate_steps: List[tuple]) -> List[Dict[str, Any]]:
+  return [{"tool": action.tool, "tool_input": action.tool_input, "log": action.log,
+           "observation": str(observation)}
+          for action, observation in intermediate_steps]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+  """Nearest-rank percentile, None for no values."""
+  if not values:
+    return None
+  ordered = sorted(values)
+  return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+async def run_question(sql_agent: SQLAgent, question: Dict[str, str], semaphore: asyncio.Semaphore,
+                       metrics: Optional[PerfMetrics] = None) -> Dict[str, Any]:
+  async with semaphore:
+    start = time.perf_counter()
+    record = {"type": "result", "id": question["id"], "question": question["question"]}
+    callbacks = [PerfCallbackHandler(metrics, run_label=question["id"])] if metrics else None
+    try:
+      result = await sql_agent.arun(question["question"], callbacks=callbacks)
+      record.update(output=result["output"],
+                    intermediate_steps=serialize_steps(result["intermediate_steps"]),
+                    error=None)
+    except Exception as e:
+      record.update(output=None, intermediate_steps=[], error=f"{type(e).__name__}: {e}")
+    record["latency_s"] = time.perf_counter() - start
+    return record
+
+
+async def run_batch(sql_agent: SQLAgent, questions: List[Dict[str, str]], output: TextIO,
+                    concurrency: int, metrics: Optional[PerfMetrics] = None) -> Dict[str, Any]:
+  """
+  Runs the questions with at most `concurrency` in flight, writing each result to `output` as it completes.
+
+  Returns:
+    Dict[str, Any]: The summary with counts and latency percentiles, also written as the last line.
+  """
+  semaphore = asyncio.Semaphore(concurrency)
+  tasks = [asyncio.create_task(run_question(sql_agent, question, semaphore, metrics))
+           for question in questions]
+  latencies, errors = [], 0
+  for next_done in asyncio.as_completed(tasks):
+    record = await next_done
+    latencies.append(record["latency_s"])
+    errors += record["error"] is not None
+    output.write(json.dumps(record) + "\n")
+    output.flush()
+
+  summary = {"type": "summary", "questions": len(questions), "errors": errors,
+             **{f"p{q}_latency_s": percentile(latencies, q) for q in (50, 90, 99)},
+             "max_latency_s": max(latencies, default=None)}
+  output.write(json.dumps(summary) + "\n")
+  output.flush()
+  return summary
+
+
+def main(argv: Optional[List[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("questions", help="Text file with one question per line, or JSONL with {id, question}.")
+  parser.add_argument("--output", help="JSONL output path, defaults to stdout.")
+  parser.add_argument("--config", default=DEFAULT_CONFIG, help="Name of the Config factory to use.")
+  parser.add_argument("--concurrency", type=int, default=8, help="Maximum number of questions in flight.")
+  parser.add_argument("--requests-per-minute", type=float, help="Rate limit of the LLM calls.")
+  parser.add_argument("--burst", type=float, default=1.0, help="Number of LLM calls allowed at once.")
+  parser.add_argument("--max-retries", type=int, default=5, help="Retries of an LLM call on rate limit errors.")
+  parser.add_argument("--metrics-dir", help="Write per-step spans (spans.jsonl) and Prometheus metrics "
+                                            "(metrics.prom) to this directory.")
+  args = parser.parse_args(argv)
+
+  init()
+  config = getattr(Config, args.config)()
+  if isinstance(config.llm, AbstractLLM):
+    config.llm.max_retries = args.max_retries
+    if args.requests_per_minute:
+      config.llm.rate_limiter = TokenBucket.per_minute(args.requests_per_minute, burst=args.burst)
+  # One agent for the whole batch, so all questions share the connector and its caches.
+  sql_agent = SQLAgent(config=config)
+  questions = read_questions(args.questions)
+
+  metrics = None
+  if args.metrics_dir:
+    os.makedirs(args.metrics_dir, exist_ok=True)
+    metrics = PerfMetrics(jsonl_path=os.path.join(args.metrics_dir, "spans.jsonl"))
+
+  output = open(args.output, 'w') if args.output else sys.stdout
+  try:
+    summary = asyncio.run(run_batch(sql_agent, questions, output, args.concurrency, metrics))
+  finally:
+    if args.output:
+      output.close()
+  print(json.dumps(summary), file=sys.stderr)
+  if metrics:
+    metrics.write_prometheus(os.path.join(args.metrics_dir, "metrics.prom"))
+    print(metrics.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,178 @@
+"""
+Offline benchmark of the agent on data/Chinook.db with recorded LLM transcripts.
+
+Reports per question the time spent in the LLM, in SQL, formatting tool outputs and charting,
+the memory peak and the number of agent iterations. Since the LLM is replayed from disk, the
+numbers track the overhead of our own code and run on a machine without network.
+
+Run from the repository root:
+
+  python -m benchmarks.run_benchmarks
+  python -m benchmarks.run_benchmarks --record   # re-record the transcripts with OpenAILLM
+"""
+import argparse
+from collections import defaultdict
+import json
+import os
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+
+from agent import SQLAgent
+from agent_utils.chart_renderer import shared_chart_renderer
+from config import Config
+from db_connector.result_store import result_store_scope
+from llms.record_replay_llm import RECORD, REPLAY, RecordReplayLLM
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+QUESTIONS_PATH = os.path.join(BENCHMARK_DIR, "questions.json")
+TRANSCRIPT_DIR = os.path.join(BENCHMARK_DIR, "transcripts")
+SQL_TOOLS = {"list_table_names", "find_relevant_tables", "find_column_values", "get_table_info_and_sample_rows",
+             "query_database"}
+
+
+class StageTimer(BaseCallbackHandler):
+  """Accumulates the wall-clock time of LLM calls and tool calls per stage."""
+
+  def __init__(self, timings: Dict[str, float]):
+    self.timings = timings
+    self._starts: Dict[UUID, tuple[str, float]] = {}
+
+  def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any):
+    self._starts[run_id] = ("llm", time.perf_counter())
+
+  def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], *, run_id: UUID, **kwargs: Any):
+    self._starts[run_id] = ("llm", time.perf_counter())
+
+  def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+    self._stop(run_id)
+
+  def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any):
+    name = serialized["name"]
+    stage = "tools" if name in SQL_TOOLS else "charting" if name == "visualize_data" else "other_tools"
+    self._starts[run_id] = (stage, time.perf_counter())
+
+  def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+    self._stop(run_id)
+
+  def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+    self._stop(run_id)
+
+  def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+    self._stop(run_id)
+
+  def _stop(self, run_id: UUID):
+    stage, start = self._starts.pop(run_id)
+    self.timings[stage] += time.perf_counter() - start
+
+
+def instrument_connector(connector, timings: Dict[str, float]):
+  """Wraps the query methods of the connector instance to add the time spent in the database to `timings`."""
+  query, query_iter, check_query_cost = connector.query, connector.query_iter, connector.check_query_cost
+
+  def timed(func):
+    def wrapper(*args, **kwargs):
+      start = time.perf_counter()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        timings["sql"] += time.perf_counter() - start
+    return wrapper
+
+  def timed_query_iter(*args, **kwargs):
+    stream = query_iter(*args, **kwargs)
+    try:
+      while True:
+        start = time.perf_counter()
+        try:
+          chunk = next(stream)
+        except StopIteration:
+          return
+        finally:
+          timings["sql"] += time.perf_counter() - start
+        yield chunk
+    finally:
+      stream.close()
+
+  connector.query = timed(query)
+  connector.query_iter = timed_query_iter
+  connector.check_query_cost = timed(check_query_cost)
+
+
+def run_question(sql_agent: SQLAgent, llm: RecordReplayLLM, question: dict, timings: Dict[str, float]) -> dict:
+  """Runs a single question and returns its benchmark record."""
+  timings.clear()
+  llm.start_session(question["id"])
+  tracemalloc.start()
+  start = time.perf_counter()
+  error = None
+  try:
+    with result_store_scope():
+      result = sql_agent.agent_executor.invoke(question["question"],
+                                               config=RunnableConfig(callbacks=[StageTimer(timings)]))
+    iterations = len(result["intermediate_steps"])
+  except Exception as e:
+    iterations, error = None, str(e)
+  total = time.perf_counter() - start
+  _, memory_peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  # Tool time that was not spent in the database went into formatting the observations.
+  stages = {"llm": timings["llm"], "sql": timings["sql"],
+            "formatting": max(timings["tools"] - timings["sql"], 0.0), "charting": timings["charting"]}
+  return {"id": question["id"],
+          "total_ms": total * 1000,
+          **{f"{stage}_ms": seconds * 1000 for stage, seconds in stages.items()},
+          "overhead_ms": (total - timings["llm"]) * 1000,
+          "memory_peak_kb": memory_peak / 1024,
+          "iterations": iterations,
+          "error": error}
+
+
+def print_report(records: List[dict]):
+  columns = ["id", "total_ms", "llm_ms", "sql_ms", "formatting_ms", "charting_ms", "overhead_ms",
+             "memory_peak_kb", "iterations"]
+  print(" | ".join(columns))
+  for record in records:
+    print(" | ".join(f"{record[column]:.1f}" if isinstance(record[column], float) else str(record[column])
+                     for column in columns))
+    if record["error"]:
+      print(f"  error: {record['error']}")
+
+
+def main(argv: Optional[List[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--record", action="store_true", help="Record new transcripts with OpenAILLM.")
+  parser.add_argument("--questions", default=QUESTIONS_PATH, help="JSON list of {id, question}.")
+  parser.add_argument("--transcripts", default=TRANSCRIPT_DIR, help="Directory of the transcripts.")
+  parser.add_argument("--output", help="Write the records as JSON to this path.")
+  args = parser.parse_args(argv)
+
+  config = Config.create_record_replay_custom_sqllite_with_chart(transcript_dir=args.transcripts,
+                                                                 mode=RECORD if args.record else REPLAY)
+  timings: Dict[str, float] = defaultdict(float)
+  instrument_connector(config.sql_connector, timings)
+  sql_agent = SQLAgent(config=config)
+  # Start the chart workers up front, the cold start is measured by benchmarks.startup.
+  sql_agent.warmup()
+
+  with open(args.questions, 'r') as file:
+    questions = json.load(file)
+  records = [run_question(sql_agent, config.llm, question, timings) for question in questions]
+  print_report(records)
+  print(f"result cache: {config.sql_connector.cache_stats()}")
+  print(f"chart cache: {shared_chart_renderer().stats()}")
+  if args.output:
+    with open(args.output, 'w') as file:
+      json.dump(records, file, indent=2)
+  if any(record["error"] for record in records):
+    raise SystemExit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,68 @@
+"""
+Cold start benchmark: the time a fresh interpreter needs to import the app and to get a ready agent.
+
+Every measurement runs in a new process, so nothing is cached by earlier imports. The median of
+`--repeat` runs is reported, `--max-import-ms` fails the run when importing `agent` got slower.
+
+  python -m benchmarks.startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRANSCRIPT_DIR = os.path.join(REPO_DIR, "benchmarks", "transcripts")
+
+# Statement to time in a fresh interpreter, per measurement.
+MEASUREMENTS = {
+  "import_config_ms": "import config",
+  "import_agent_ms": "import agent",
+  "first_agent_ms": ("import agent; agent.get_agent('create_record_replay_custom_sqllite_with_chart', "
+                     f"transcript_dir={TRANSCRIPT_DIR!r})"),
+}
+
+_TIMER = """
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+
+def time_in_fresh_process(statement: str) -> float:
+  """Runs the statement in a new interpreter from the repository root and returns its duration in ms."""
+  output = subprocess.run([sys.executable, "-c", _TIMER.format(statement=statement)], cwd=REPO_DIR,
+                          capture_output=True, text=True, check=True).stdout
+  return float(output.strip().splitlines()[-1]) * 1000
+
+
+def measure_startup(repeat: int = 3) -> Dict[str, float]:
+  """The median duration of every measurement over `repeat` fresh processes."""
+  return {name: statistics.median(time_in_fresh_process(statement) for _ in range(repeat))
+          for name, statement in MEASUREMENTS.items()}
+
+
+def main(argv: Optional[List[str]] = None):
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--repeat", type=int, default=3, help="Number of fresh processes per measurement.")
+  parser.add_argument("--max-import-ms", type=float, help="Fail when importing agent takes longer.")
+  parser.add_argument("--output", help="Write the measurements as JSON to this path.")
+  args = parser.parse_args(argv)
+
+  startup = measure_startup(args.repeat)
+  print(" | ".join(startup))
+  print(" | ".join(f"{value:.1f}" for value in startup.values()))
+  if args.output:
+    with open(args.output, 'w') as file:
+      json.dump(startup, file, indent=2)
+  if args.max_import_ms is not None and startup["import_agent_ms"] > args.max_import_ms:
+    raise SystemExit(f"importing agent took {startup['import_agent_ms']:.1f} ms, "
+                     f"more than {args.max_import_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+  main()
@@ -1,11 +1,11 @@
-from config import EXAMPLE, Config
+from config import EXAMPLE
 from streamlit_lib.constants import HIDE_STREAMLIT_STYLE, FAVICON_B64
-from agent import SQLAgent
+from agent import get_agent
 from streamlit_lib.streamlit_handler import CallbackHandlerWithVisualization
 import streamlit as st
 
-# Update config here for the web App
-config = Config.create_custom_openai_custom_sqllite_with_chart()
+# Update the config factory here for the web App
+CONFIG_NAME = "create_custom_openai_custom_sqllite_with_chart"
 
 st.set_page_config(page_title="SQL Agent",
                    page_icon=f"data:image/png;base64,{FAVICON_B64}")
@@ -13,6 +13,13 @@ st.markdown(HIDE_STREAMLIT_STYLE, unsafe_allow_html=True)
 
 st.title("SQL Agent")
 
+# Built and warmed up once per process, reruns and sessions reuse it.
+try:
+  sql_agent = get_agent(CONFIG_NAME)
+except Exception as e:
+  st.error(f"Could not create the agent\n {e}")
+  st.stop()
+
 query = st.text_input("Query", EXAMPLE.query)
 
 if st.button("Submit"):
@@ -21,8 +28,12 @@ if st.button("Submit"):
   else:
     with st.spinner("Processing..."):
       try:
-        sql_agent = SQLAgent(config=config)
         st_callback = CallbackHandlerWithVisualization(st.container())
-        sql_agent.run(user_query=query, st_callback=st_callback)
+        result = sql_agent.run(user_query=query, st_callback=st_callback)
+        if result.get("plan_cache_hit"):
+          # The agent loop was skipped, so the callback rendered nothing.
+          action, observation = result["intermediate_steps"][0]
+          st.code(action.tool_input, language="sql")
+          st.markdown(result["output"])
       except Exception as e:
         st.error(f"An error occured, please try again\n {e}")
@@ -1,16 +1,10 @@
 
-from typing import Literal, Union, Optional
-from langchain_openai import ChatOpenAI
+import importlib
+from typing import Any, Optional
 from langchain_core.language_models import BaseLanguageModel
 from langchain_community.agent_toolkits.base import BaseToolkit
-from langchain_community.agent_toolkits.sql.base import SQLDatabaseToolkit
 from langchain_core.prompts import PromptTemplate
-from langchain_anthropic import ChatAnthropic
-from langchain.agents.agent_types import AgentType
-from llms.openai_llm import OpenAILLM
-from langchain.sql_database import SQLDatabase
 from pydantic.v1 import BaseModel
-from db_connector.sqllite_connector import SQLLiteConnector
 from agent_utils.prompts import zero_shot_prompt
 # Model Names
 GPT4_TURBO = "gpt-4-0125-preview"
@@ -19,6 +13,26 @@ CLAUDE_3_OPUS = "claude-3-opus-20240229"
 
 # Tool Names
 AGENT_TYPE_OPENAI_TOOLS = "openai-tools"
+# The value of `AgentType.ZERO_SHOT_REACT_DESCRIPTION`, importing `langchain.agents` loads every agent toolkit.
+AGENT_TYPE_ZERO_SHOT_REACT = "zero-shot-react-description"
+
+# Providers and connectors are imported by the factories that use them, so only the ones in use are loaded.
+_LAZY_IMPORTS = {
+  "ChatOpenAI": "langchain_openai",
+  "ChatAnthropic": "langchain_anthropic",
+  "OpenAILLM": "llms.openai_llm",
+  "RecordReplayLLM": "llms.record_replay_llm",
+  "REPLAY": "llms.record_replay_llm",
+  "SQLDatabaseToolkit": "langchain_community.agent_toolkits.sql.base",
+  "SQLDatabase": "langchain.sql_database",
+  "SQLLiteConnector": "db_connector.sqllite_connector",
+  "DuckDBConnector": "db_connector.duckdb_connector",
+}
+
+
+def _lazy_import(name: str) -> Any:
+  """Imports the attribute from its module in `_LAZY_IMPORTS` on first use."""
+  return getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
 
 
 class SqlliteExample(BaseModel):
@@ -34,6 +48,61 @@ _CHINOOK_SQL_EXAMPLE = SqlliteExample(
 EXAMPLE = _CHINOOK_SQL_EXAMPLE
 
 
+class SqliteEngineConfig(BaseModel):
+  """
+  Engine settings of SQLLiteConnector, see `SQLLiteConnector.initialize`.
+
+  The defaults open the database read only with a connection pool, memory mapped
+  reads and a warm page cache per connection. Set `value_index_path` to a writable file,
+  e.g. in a cache directory, to persist the value index across processes.
+  """
+  read_only: bool = True
+  pool_size: int = 5
+  max_overflow: int = 5
+  mmap_size: int = 256 * 1024 * 1024
+  cache_size: int = -64 * 1024
+  temp_store: str = "MEMORY"
+  value_index_path: Optional[str] = None
+
+
+class DuckDBConfig(BaseModel):
+  """
+  Settings of DuckDBConnector, see `DuckDBConnector.initialize`.
+
+  The defaults open an empty in-memory database on all cores, set `source_dirs`, `sources` or
+  `database` to query something.
+  """
+  database: str = ":memory:"
+  source_dirs: list[str] = []
+  sources: dict[str, str] = {}
+  threads: Optional[int] = None
+  memory_limit: Optional[str] = None
+
+
+class LLMCacheConfig(BaseModel):
+  """
+  Settings of the LLM response cache, see `TieredLLMCache`.
+
+  Every agent with the same `path` in a process shares one cache, creating an agent with other
+  settings for the same `path` raises a ValueError.
+  """
+  path: str = "data/.langchain.db"
+  memory_entries: int = 1024
+  max_entries: int = 10_000
+  ttl_seconds: Optional[float] = 7 * 24 * 3600
+
+
+def _langchain_sql_toolkit(llm: BaseLanguageModel) -> BaseToolkit:
+  """The langchain SQL toolkit on the example database."""
+  return _lazy_import("SQLDatabaseToolkit")(llm=llm, db=_lazy_import("SQLDatabase").from_uri(EXAMPLE.db_url))
+
+
+def _sqlite_connector(engine_config: Optional[SqliteEngineConfig]) -> BaseToolkit:
+  """The custom SQLite connector on the example database, with the default engine settings if None."""
+  engine_config = engine_config or SqliteEngineConfig()
+  return _lazy_import("SQLLiteConnector").create(db_url=EXAMPLE.db_url, **engine_config.dict())
+
+
 class Config(BaseModel):
   """
   A configuration class for SQLAgent that encapsulates the settings
@@ -43,56 +112,98 @@ class Config(BaseModel):
     llm (BaseLanguageModel): The language model to be used by the SQLAgent.
     prompt: Optional[PromptTemplate]: An optional template for generating prompts.
     sql_connector (BaseToolkit): The SQL database connector used by the SQLAgent.
-    agent_type (Union[AgentType, Literal["openai-tools"]]): Specifies the type of agent.
+    agent_type (str): Specifies the type of agent, an `AgentType` or "openai-tools".
+    enable_plan_cache (bool): Whether to answer repeated questions with their cached SQL instead of the agent loop.
+    plan_cache_path (Optional[str]): JSON file the plan cache is persisted to, in memory only if None.
+    plan_cache_max_plans (int): Number of plans the plan cache keeps.
+    plan_cache_summarize (bool): Whether a plan cache hit makes one LLM call to summarize the rows.
+    llm_cache (Optional[LLMCacheConfig]): The LLM response cache, None to disable it.
+    scratchpad_token_budget (Optional[int]): Estimated tokens the previous steps may take in each prompt,
+      None to send them in full.
+    scratchpad_keep_recent (int): Number of latest observations sent verbatim.
   """
   llm: BaseLanguageModel
   prompt: Optional[PromptTemplate] = None
   sql_connector: BaseToolkit
-  agent_type: Union[AgentType, Literal["openai-tools"]]
+  agent_type: str
   enable_chart: Optional[bool] = False
+  enable_plan_cache: bool = False
+  plan_cache_path: Optional[str] = None
+  plan_cache_max_plans: int = 1000
+  plan_cache_summarize: bool = True
+  llm_cache: Optional[LLMCacheConfig] = LLMCacheConfig()
+  scratchpad_token_budget: Optional[int] = 6000
+  scratchpad_keep_recent: int = 2
 
   @classmethod
   def create_default(cls):
-    llm = ChatOpenAI(model=GPT4_TURBO, temperature=0)
-    sql_connector = SQLDatabaseToolkit(llm=llm, db=SQLDatabase.from_uri(EXAMPLE.db_url))
+    llm = _lazy_import("ChatOpenAI")(model=GPT4_TURBO, temperature=0)
+    sql_connector = _langchain_sql_toolkit(llm)
     agent_type = AGENT_TYPE_OPENAI_TOOLS
     return cls(llm=llm, sql_connector=sql_connector, agent_type=agent_type)
 
   @classmethod
-  def create_default_openai_custom_sqllite(cls):
-    llm = ChatOpenAI(model=GPT4_TURBO, temperature=0)
-    sql_connector = SQLLiteConnector.create(db_url=EXAMPLE.db_url)
+  def create_default_openai_custom_sqllite(cls, engine_config: Optional[SqliteEngineConfig] = None):
+    llm = _lazy_import("ChatOpenAI")(model=GPT4_TURBO, temperature=0)
+    sql_connector = _sqlite_connector(engine_config)
     agent_type = AGENT_TYPE_OPENAI_TOOLS
     return cls(llm=llm, sql_connector=sql_connector, agent_type=agent_type)
 
   @classmethod
-  def create_default_anthropic_custom_sqlite(cls):
-    llm = ChatAnthropic(temperature=0, model_name=CLAUDE_3_OPUS)
+  def create_default_anthropic_custom_sqlite(cls, engine_config: Optional[SqliteEngineConfig] = None):
+    llm = _lazy_import("ChatAnthropic")(temperature=0, model_name=CLAUDE_3_OPUS)
     prompt = zero_shot_prompt()
-    sql_connector = SQLLiteConnector.create(db_url=EXAMPLE.db_url)
-    agent_type = AgentType.ZERO_SHOT_REACT_DESCRIPTION
+    sql_connector = _sqlite_connector(engine_config)
+    agent_type = AGENT_TYPE_ZERO_SHOT_REACT
     return cls(llm=llm, prompt=prompt, sql_connector=sql_connector, agent_type=agent_type)
 
   @classmethod
   def create_custom_openai_default_sqllite(cls):
-    llm = OpenAILLM()
+    llm = _lazy_import("OpenAILLM")()
     prompt = zero_shot_prompt()
-    sql_connector = SQLDatabaseToolkit(llm=llm, db=SQLDatabase.from_uri(EXAMPLE.db_url))
-    agent_type = AgentType.ZERO_SHOT_REACT_DESCRIPTION
+    sql_connector = _langchain_sql_toolkit(llm)
+    agent_type = AGENT_TYPE_ZERO_SHOT_REACT
     return cls(llm=llm, prompt=prompt, sql_connector=sql_connector, agent_type=agent_type)
 
   @classmethod
-  def create_custom_openai_custom_sqllite(cls):
-    llm = OpenAILLM()
+  def create_custom_openai_custom_sqllite(cls, engine_config: Optional[SqliteEngineConfig] = None):
+    llm = _lazy_import("OpenAILLM")()
     prompt = zero_shot_prompt()
-    sql_connector = SQLLiteConnector.create(db_url=EXAMPLE.db_url)
-    agent_type = AgentType.ZERO_SHOT_REACT_DESCRIPTION
+    sql_connector = _sqlite_connector(engine_config)
+    agent_type = AGENT_TYPE_ZERO_SHOT_REACT
     return cls(llm=llm, prompt=prompt, sql_connector=sql_connector, agent_type=agent_type)
 
   @classmethod
-  def create_custom_openai_custom_sqllite_with_chart(cls):
-    llm = OpenAILLM()
+  def create_custom_openai_custom_sqllite_with_chart(cls, engine_config: Optional[SqliteEngineConfig] = None):
+    llm = _lazy_import("OpenAILLM")(streaming=True)
     prompt = zero_shot_prompt()
-    sql_connector = SQLLiteConnector.create(db_url=EXAMPLE.db_url)
-    agent_type = AgentType.ZERO_SHOT_REACT_DESCRIPTION
+    sql_connector = _sqlite_connector(engine_config)
+    agent_type = AGENT_TYPE_ZERO_SHOT_REACT
     return cls(llm=llm, prompt=prompt, sql_connector=sql_connector, agent_type=agent_type, enable_chart=True)
+
+  @classmethod
+  def create_custom_openai_duckdb_with_chart(cls, duckdb_config: Optional[DuckDBConfig] = None):
+    duckdb_config = duckdb_config or DuckDBConfig()
+    llm = _lazy_import("OpenAILLM")(streaming=True)
+    prompt = zero_shot_prompt()
+    sql_connector = _lazy_import("DuckDBConnector").create(**duckdb_config.dict())
+    agent_type = AGENT_TYPE_ZERO_SHOT_REACT
+    return cls(llm=llm, prompt=prompt, sql_connector=sql_connector, agent_type=agent_type, enable_chart=True)
+
+  @classmethod
+  def create_record_replay_custom_sqllite_with_chart(cls, transcript_dir: str, mode: str = "replay",
+                                                     engine_config: Optional[SqliteEngineConfig] = None):
+    """
+    Replays recorded LLM transcripts, or records them from OpenAILLM, e.g. for offline benchmarks.
+
+    The LLM cache is disabled, cached responses would skip transcript entries.
+    """
+    inner_llm = None
+    if mode != _lazy_import("REPLAY"):
+      inner_llm = _lazy_import("OpenAILLM")()
+    llm = _lazy_import("RecordReplayLLM")(transcript_dir=transcript_dir, mode=mode, inner_llm=inner_llm)
+    prompt = zero_shot_prompt()
+    sql_connector = _sqlite_connector(engine_config)
+    agent_type = AGENT_TYPE_ZERO_SHOT_REACT
+    return cls(llm=llm, prompt=prompt, sql_connector=sql_connector, agent_type=agent_type, enable_chart=True,
+               llm_cache=None)
@@ -1,12 +1,33 @@
 from abc import ABC, abstractmethod
-import pprint
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import contextvars
+import difflib
+import functools
+import inspect
 import re
-from langchain_community.agent_toolkits.sql.toolkit import BaseToolkit
-from langchain_community.tools import BaseTool
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Generator, Hashable, Optional
+from langchain_community.agent_toolkits.base import BaseToolkit
+from langchain_core.tools import BaseTool
 from langchain.agents import tool
 import pandas as pd
 import sqlparse
 
+from db_connector.columnar import arrow_table, concat_frames
+from db_connector.result_cache import ResultCache, normalize_sql, shared_result_cache
+from db_connector.result_format import BoundedResult, render_table
+from db_connector.result_store import current_result_store
+from db_connector.schema_catalog import SchemaCatalog, TableInfo, shared_catalog
+from db_connector.schema_index import SchemaIndex
+from db_connector.table_stats import ColumnStats, TableStats, shared_stats_worker
+from db_connector.value_index import ValueIndex, is_text_type, shared_value_index
+
+if TYPE_CHECKING:
+  import pyarrow as pa
+
 
 def maybe_extract_sql(query: str) -> str:
   """Extracts the SQL code from the given query."""
@@ -23,6 +44,37 @@ def validate_sql_statement(sql_code):
       raise ValueError(f"Only SELECT statements are allowed, got: {statement.get_type()}")
 
 
+class QueryTimeoutError(TimeoutError):
+  """Raised when a query runs longer than the connector's `query_timeout_ms`."""
+
+  def __init__(self, timeout_ms: int):
+    super().__init__(f"query exceeded {timeout_ms} ms")
+    self.timeout_ms = timeout_ms
+
+
+class QueryCostError(ValueError):
+  """Raised by the cost guard when a query is rejected before it runs."""
+
+
+class QueryPreflightError(ValueError):
+  """Raised when a query does not compile against the schema, before it runs."""
+
+
+_NO_SUCH_COLUMN = re.compile(r"no such column: ([\w.]+)")
+_NO_SUCH_TABLE = re.compile(r"no such table: ([\w.]+)")
+_AMBIGUOUS_COLUMN = re.compile(r"ambiguous column name: ([\w.]+)")
+
+
+def quote_identifier(name: str) -> str:
+  """Quotes a table or column name so it can be safely embedded in generated SQL."""
+  return '"' + name.replace('"', '""') + '"'
+
+
+_EXECUTOR_LOCK = threading.Lock()
+# Absolute `time.monotonic()` deadline shared by the queries run inside `shared_deadline`.
+_QUERY_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("query_deadline", default=None)
+
+
 class AbstractSQLConnector(BaseToolkit, ABC):
   """
   An abstract base class for SQL connectors.
@@ -30,7 +82,50 @@ class AbstractSQLConnector(BaseToolkit, ABC):
   This class defines the interface for interacting with SQL databases.
   Subclasses of this class should implement the abstract methods to provide
   specific functionality for a particular SQL database.
+
+  Attributes:
+    max_concurrent_queries (int): Size of the thread pool used to run independent queries concurrently.
+    max_concurrent_tool_calls (int): Size of the thread pool the async versions of the tools run on.
+    sample_rows_limit (int): Number of sample rows shown per table by `get_table_info_and_sample_rows`.
+    max_result_rows (int): Maximum number of rows `query_database` fetches and shows to the agent.
+    max_result_bytes (int): Maximum size of the rendered result `query_database` returns to the agent.
+    chart_max_rows (int): Maximum number of rows of a query result `visualize_data` draws a chart from.
+    fetch_chunk_size (int): Number of rows fetched from the database at a time.
+    count_rows_limit (int): Rows of a truncated result are counted up to this number, larger results are
+      reported as more than it.
+    result_cache_enabled (bool): Whether query results are cached, see `query_cached`.
+    result_cache_max_bytes (int): Memory limit of the result cache shared by connectors of the same database.
+    result_cache_ttl_seconds (float): Maximum age of a cached result.
+    query_timeout_ms (Optional[int]): Wall-clock deadline of a single query, None disables it.
+    cost_guard (str): What to do with queries `check_query_cost` flags as expensive: 'off', 'warn' or 'reject'.
+    cost_guard_min_rows (int): Full scans of tables with fewer rows than this are not flagged.
+    relevant_tables_k (int): Number of tables `find_relevant_tables` returns.
+    max_listed_tables (int): Maximum number of table names `list_table_names` returns.
+    value_index_max_distinct (int): Text columns with more distinct values than this are not indexed by `value_index`.
+    value_index_path (Optional[str]): File the value index is persisted to, None keeps it in memory only.
+    table_stats_enabled (bool): Whether table statistics are computed in the background and shown in the table info.
+    stats_sample_rows (int): Column statistics of larger tables are computed over this many rows.
   """
+  max_concurrent_queries: int = 4
+  max_concurrent_tool_calls: int = 8
+  sample_rows_limit: int = 3
+  max_result_rows: int = 100
+  max_result_bytes: int = 16_000
+  chart_max_rows: int = 10_000
+  fetch_chunk_size: int = 500
+  count_rows_limit: int = 10_000
+  result_cache_enabled: bool = True
+  result_cache_max_bytes: int = 64 * 1024 * 1024
+  result_cache_ttl_seconds: float = 300.0
+  query_timeout_ms: Optional[int] = 30_000
+  cost_guard: str = 'warn'
+  cost_guard_min_rows: int = 100_000
+  relevant_tables_k: int = 5
+  max_listed_tables: int = 100
+  value_index_max_distinct: int = 1000
+  value_index_path: Optional[str] = None
+  table_stats_enabled: bool = True
+  stats_sample_rows: int = 100_000
 
   @abstractmethod
   def initialize(self, **kwargs):
@@ -53,6 +148,440 @@ class AbstractSQLConnector(BaseToolkit, ABC):
     """Execute the specified query and return the result as a string."""
     pass
 
+  def query_iter(self, query: str, chunk_size: int) -> Generator[pd.DataFrame, None, None]:
+    """
+    Execute the query and yield the result in chunks of at most `chunk_size` rows.
+
+    At least one, possibly empty, chunk is yielded so the columns are always known.
+    Override to stream from the database instead of materializing the whole result, e.g. by
+    turning every fetched batch into typed columns with `db_connector.columnar.frame_from_rows`.
+    """
+    df = self.query(query)
+    for start in range(0, max(len(df), 1), chunk_size):
+      yield df.iloc[start:start + chunk_size]
+
+  def query_arrow(self, query: str, chunk_size: Optional[int] = None) -> "pa.Table":
+    """
+    The query result as an Arrow table, built chunk by chunk from `query_iter`. Needs pyarrow.
+    Columns of mixed types become string columns, see `db_connector.columnar.arrow_table`.
+    Override for databases that return Arrow themselves.
+    """
+    with contextlib.closing(self.query_iter(query, chunk_size or self.fetch_chunk_size)) as stream:
+      return arrow_table(stream)
+
+  @contextlib.contextmanager
+  def shared_deadline(self) -> Generator[None, None, None]:
+    """Queries run inside share a single `query_timeout_ms` deadline, instead of each getting its own."""
+    if not self.query_timeout_ms or _QUERY_DEADLINE.get() is not None:
+      yield
+      return
+    token = _QUERY_DEADLINE.set(time.monotonic() + self.query_timeout_ms / 1000)
+    try:
+      yield
+    finally:
+      _QUERY_DEADLINE.reset(token)
+
+  def remaining_timeout(self) -> float:
+    """Seconds the next query may run, up to `query_timeout_ms` and within the current `shared_deadline`."""
+    timeout = self.query_timeout_ms / 1000
+    deadline = _QUERY_DEADLINE.get()
+    if deadline is not None:
+      timeout = min(timeout, deadline - time.monotonic())
+    return max(timeout, 0.0)
+
+  def count_rows(self, query: str, limit: Optional[int] = None) -> Optional[int]:
+    """
+    Counts the rows of the query result without fetching them, None if it can not be counted.
+    With a `limit` counting stops after `limit + 1` rows, so a larger result is never read in full.
+    """
+    query = query.strip().rstrip(';')
+    if limit is not None:
+      query = f"SELECT 1 FROM ({query}) LIMIT {int(limit) + 1}"
+    try:
+      return int(self.query(f"SELECT COUNT(*) FROM ({query})").iloc[0, 0])
+    except Exception:
+      return None
+
+  @property
+  def result_cache(self) -> Optional[ResultCache]:
+    """The result cache shared by every connector with the same `catalog_key` and cache settings, None if disabled."""
+    if not self.result_cache_enabled:
+      return None
+    return shared_result_cache(self.catalog_key(), self.result_cache_max_bytes,
+                               self.result_cache_ttl_seconds)
+
+  def cache_stats(self) -> dict[str, Any]:
+    """Hit/miss statistics of the result cache."""
+    cache = self.result_cache
+    return cache.stats() if cache is not None else {}
+
+  def _cached(self, key: Hashable, compute: Callable[[], Any], size_of: Callable[[Any], int]) -> Any:
+    cache = self.result_cache
+    if cache is None:
+      return compute()
+    data_version = self.data_version()
+    value = cache.get(key, data_version)
+    if value is None:
+      value = compute()
+      cache.put(key, data_version, value, size_of(value))
+    return value
+
+  def query_cached(self, query: str) -> pd.DataFrame:
+    """Same as `query`, but repeated queries are served from the result cache until the data changes."""
+    return self._cached(('query', normalize_sql(query)),
+                        lambda: self.query(query),
+                        lambda df: int(df.memory_usage(deep=True).sum()))
+
+  def fetch_bounded(self, query: str, max_rows: Optional[int] = None) -> BoundedResult:
+    """Fetches at most `max_rows` rows of the query result, served from the result cache when possible."""
+    if max_rows is None:
+      max_rows = self.max_result_rows
+    return self._cached(('bounded', normalize_sql(query), max_rows),
+                        lambda: self._fetch_bounded(query, max_rows),
+                        lambda result: int(result.df.memory_usage(deep=True).sum()))
+
+  def _fetch_bounded(self, query: str, max_rows: int) -> BoundedResult:
+    """
+    Streams the query result and stops after `max_rows` rows so memory stays bounded. Counting the
+    rows of a truncated result shares the deadline of the query.
+    """
+    with self.shared_deadline():
+      return self._fetch_bounded_rows(query, max_rows)
+
+  def _fetch_bounded_rows(self, query: str, max_rows: int) -> BoundedResult:
+    chunks, fetched_rows = [], 0
+    # Fetch one extra row to know whether the result was truncated.
+    chunk_size = min(self.fetch_chunk_size, max_rows + 1)
+    with contextlib.closing(self.query_iter(query, chunk_size)) as stream:
+      for chunk in stream:
+        chunks.append(chunk)
+        fetched_rows += len(chunk)
+        if fetched_rows > max_rows:
+          break
+    df = concat_frames(chunks).reset_index(drop=True)
+    if fetched_rows <= max_rows:
+      return BoundedResult(df=df)
+    limit = max(self.count_rows_limit, max_rows)
+    total_rows = self.count_rows(query, limit)
+    if total_rows is not None and total_rows > limit:
+      return BoundedResult(df=df.iloc[:max_rows], truncated=True, min_total_rows=limit)
+    return BoundedResult(df=df.iloc[:max_rows], truncated=True, total_rows=total_rows)
+
+  def estimate_row_count(self, table: str) -> Optional[int]:
+    """Estimated number of rows of the table, cached until the data changes."""
+    try:
+      return int(self.query_cached(f"SELECT COUNT(*) FROM {quote_identifier(table)}").iloc[0, 0])
+    except Exception:
+      return None
+
+  def check_query_cost(self, query: str) -> list[str]:
+    """
+    Inspects the query plan before the query runs and describes the expensive parts.
+
+    Returns:
+      list[str]: One message per problem, e.g. an unindexed full scan of a large table.
+        Connectors that can not inspect the plan return an empty list.
+    """
+    return []
+
+  def guarded_fetch(self, query: str) -> str:
+    """
+    Runs the cost guard, then fetches and renders the bounded result for the agent.
+
+    Inside a `result_store_scope` the fetched rows are registered and the result starts
+    with their handle, which other tools accept instead of the data itself. Charts of a
+    truncated result fetch it again, up to `chart_max_rows` rows.
+
+    Raises:
+      QueryPreflightError: If the query does not compile against the schema.
+      QueryCostError: If the cost guard rejects the query.
+    """
+    error = self.checked_preflight(query)
+    if error:
+      raise QueryPreflightError(error)
+    warnings = [] if self.cost_guard == 'off' else self.check_query_cost(query)
+    if warnings and self.cost_guard == 'reject':
+      raise QueryCostError("query rejected by the cost guard: " + "; ".join(warnings) +
+                           ". Filter on indexed columns or aggregate in smaller steps.")
+    bounded = self.fetch_bounded(query)
+    result = bounded.render(self.max_result_bytes)
+    if warnings:
+      result = "Warning: " + "; ".join(warnings) + "\n\n" + result
+    store = current_result_store()
+    if store is not None:
+      refetch = functools.partial(self.fetch_bounded, query, self.chart_max_rows) if bounded.truncated else None
+      handle = store.put(bounded, query, refetch)
+      result = (f"Result handle: {handle} ({len(bounded.df)} rows, columns: "
+                f"{', '.join(str(column) for column in bounded.df.columns)})\n\n{result}")
+    return result
+
+  def preflight(self, query: str) -> Optional[str]:
+    """
+    Compiles the query against the schema without running it and returns the database's error,
+    None if it compiles. Connectors that cannot compile a statement without running it return None.
+    """
+    return None
+
+  def checked_preflight(self, query: str) -> Optional[str]:
+    """
+    Runs `preflight` and adds the closest table and column names to the error.
+
+    Outcomes are memoized per normalized query until the schema changes, so retried and
+    cached queries do not compile again.
+    """
+    catalog = self.catalog
+    tables = catalog.tables(self)
+    key = ('preflight', normalize_sql(query))
+    error = catalog.memo_get(key, catalog.version, per_query=True)
+    if error is None:
+      error = self.preflight(query) or ""
+      if error:
+        error = self.compile_error_hint(error, query, tables)
+      catalog.memo_put(key, catalog.version, error, per_query=True)
+    return error or None
+
+  def compile_error_hint(self, error: str, query: str, tables: dict[str, TableInfo]) -> str:
+    """Appends the names of the schema closest to the unknown or ambiguous name in a compile error."""
+    columns = [(table.name, column) for table in tables.values() for column in table.column_names()]
+    words = {word.lower() for word in re.findall(r"\w+", query)}
+    queried = [(table, column) for table, column in columns if table.lower() in words]
+    if match := _NO_SUCH_COLUMN.search(error):
+      name = match.group(1).rpartition(".")[2]
+      by_name: dict[str, list[str]] = {}
+      for table, column in columns:
+        by_name.setdefault(column.lower(), []).append(f"{table}.{column}")
+      # A column of that name in another table means the query joins the wrong tables.
+      close = [name.lower()] if name.lower() in by_name else difflib.get_close_matches(
+        name.lower(), list(by_name), n=3, cutoff=0.6)
+      if close:
+        names = [full_name for column in close for full_name in by_name[column]]
+        return f"{error}. Did you mean: {', '.join(names[:5])}?"
+    elif match := _NO_SUCH_TABLE.search(error):
+      close = difflib.get_close_matches(match.group(1).rpartition('.')[2], list(tables), n=3, cutoff=0.5)
+      if close:
+        return f"{error}. Did you mean: {', '.join(close)}?"
+      return f"{error}. Tables: {', '.join(tables)}"
+    elif match := _AMBIGUOUS_COLUMN.search(error):
+      owners = [f"{table}.{column}" for table, column in queried or columns if column == match.group(1)]
+      if owners:
+        return f"{error}. Qualify it with its table, one of: {', '.join(owners)}"
+    return error
+
+  def catalog_key(self) -> str:
+    """Identifies the database. Connectors returning the same key share one schema catalog and result cache."""
+    return f"{self.__class__.__name__}:{id(self)}"
+
+  def schema_version(self) -> Any:
+    """A value that changes whenever the schema changes. None means the schema is assumed static."""
+    return None
+
+  def reflect_schema(self) -> dict[str, TableInfo]:
+    """Reflect tables, columns and keys. Override to provide more than the table names."""
+    return {name: TableInfo(name=name) for name in self.table_names()}
+
+  def data_version(self) -> Any:
+    """A value that changes whenever the data changes. None means the data is assumed static."""
+    return None
+
+  def file_version(self) -> Any:
+    """
+    The part of `data_version` that reads the same in every process, e.g. file modification times
+    and sizes, so data persisted by one process can be trusted by the next. Defaults to `data_version`.
+    """
+    return self.data_version()
+
+  def sample_rows(self, table: str, limit: int) -> pd.DataFrame:
+    """Returns the first `limit` rows of the table, and adds their values to the schema index."""
+    df = self.query_cached(f"SELECT * FROM {quote_identifier(table)} LIMIT {int(limit)}")
+    self.schema_index().set_samples(table, df)
+    return df
+
+  def _executor(self, attribute: str, max_workers: int) -> ThreadPoolExecutor:
+    with _EXECUTOR_LOCK:
+      if getattr(self, attribute, None) is None:
+        setattr(self, attribute, ThreadPoolExecutor(max_workers=max_workers,
+                                                    thread_name_prefix=self.__class__.__name__))
+      return getattr(self, attribute)
+
+  def query_executor(self) -> ThreadPoolExecutor:
+    """The thread pool used to run independent queries of this connector concurrently."""
+    return self._executor('_query_executor', self.max_concurrent_queries)
+
+  def tool_executor(self) -> ThreadPoolExecutor:
+    """
+    The thread pool the async tools run on.
+
+    Separate from `query_executor`, since a tool may itself wait on queries running there.
+    """
+    return self._executor('_tool_executor', self.max_concurrent_tool_calls)
+
+  async def aquery(self, query: str) -> pd.DataFrame:
+    """Async version of `query`, runs the query on the connector's thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(self.query_executor(), self.query, query)
+
+  def _with_async_support(self, sync_tool: BaseTool) -> BaseTool:
+    """Adds a coroutine to the tool that runs it on `tool_executor` instead of blocking the event loop."""
+    func = sync_tool.func
+
+    async def coroutine(*args, **kwargs):
+      # Copy the context so context variables of the agent run are visible in the pool thread.
+      call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+      return await asyncio.get_running_loop().run_in_executor(self.tool_executor(), call)
+
+    sync_tool.coroutine = coroutine
+    return sync_tool
+
+  def table_info_blocks(self, tables: list[str]) -> list[str]:
+    """
+    Renders the schema and sample rows of each table.
+
+    Rendered blocks are memoized in the schema catalog until the schema or the data
+    changes, and the sample rows of the remaining tables are fetched concurrently. Blocks
+    rendered before the statistics of their table were ready are rendered again once they are.
+    """
+    catalog = self.catalog
+    known_tables = catalog.tables(self)
+    data_version = self.data_version()
+    stats = {table: self.table_stats(table, data_version) for table in tables if table in known_tables}
+    memo_keys = {table: ('table_info', table, stats.get(table) is not None) for table in tables}
+    blocks = {table: catalog.memo_get(memo_keys[table], data_version) for table in tables}
+    missing = [table for table, block in blocks.items() if block is None]
+
+    def sample(table: str) -> tuple[Optional[pd.DataFrame], Optional[Exception]]:
+      if known_tables and table not in known_tables:
+        return None, ValueError(f"no such table: {table}")
+      try:
+        return self.sample_rows(table, self.sample_rows_limit), None
+      except Exception as e:
+        return None, e
+
+    for table, (df, error) in zip(missing, self.query_executor().map(sample, missing)):
+      block = f"#### Table: {table}\n\n"
+      if error is not None:
+        blocks[table] = block + f"Error: {error}"
+        continue
+      info = known_tables.get(table)
+      if info is not None and info.columns:
+        block += f"```sql\n{info.ddl()}\n```\n\n"
+      block += render_table(df)[0]
+      if stats.get(table) is not None and stats[table].render():
+        block += "\n\n" + stats[table].render()
+      catalog.memo_put(memo_keys[table], data_version, block)
+      blocks[table] = block
+    return [blocks[table] for table in tables]
+
+  def schema_index(self) -> SchemaIndex:
+    """
+    The search index of the tables, built from the schema catalog without querying the database.
+
+    The index is memoized in the schema catalog until the schema changes. `sample_rows` adds
+    the values of a table's sample rows to it, and replaces them when the rows changed.
+    """
+    catalog = self.catalog
+    tables = catalog.tables(self)
+    index = catalog.memo_get(('schema_index',), catalog.version)
+    if index is None:
+      index = SchemaIndex.build(tables)
+      catalog.memo_put(('schema_index',), catalog.version, index)
+    return index
+
+  def relevant_tables(self, question: str, k: Optional[int] = None) -> list[str]:
+    """The names of the tables that best match the question, best first."""
+    return [table for table, _ in self.schema_index().search(question, k or self.relevant_tables_k)]
+
+  def table_fingerprint(self, table: str) -> Any:
+    """
+    A cheap value that changes when the rows of the table change, used to refresh the value index
+    table by table. None means unknown, the table is then read again whenever `data_version` changes.
+    """
+    return None
+
+  def distinct_values(self, table: str, column: str, limit: int) -> Optional[list[str]]:
+    """The distinct non null values of the column, None if there are more than `limit`."""
+    df = self.query(f"SELECT DISTINCT {quote_identifier(column)} FROM {quote_identifier(table)} "
+                    f"WHERE {quote_identifier(column)} IS NOT NULL LIMIT {int(limit) + 1}")
+    if len(df) > limit:
+      return None
+    return [str(value) for value in df.iloc[:, 0]]
+
+  def sample_query(self, table: str, rows: int, row_count: int) -> Optional[str]:
+    """
+    A query of about `rows` rows spread over the whole table of `row_count` rows, e.g. with the
+    database's sampling clause. None if the connector can only read the first rows.
+    """
+    return None
+
+  def compute_table_stats(self, table: str) -> TableStats:
+    """
+    Estimates the rows, then counts the distinct values and nulls of every column and the range of the
+    columns that are not text, in one query over a sample of `stats_sample_rows` rows of larger tables.
+    Runs on the statistics worker.
+    """
+    info = self.catalog.table(self, table)
+    if info is None or not info.columns:
+      return TableStats(table=table, error="no column information")
+    quoted_table = quote_identifier(table)
+    row_count = self.estimate_row_count(table)
+    source, first_rows = quoted_table, False
+    if row_count is not None and row_count > self.stats_sample_rows:
+      sample = self.sample_query(table, self.stats_sample_rows, row_count)
+      first_rows = sample is None
+      if first_rows:
+        sample = f"SELECT * FROM {quoted_table} LIMIT {int(self.stats_sample_rows)}"
+      source = f"({sample})"
+    selects = ["COUNT(*)"]
+    for column in info.columns:
+      quoted = quote_identifier(column.name)
+      selects += [f"COUNT(DISTINCT {quoted})", f"COUNT({quoted})"]
+      if not is_text_type(column.type):
+        selects += [f"MIN({quoted})", f"MAX({quoted})"]
+    # A row of the dataframe keeps the type of every column, integers would become floats in `iloc`.
+    values = iter(next(self.query(f"SELECT {', '.join(selects)} FROM {source}").itertuples(index=False, name=None)))
+    sampled_rows = int(next(values))
+    columns = []
+    for column in info.columns:
+      distinct, non_null = int(next(values)), int(next(values))
+      column_stats = ColumnStats(name=column.name, distinct=distinct,
+                                 null_fraction=1 - non_null / sampled_rows if sampled_rows else 0.0)
+      if not is_text_type(column.type):
+        low, high = next(values), next(values)
+        if non_null:
+          column_stats.min, column_stats.max = str(low), str(high)
+      columns.append(column_stats)
+    if source == quoted_table:
+      row_count = sampled_rows
+    return TableStats(table=table, row_count=row_count, sampled_rows=sampled_rows, first_rows=first_rows,
+                      columns=columns)
+
+  def table_stats(self, table: str, data_version: Any = None) -> Optional[TableStats]:
+    """
+    The statistics of the table at the given data version, None while the statistics worker
+    is still computing them. Asking for missing statistics queues them.
+    """
+    if not self.table_stats_enabled:
+      return None
+    stats = self.catalog.memo_get(('table_stats', table), data_version)
+    if stats is None:
+      shared_stats_worker().request(self, table, data_version)
+    return stats
+
+  def value_index(self) -> ValueIndex:
+    """The index of the distinct values of the text columns, refreshed when the data changes."""
+    return shared_value_index(self, self.value_index_path, self.value_index_max_distinct)
+
+  @property
+  def catalog(self) -> SchemaCatalog:
+    """The schema catalog shared by every connector with the same `catalog_key`."""
+    return shared_catalog(self.catalog_key())
+
+  def warmup(self):
+    """Reflects the schema into the shared catalog and loads the value index, so the first question does not wait."""
+    tables = self.catalog.tables(self)
+    self.value_index()
+    data_version = self.data_version()
+    for table in tables:
+      self.table_stats(table, data_version)
+
   class Config:
     """override pydantic validation to allow implementaions to have extra fields."""
     arbitrary_types_allowed = True
@@ -61,7 +590,10 @@ class AbstractSQLConnector(BaseToolkit, ABC):
   @classmethod
   def create(cls, **kwargs):
     """Create an instance of the connector. This method should be used to create an instance of the connector."""
-    obj = cls()
+    initialize_args = inspect.signature(cls.initialize).parameters
+    fields = {key: kwargs.pop(key) for key in list(kwargs)
+              if key in cls.__fields__ and key not in initialize_args}
+    obj = cls(**fields)
     obj.initialize(**kwargs)
     return obj
 
@@ -76,30 +608,55 @@ class AbstractSQLConnector(BaseToolkit, ABC):
     @tool
     def list_table_names(args={}) -> str:
       """Comma separated list of the names of the tables in the database."""
-      return ",".join(self.table_names())
+      names = self.table_names()
+      if len(names) <= self.max_listed_tables:
+        return ",".join(names)
+      return (",".join(names[:self.max_listed_tables]) + f"\n\n... and {len(names) - self.max_listed_tables} "
+              "more tables, use find_relevant_tables to search them.")
+
+    @tool
+    def find_relevant_tables(question: str) -> str:
+      """ Returns the tables most relevant to the question with their columns, best match first. """
+      known_tables = self.catalog.tables(self)
+      lines = []
+      for table in self.relevant_tables(question):
+        info = known_tables[table]
+        references = sorted({fk.referred_table for fk in info.foreign_keys})
+        line = f"{table}: {', '.join(info.column_names())}"
+        lines.append(line + (f" (references {', '.join(references)})" if references else ""))
+      return "\n".join(lines) or "No table matches the question, use list_table_names."
+
+    @tool
+    def find_column_values(phrase: str) -> str:
+      """ Finds the exact values stored in the database closest to a name or phrase of the question, e.g. an artist or a country, and the columns holding them. """
+      matches = self.value_index().lookup(phrase.strip().strip('"\''))
+      if not matches:
+        return f"No stored value matches {phrase!r}."
+      return "\n".join(f"{match.table}.{match.column} = {match.value!r} (score {match.score:g})"
+                       for match in matches)
 
     @tool
     def get_table_info_and_sample_rows(comma_separated_table_names: str) -> str:
-      """ Retrieves information and sample about the specified tables. """
-      tables = comma_separated_table_names.split(",")
-      result = "Following are the tables with sample data, where the dictionary key is column name, and data is limited to 3 rows:\n\n"
-      for table in tables:
-        result += f"#### Table: {table}\n\n"
-        result += query_database(f"SELECT * FROM {table} LIMIT 3")
-        result += "\n\n\n"
-      return result
+      """ Retrieves the schema (column types, primary and foreign keys) and sample rows of the specified tables. """
+      tables = list(dict.fromkeys(table.strip() for table in comma_separated_table_names.split(",")
+                                  if table.strip()))
+      result = ("Following are the tables with their schema and sample data, "
+                f"where data is limited to {self.sample_rows_limit} rows:\n\n")
+      return result + "\n\n\n".join(self.table_info_blocks(tables)) + "\n\n\n"
 
     @tool
     def query_database(query: str) -> str:
-      """ Queries the database with the specified query. """
+      """ Queries the database with the specified query. Large results are truncated. """
       try:
         query = maybe_extract_sql(query)
         validate_sql_statement(query)
-        return pprint.pformat(self.query(query).to_dict('list'), indent=2)
+        return self.guarded_fetch(query)
       except Exception as e:
         return f"Error: {e}"
-    return [
+    return [self._with_async_support(sync_tool) for sync_tool in [
         list_table_names,
+        find_relevant_tables,
+        find_column_values,
         get_table_info_and_sample_rows,
         query_database
-    ]
+    ]]
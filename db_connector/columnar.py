@@ -0,0 +1,101 @@
+"""Builds dataframes column by column from fetched rows, with the dtypes pandas would infer."""
+from typing import TYPE_CHECKING, Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+  import pyarrow as pa
+
+
+def column_array(values: Sequence) -> np.ndarray:
+  """
+  Converts the values of one column to a typed array: int64 for integers, float64 with NaN for
+  numbers with nulls and object for everything else, like `pd.DataFrame` does for rows.
+  """
+  kinds = {type(value) for value in values}
+  if kinds and kinds <= {int}:
+    try:
+      return np.fromiter(values, dtype=np.int64, count=len(values))
+    except OverflowError:
+      pass
+  elif kinds - {type(None)} and kinds <= {int, float, type(None)}:
+    return np.fromiter((np.nan if value is None else value for value in values), dtype=np.float64,
+                       count=len(values))
+  array = np.empty(len(values), dtype=object)
+  array[:] = values
+  return array
+
+
+def frame_from_rows(rows: Sequence[Sequence], columns: Sequence[str]) -> pd.DataFrame:
+  """A dataframe of the rows, transposed into one typed array per column."""
+  if not rows:
+    return pd.DataFrame(columns=list(columns))
+  arrays = [column_array(values) for values in zip(*rows)]
+  return _frame(arrays, columns)
+
+
+def concat_frames(chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+  """
+  Concatenates chunks column by column, so every column is copied once into its final array.
+  Chunks of a column with different dtypes are upcast, e.g. int64 and float64 to float64, and
+  chunks holding only nulls of an otherwise numeric column become NaN, as they would in one chunk.
+  """
+  chunks = list(chunks)
+  if len(chunks) == 1:
+    return chunks[0]
+  non_empty = [chunk for chunk in chunks if len(chunk)] or chunks[:1]
+  columns = list(chunks[0].columns)
+  arrays = []
+  for position in range(len(columns)):
+    parts = [chunk.iloc[:, position].to_numpy() for chunk in non_empty]
+    if any(_is_numeric(part) for part in parts) and all(_is_numeric(part) or _all_null(part) for part in parts):
+      parts = [part if _is_numeric(part) else np.full(len(part), np.nan) for part in parts]
+    if len({part.dtype for part in parts}) > 1 and any(part.dtype == object for part in parts):
+      parts = [part.astype(object) for part in parts]
+    arrays.append(np.concatenate(parts))
+  return _frame(arrays, columns)
+
+
+def arrow_table(chunks: Iterable[pd.DataFrame]) -> "pa.Table":
+  """
+  Converts the chunks to one Arrow table, needs pyarrow. Columns Arrow has no single type for,
+  e.g. the mixed integers and strings SQLite allows in a column, become string columns.
+  """
+  import pyarrow as pa
+  tables = []
+  for chunk in chunks:
+    try:
+      tables.append(pa.Table.from_pandas(chunk, preserve_index=False))
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+      arrays = []
+      for position in range(chunk.shape[1]):
+        values = chunk.iloc[:, position]
+        try:
+          arrays.append(pa.array(values, from_pandas=True))
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+          arrays.append(pa.array([None if value is None else str(value) for value in values], type=pa.string()))
+      tables.append(pa.Table.from_arrays(arrays, names=[str(column) for column in chunk.columns]))
+  # A column of strings in one chunk and of numbers in another is read as strings everywhere.
+  for position in range(tables[0].num_columns):
+    types = {table.schema.types[position] for table in tables} - {pa.null()}
+    if pa.string() in types and len(types) > 1:
+      tables = [table.set_column(position, table.schema.names[position], table.column(position).cast(pa.string()))
+                for table in tables]
+  # A column can be int64 in one chunk and double in a later one with nulls.
+  return pa.concat_tables(tables, promote_options="permissive")
+
+
+def _is_numeric(array: np.ndarray) -> bool:
+  return array.dtype.kind in 'iuf'
+
+
+def _all_null(array: np.ndarray) -> bool:
+  return array.dtype == object and all(value is None for value in array)
+
+
+def _frame(arrays: list[np.ndarray], columns: Sequence[str]) -> pd.DataFrame:
+  # Positional construction keeps duplicate column names, e.g. of `SELECT a.id, b.id`.
+  df = pd.DataFrame(dict(enumerate(arrays)), copy=False)
+  df.columns = list(columns)
+  return df
@@ -0,0 +1,248 @@
+import contextlib
+import glob
+import hashlib
+import os
+import re
+import threading
+from typing import Generator, Optional
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+from db_connector.abstract_sql_connector import AbstractSQLConnector, QueryTimeoutError, quote_identifier
+from db_connector.schema_catalog import ColumnInfo, ForeignKeyInfo, TableInfo
+
+# The DuckDB file is attached read only under this name, the views over the sources live in memory.
+ATTACHED_DATABASE = "db"
+PARQUET_SUFFIXES = (".parquet",)
+CSV_SUFFIXES = (".csv", ".tsv", ".csv.gz", ".tsv.gz")
+
+# DuckDB binder and catalog errors, rewritten to the SQLite wording `compile_error_hint` understands.
+_PREFLIGHT_ERRORS = [
+  (re.compile(r'Referenced column "([^"]+)" not found'), "no such column: {}"),
+  (re.compile(r"Table with name (\S+) does not exist"), "no such table: {}"),
+  (re.compile(r'Ambiguous reference to column name "([^"]+)"'), "ambiguous column name: {}"),
+]
+
+
+def source_reader(path: str) -> str:
+  """The table function reading a Parquet or CSV file or glob, e.g. `read_parquet('data/sales/*.parquet')`."""
+  literal = "'" + path.replace("'", "''") + "'"
+  if path.lower().endswith(PARQUET_SUFFIXES):
+    return f"read_parquet({literal})"
+  if path.lower().endswith(CSV_SUFFIXES):
+    return f"read_csv_auto({literal})"
+  raise ValueError(f"Unsupported source, expected Parquet or CSV: {path}")
+
+
+def discover_sources(directory: str) -> dict[str, str]:
+  """
+  One table per Parquet or CSV file of the directory, named after the file, and one per
+  subdirectory of Parquet files, e.g. a hive partitioned extract, named after the subdirectory.
+  """
+  if not os.path.isdir(directory):
+    raise FileNotFoundError(f"Source directory not found: {directory}")
+  sources = {}
+  for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+    name = entry.name
+    if entry.is_file() and name.lower().endswith(PARQUET_SUFFIXES + CSV_SUFFIXES):
+      sources[re.sub(r"\W+", "_", name.split(".")[0])] = entry.path
+    elif entry.is_dir() and glob.glob(os.path.join(entry.path, "**", "*.parquet"), recursive=True):
+      sources[re.sub(r"\W+", "_", name)] = os.path.join(entry.path, "**", "*.parquet")
+  return sources
+
+
+class DuckDBConnector(AbstractSQLConnector):
+  """
+  A DuckDB connector for analytical queries over a DuckDB file and local Parquet and CSV files.
+
+  Every source file is registered as a view of an in-memory database, so queries always read
+  the current files and DuckDB's multi-threaded vectorized engine scans only the columns they
+  need. A DuckDB file is attached read only next to the views and is never written to. Results
+  reach pandas through Arrow.
+  """
+
+  database: Optional[str]
+  sources: Optional[dict[str, str]]
+
+  def initialize(self, database: str = ":memory:",
+                 sources: Optional[dict[str, str]] = None,
+                 source_dirs: Optional[list[str]] = None,
+                 threads: Optional[int] = None,
+                 memory_limit: Optional[str] = None):
+    """
+    Opens an in-memory database, attaches the DuckDB file read only and registers the source files as views.
+
+    Args:
+      database (str): Path of a DuckDB file, or `:memory:` to only query the sources.
+      sources (Optional[dict[str, str]]): Table name to Parquet or CSV file or glob, e.g. `data/sales/*.parquet`.
+      source_dirs (Optional[list[str]]): Directories whose files and Parquet subdirectories become tables,
+        see `discover_sources`.
+      threads (Optional[int]): Number of threads DuckDB runs a query on, all cores if None.
+      memory_limit (Optional[str]): Memory DuckDB may use, e.g. `4GB`.
+    """
+    self.database = database
+    self.sources = dict(sources or {})
+    for directory in source_dirs or []:
+      self.sources.update(discover_sources(directory))
+
+    config = {}
+    if threads is not None:
+      config["threads"] = int(threads)
+    if memory_limit is not None:
+      config["memory_limit"] = memory_limit
+    self._connection = duckdb.connect(":memory:", config=config)
+    self._catalogs = ["memory"]
+    if database != ":memory:":
+      if not os.path.isfile(database):
+        raise FileNotFoundError(f"DuckDB file not found: {database}")
+      literal = "'" + database.replace("'", "''") + "'"
+      self._connection.execute(f"ATTACH {literal} AS {ATTACHED_DATABASE} (READ_ONLY)")
+      self._catalogs.append(ATTACHED_DATABASE)
+    for name, path in self.sources.items():
+      self._connection.execute(f"CREATE VIEW {quote_identifier(name)} AS SELECT * FROM {source_reader(path)}")
+    self._connection_lock = threading.Lock()
+
+  @contextlib.contextmanager
+  def _cursor(self) -> Generator[duckdb.DuckDBPyConnection, None, None]:
+    """A connection of its own to the same database, so concurrent queries do not share state."""
+    with self._connection_lock:
+      cursor = self._connection.cursor()
+    try:
+      # The search path is a setting of the cursor, it resolves unqualified names in the views first.
+      search_path = ",".join(f"{catalog}.main" for catalog in self._catalogs)
+      cursor.execute(f"SET search_path = '{search_path}'")
+      yield cursor
+    finally:
+      cursor.close()
+
+  @contextlib.contextmanager
+  def _deadline(self, cursor: duckdb.DuckDBPyConnection):
+    """Interrupts the query running on the cursor once `query_timeout_ms` has passed."""
+    if not self.query_timeout_ms:
+      yield
+      return
+    timer = threading.Timer(self.remaining_timeout(), cursor.interrupt)
+    timer.daemon = True
+    timer.start()
+    try:
+      yield
+    except duckdb.InterruptException as e:
+      raise QueryTimeoutError(self.query_timeout_ms) from e
+    finally:
+      timer.cancel()
+
+  def dialect(self) -> str:
+    return 'duckdb'
+
+  def catalog_key(self) -> str:
+    database = self.database if self.database == ':memory:' else os.path.abspath(self.database)
+    sources = ",".join(f"{name}={path}" for name, path in sorted(self.sources.items()))
+    return f"duckdb:{database}:{sources}"
+
+  def _columns(self, cursor: duckdb.DuckDBPyConnection) -> list[tuple]:
+    """Catalog, table, column, type and nullability of every column of the views and the attached file."""
+    return cursor.execute("SELECT table_catalog, table_name, column_name, data_type, is_nullable "
+                          "FROM information_schema.columns "
+                          "WHERE table_catalog IN (SELECT unnest(?)) AND table_schema = 'main' "
+                          "ORDER BY table_catalog != 'memory', table_name, ordinal_position",
+                          [self._catalogs]).fetchall()
+
+  def schema_version(self) -> str:
+    """A hash of the tables and views with their columns and types."""
+    with self._cursor() as cursor:
+      columns = self._columns(cursor)
+    return hashlib.sha256(repr(columns).encode()).hexdigest()
+
+  def data_version(self) -> Optional[tuple]:
+    """The modification times and sizes of the DuckDB file and of every source file."""
+    paths = [path for pattern in self.sources.values() for path in glob.glob(pattern, recursive=True)]
+    if self.database and self.database != ':memory:':
+      paths.append(self.database)
+    if not paths:
+      return None
+    versions = []
+    for path in paths:
+      try:
+        stat = os.stat(path)
+      except FileNotFoundError:
+        # Removed between the glob and the stat, e.g. while an extract is rewritten.
+        continue
+      versions.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(versions))
+
+  def reflect_schema(self) -> dict[str, TableInfo]:
+    """
+    Reflects the views and the tables of the attached file, and the keys DuckDB knows of. A view
+    hides a table of the file with the same name, as it does in queries.
+    """
+    with self._cursor() as cursor:
+      columns = self._columns(cursor)
+      primary_keys = {(catalog, table): columns for catalog, table, columns in cursor.execute(
+        "SELECT database_name, table_name, constraint_column_names FROM duckdb_constraints() "
+        "WHERE schema_name = 'main' AND constraint_type = 'PRIMARY KEY'").fetchall()}
+      try:
+        foreign_keys = cursor.execute("SELECT database_name, table_name, constraint_column_names, "
+                                      "referenced_table, referenced_column_names FROM duckdb_constraints() "
+                                      "WHERE schema_name = 'main' AND constraint_type = 'FOREIGN KEY'").fetchall()
+      except duckdb.Error:
+        # Older DuckDB versions do not report the referenced table.
+        foreign_keys = []
+
+    tables: dict[str, TableInfo] = {}
+    catalogs: dict[str, str] = {}
+    for catalog, table, column, data_type, is_nullable in columns:
+      if catalogs.setdefault(table, catalog) != catalog:
+        continue
+      primary_key = list(primary_keys.get((catalog, table)) or [])
+      info = tables.setdefault(table, TableInfo(name=table, primary_key=primary_key))
+      info.columns.append(ColumnInfo(name=column, type=data_type, nullable=is_nullable == 'YES',
+                                     primary_key=column in primary_key))
+    for catalog, table, constrained, referred_table, referred_columns in foreign_keys:
+      if table in tables and catalogs[table] == catalog:
+        tables[table].foreign_keys.append(ForeignKeyInfo(columns=list(constrained), referred_table=referred_table,
+                                                         referred_columns=list(referred_columns)))
+    return dict(sorted(tables.items()))
+
+  def table_names(self) -> list[str]:
+    """Returns all the tables and views from the cached schema catalog."""
+    return self.catalog.table_names(self)
+
+  def sample_query(self, table: str, rows: int, row_count: int) -> Optional[str]:
+    """A reservoir sample of the table."""
+    return f"SELECT * FROM {quote_identifier(table)} USING SAMPLE {int(rows)} ROWS"
+
+  def preflight(self, query: str) -> Optional[str]:
+    """Plans the query with `EXPLAIN`, which binds it against the schema without running it."""
+    try:
+      with self._cursor() as cursor, self._deadline(cursor):
+        cursor.execute(f"EXPLAIN {query}").fetchall()
+    except (duckdb.BinderException, duckdb.CatalogException, duckdb.ParserException) as e:
+      message = str(e).splitlines()[0]
+      for pattern, template in _PREFLIGHT_ERRORS:
+        match = pattern.search(message)
+        if match:
+          return template.format(match.group(1))
+      return message
+    return None
+
+  def query_arrow(self, query: str, chunk_size: Optional[int] = None) -> pa.Table:
+    """The result as DuckDB produces it, an Arrow table, without converting it row by row."""
+    with self._cursor() as cursor, self._deadline(cursor):
+      return cursor.execute(query).fetch_arrow_table()
+
+  def query(self, query: str) -> pd.DataFrame:
+    """Run the query and convert the Arrow result to pandas, without copying columns that need no conversion."""
+    return self.query_arrow(query).to_pandas(split_blocks=True, self_destruct=True)
+
+  def query_iter(self, query: str, chunk_size: int) -> Generator[pd.DataFrame, None, None]:
+    """Streams the result as Arrow record batches of `chunk_size` rows, the cursor closes with the generator."""
+    with self._cursor() as cursor, self._deadline(cursor):
+      reader = cursor.execute(query).fetch_record_batch(chunk_size)
+      first_chunk = True
+      for batch in reader:
+        if batch.num_rows or first_chunk:
+          yield batch.to_pandas()
+        first_chunk = False
+      if first_chunk:
+        yield reader.schema.empty_table().to_pandas()
@@ -0,0 +1,151 @@
+"""LRU cache of query results keyed on normalized SQL."""
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Hashable, Optional
+
+import sqlparse
+from sqlparse import tokens as T
+
+
+# Keywords that end a select list at its own nesting level.
+_SELECT_LIST_END = {"FROM", "WHERE", "GROUP BY", "HAVING", "WINDOW", "ORDER BY", "LIMIT",
+                    "UNION", "UNION ALL", "INTERSECT", "EXCEPT"}
+
+
+def _is_blank(token) -> bool:
+  return token.ttype in T.Comment or token.ttype in T.Whitespace or token.ttype in T.Newline
+
+
+def normalize_sql(sql: str) -> str:
+  """
+  Strips comments and redundant whitespace and upper cases keywords, so equivalent SQL shares a key.
+
+  Select lists are kept exactly as written, since they name the result columns: an alias like
+  `AS Year` or an expression like `count(*)` without alias is the column name. Literals and
+  quoted identifiers are kept as well, since changing them changes the result.
+  """
+  parts = []
+  for statement in sqlparse.parse(sql):
+    depth = 0
+    # The select list being copied verbatim, with the nesting level of its SELECT.
+    select_list, select_depth = None, None
+    for token in statement.flatten():
+      if select_list is not None:
+        ends_list = ((token.ttype in T.Keyword and token.normalized in _SELECT_LIST_END and depth == select_depth)
+                     or (token.match(T.Punctuation, ")") and depth == select_depth))
+        if not ends_list:
+          select_list.append(token)
+          depth += token.match(T.Punctuation, "(") - token.match(T.Punctuation, ")")
+          continue
+        parts.append(" " + "".join(part.value for part in select_list).strip())
+        if token.ttype in T.Keyword:
+          parts.append(" ")
+        select_list = None
+      if _is_blank(token):
+        if parts and parts[-1] != " ":
+          parts.append(" ")
+      elif token.ttype in T.Keyword:
+        parts.append(token.value.upper())
+        if token.normalized == "SELECT":
+          select_list, select_depth = [], depth
+      else:
+        parts.append(token.value)
+      depth += token.match(T.Punctuation, "(") - token.match(T.Punctuation, ")")
+    if select_list is not None:
+      parts.append(" " + "".join(part.value for part in select_list).strip())
+  return "".join(parts).strip().rstrip(';').strip()
+
+
+class ResultCache:
+  """
+  Thread safe LRU cache bounded by total size in bytes and by entry age.
+
+  Every lookup carries the current data version of the database, all entries are
+  dropped as soon as it differs from the version the entries were stored with.
+
+  Attributes:
+    max_bytes (int): Entries are evicted, least recently used first, above this total size.
+    ttl_seconds (float): Entries older than this are treated as misses.
+  """
+
+  def __init__(self, max_bytes: int, ttl_seconds: float):
+    self.max_bytes = max_bytes
+    self.ttl_seconds = ttl_seconds
+    self._lock = threading.Lock()
+    self._entries: OrderedDict[Hashable, tuple[Any, int, float]] = OrderedDict()
+    self._bytes = 0
+    self._data_version: Any = None
+    self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+  def _check_version(self, data_version: Any):
+    if data_version != self._data_version:
+      if self._entries:
+        self._stats["invalidations"] += 1
+      self._entries.clear()
+      self._bytes = 0
+      self._data_version = data_version
+
+  def get(self, key: Hashable, data_version: Any) -> Optional[Any]:
+    """Returns the cached value or None on a miss."""
+    with self._lock:
+      self._check_version(data_version)
+      entry = self._entries.get(key)
+      if entry is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+        self._remove(key)
+        self._stats["expirations"] += 1
+        entry = None
+      if entry is None:
+        self._stats["misses"] += 1
+        return None
+      self._entries.move_to_end(key)
+      self._stats["hits"] += 1
+      return entry[0]
+
+  def put(self, key: Hashable, data_version: Any, value: Any, size: int):
+    """Stores the value, evicting least recently used entries to stay within `max_bytes`."""
+    if size > self.max_bytes:
+      return
+    with self._lock:
+      self._check_version(data_version)
+      if key in self._entries:
+        self._remove(key)
+      self._entries[key] = (value, size, time.monotonic())
+      self._bytes += size
+      while self._bytes > self.max_bytes:
+        self._remove(next(iter(self._entries)))
+        self._stats["evictions"] += 1
+
+  def _remove(self, key: Hashable):
+    _, size, _ = self._entries.pop(key)
+    self._bytes -= size
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._bytes = 0
+
+  def stats(self) -> dict[str, Any]:
+    """Hit/miss counters together with the current size of the cache."""
+    with self._lock:
+      lookups = self._stats["hits"] + self._stats["misses"]
+      return {**self._stats,
+              "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+              "entries": len(self._entries),
+              "bytes": self._bytes}
+
+
+_CACHES: dict[tuple[str, int, float], ResultCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def shared_result_cache(key: str, max_bytes: int, ttl_seconds: float) -> ResultCache:
+  """
+  Returns the process-wide result cache for the given database key and settings, creating it if needed.
+  Connectors with other settings get a cache of their own instead of silently sharing the first one.
+  """
+  cache_key = (key, max_bytes, ttl_seconds)
+  with _CACHES_LOCK:
+    if cache_key not in _CACHES:
+      _CACHES[cache_key] = ResultCache(max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+    return _CACHES[cache_key]
@@ -0,0 +1,86 @@
+"""Compact, size-bounded rendering of query results for the agent."""
+from typing import Optional
+
+import pandas as pd
+from pydantic.v1 import BaseModel
+
+MAX_CELL_CHARS = 200
+
+
+def _format_cell(value) -> str:
+  if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+    return "NULL"
+  cell = str(value).replace("|", "\\|").replace("\n", " ")
+  if len(cell) > MAX_CELL_CHARS:
+    cell = cell[:MAX_CELL_CHARS] + "..."
+  return cell
+
+
+def render_table(df: pd.DataFrame, max_bytes: Optional[int] = None) -> tuple[str, int]:
+  """
+  Renders the dataframe as a markdown table, stopping before the output exceeds `max_bytes`.
+
+  Returns:
+    tuple: The rendered table and the number of rows it contains.
+  """
+  columns = [str(column) for column in df.columns]
+  lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+  size = sum(len(line.encode()) + 1 for line in lines)
+  rendered_rows = 0
+  for row in df.itertuples(index=False, name=None):
+    line = "| " + " | ".join(_format_cell(value) for value in row) + " |"
+    size += len(line.encode()) + 1
+    if max_bytes is not None and size > max_bytes and rendered_rows > 0:
+      break
+    lines.append(line)
+    rendered_rows += 1
+  return "\n".join(lines), rendered_rows
+
+
+def column_stats(df: pd.DataFrame) -> str:
+  """One line per column with min/max/mean for numbers and distinct/null counts otherwise."""
+  stats = []
+  for column in df.columns:
+    series = df[column]
+    nulls = int(series.isna().sum())
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+      stat = f"min {series.min()}, max {series.max()}, mean {series.mean():.4g}"
+    else:
+      stat = f"{series.dropna().astype(str).nunique()} distinct"
+    if nulls:
+      stat += f", {nulls} null"
+    stats.append(f"- {column}: {stat}")
+  return "\n".join(stats)
+
+
+class BoundedResult(BaseModel):
+  """
+  The head of a query result, limited to a maximum number of rows.
+
+  Attributes:
+    df (pd.DataFrame): The fetched rows.
+    truncated (bool): Whether the query produced more rows than were fetched.
+    total_rows (Optional[int]): The total number of rows if known, None when it could not be counted.
+    min_total_rows (Optional[int]): The result has more rows than this, set when counting stopped early.
+  """
+  df: pd.DataFrame
+  truncated: bool = False
+  total_rows: Optional[int] = None
+  min_total_rows: Optional[int] = None
+
+  class Config:
+    arbitrary_types_allowed = True
+
+  def render(self, max_bytes: Optional[int] = None) -> str:
+    """Renders the rows within `max_bytes` followed by a truncation summary when rows were left out."""
+    table, rendered_rows = render_table(self.df, max_bytes)
+    if not self.truncated and rendered_rows == len(self.df):
+      return table
+    if self.total_rows is not None:
+      total = f"{self.total_rows}"
+    else:
+      total = f"more than {self.min_total_rows if self.min_total_rows is not None else len(self.df)}"
+    summary = (f"\n\n(Showing {rendered_rows} of {total} rows. The result was truncated, "
+               "aggregate or filter in SQL instead of reading all rows.)\n"
+               f"Column stats over the first {len(self.df)} rows:\n{column_stats(self.df)}")
+    return table + summary
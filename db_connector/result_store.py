@@ -0,0 +1,125 @@
+"""
+Per-run store of tool results, so tools can pass results around by handle instead of by value.
+
+Tool outputs start with the handle of their stored payload, e.g. `Result handle: result_1`,
+so callbacks can render the payload itself instead of parsing the text the LLM sees.
+"""
+import contextlib
+import contextvars
+import re
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Generator, Optional
+
+if TYPE_CHECKING:
+  import pandas as pd
+  from db_connector.result_format import BoundedResult
+
+HANDLE_PATTERN = re.compile(r"result_\d+")
+CHART_HANDLE_PATTERN = re.compile(r"chart_\d+")
+_OUTPUT_HANDLE_PATTERN = re.compile(r"(?:Result|Chart) handle: ((?:result|chart)_\d+)")
+
+_CURRENT_STORE: contextvars.ContextVar[Optional["ResultStore"]] = contextvars.ContextVar(
+  "result_store", default=None)
+
+
+class ResultStore:
+  """
+  The query results and charts of one agent run, keyed by short handles like `result_1` and `chart_1`.
+
+  Attributes:
+    max_results (int): Number of payloads kept, the oldest ones are dropped first.
+  """
+
+  def __init__(self, max_results: int = 32):
+    self.max_results = max_results
+    self._payloads: OrderedDict[str, tuple[str, Any]] = OrderedDict()
+    self._lock = threading.Lock()
+    self._counter = 0
+
+  def _put(self, prefix: str, source: str, payload: Any) -> str:
+    with self._lock:
+      self._counter += 1
+      handle = f"{prefix}_{self._counter}"
+      self._payloads[handle] = (source, payload)
+      while len(self._payloads) > self.max_results:
+        self._payloads.popitem(last=False)
+    return handle
+
+  def _get(self, handle: str) -> Optional[tuple[str, Any]]:
+    with self._lock:
+      return self._payloads.get(handle.strip())
+
+  def put(self, result: "BoundedResult", query: str,
+          refetch: Optional[Callable[[], "BoundedResult"]] = None) -> str:
+    """
+    Registers the result of the query and returns its handle.
+
+    Args:
+      result (BoundedResult): The rows shown to the agent.
+      query (str): The query that produced them.
+      refetch (Optional[Callable[[], BoundedResult]]): Fetches more rows of a truncated result for charts.
+    """
+    return self._put("result", query, (result, refetch))
+
+  def put_chart(self, html: str, code: str) -> str:
+    """Registers a rendered chart and returns its handle."""
+    return self._put("chart", code, html)
+
+  def get(self, handle: str) -> Optional["pd.DataFrame"]:
+    """A copy of the rows of a result, so callers can modify it without touching cached results."""
+    result = self.get_result(handle)
+    return None if result is None else result.df.copy()
+
+  def get_result(self, handle: str) -> Optional["BoundedResult"]:
+    """The registered result, shared with the result cache, so it must not be modified."""
+    entry = self._get(handle) if HANDLE_PATTERN.fullmatch(handle.strip()) else None
+    return None if entry is None else entry[1][0]
+
+  def chart_data(self, handle: str) -> Optional["BoundedResult"]:
+    """
+    The rows a chart of the result is drawn from. A truncated result is fetched again with its
+    `refetch`, once, so charts are not drawn from the rows shown to the agent only.
+    """
+    entry = self._get(handle) if HANDLE_PATTERN.fullmatch(handle.strip()) else None
+    if entry is None:
+      return None
+    source, (result, refetch) = entry
+    if refetch is None or not result.truncated:
+      return result
+    full_result = refetch()
+    with self._lock:
+      if handle.strip() in self._payloads:
+        self._payloads[handle.strip()] = (source, (full_result, None))
+    return full_result
+
+  def get_chart(self, handle: str) -> Optional[str]:
+    entry = self._get(handle) if CHART_HANDLE_PATTERN.fullmatch(handle.strip()) else None
+    return None if entry is None else entry[1]
+
+  def query(self, handle: str) -> Optional[str]:
+    """The query that produced the result."""
+    entry = self._get(handle) if HANDLE_PATTERN.fullmatch(handle.strip()) else None
+    return None if entry is None else entry[0]
+
+
+def output_handle(output: str) -> Optional[str]:
+  """The handle a tool output starts with, None for outputs without a stored payload."""
+  match = _OUTPUT_HANDLE_PATTERN.match(output)
+  return match.group(1) if match else None
+
+
+def current_result_store() -> Optional[ResultStore]:
+  """The store of the current run, None outside of `result_store_scope`."""
+  return _CURRENT_STORE.get()
+
+
+@contextlib.contextmanager
+def result_store_scope() -> Generator[ResultStore, None, None]:
+  """Gives the code run inside, including tools run in copied contexts, a new result store."""
+  store = ResultStore()
+  token = _CURRENT_STORE.set(store)
+  try:
+    yield store
+  finally:
+    _CURRENT_STORE.reset(token)
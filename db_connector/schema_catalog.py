@@ -0,0 +1,148 @@
+"""In-memory schema catalog shared by all connectors pointing at the same database."""
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Optional
+
+from pydantic.v1 import BaseModel
+
+if TYPE_CHECKING:
+  from db_connector.abstract_sql_connector import AbstractSQLConnector
+
+
+class ColumnInfo(BaseModel):
+  name: str
+  type: str
+  nullable: bool = True
+  primary_key: bool = False
+
+
+class ForeignKeyInfo(BaseModel):
+  columns: list[str]
+  referred_table: str
+  referred_columns: list[str]
+
+
+class TableInfo(BaseModel):
+  """Reflected description of a single table."""
+  name: str
+  columns: list[ColumnInfo] = []
+  primary_key: list[str] = []
+  foreign_keys: list[ForeignKeyInfo] = []
+
+  def column_names(self) -> list[str]:
+    return [column.name for column in self.columns]
+
+  def ddl(self) -> str:
+    """A compact CREATE TABLE statement with types and keys, cheaper in tokens than the original DDL."""
+    lines = []
+    single_column_fks = {fk.columns[0]: fk for fk in self.foreign_keys if len(fk.columns) == 1}
+    for column in self.columns:
+      line = f"  {column.name} {column.type}"
+      if not column.nullable:
+        line += " NOT NULL"
+      if len(self.primary_key) == 1 and column.primary_key:
+        line += " PRIMARY KEY"
+      if column.name in single_column_fks:
+        fk = single_column_fks[column.name]
+        line += f" REFERENCES {fk.referred_table}({', '.join(fk.referred_columns)})"
+      lines.append(line)
+    if len(self.primary_key) > 1:
+      lines.append(f"  PRIMARY KEY ({', '.join(self.primary_key)})")
+    for fk in self.foreign_keys:
+      if len(fk.columns) > 1:
+        lines.append(f"  FOREIGN KEY ({', '.join(fk.columns)}) "
+                     f"REFERENCES {fk.referred_table}({', '.join(fk.referred_columns)})")
+    return f"CREATE TABLE {self.name} (\n" + ",\n".join(lines) + "\n)"
+
+
+_UNSET = object()
+
+
+class SchemaCatalog:
+  """
+  Reflects the schema of a database once and serves it from memory.
+
+  The catalog asks the connector for its schema version on every access and only
+  reflects again when that version changes, e.g. `PRAGMA schema_version` for SQLite.
+
+  Attributes:
+    max_query_memo_entries (int): Number of values memoized per query, e.g. preflight outcomes,
+      the least recently used ones are dropped first. Values memoized per table or per database
+      are kept apart and never evicted, there are only as many of them as there are tables.
+  """
+
+  def __init__(self, max_query_memo_entries: int = 1024):
+    self._lock = threading.RLock()
+    self._version: Any = _UNSET
+    self._tables: dict[str, TableInfo] = {}
+    self._memo: dict[Any, tuple[Any, Any]] = {}
+    self._query_memo: OrderedDict[Any, tuple[Any, Any]] = OrderedDict()
+    self.max_query_memo_entries = max_query_memo_entries
+
+  def tables(self, connector: "AbstractSQLConnector") -> dict[str, TableInfo]:
+    """Returns the cached tables, reflecting them first if the schema has changed."""
+    version = connector.schema_version()
+    if version != self._version:
+      with self._lock:
+        if version != self._version:
+          self._tables = connector.reflect_schema()
+          self._memo = {}
+          self._query_memo = OrderedDict()
+          self._version = version
+    return self._tables
+
+  def table_names(self, connector: "AbstractSQLConnector") -> list[str]:
+    return list(self.tables(connector).keys())
+
+  def table(self, connector: "AbstractSQLConnector", name: str) -> Optional[TableInfo]:
+    return self.tables(connector).get(name)
+
+  @property
+  def version(self) -> Any:
+    """The schema version the cached tables were reflected at."""
+    return None if self._version is _UNSET else self._version
+
+  def memo_get(self, key: Any, version: Any, per_query: bool = False) -> Any:
+    """
+    Returns a value derived from the schema, e.g. a rendered table block.
+
+    Memoized values live until the schema is reflected again or the given version
+    (usually the data version) no longer matches the one they were stored with.
+    Values memoized `per_query` are also dropped once `max_query_memo_entries` newer
+    ones are used.
+    """
+    with self._lock:
+      memo = self._query_memo if per_query else self._memo
+      entry = memo.get(key)
+      if entry is None or entry[0] != version:
+        return None
+      if per_query:
+        self._query_memo.move_to_end(key)
+      return entry[1]
+
+  def memo_put(self, key: Any, version: Any, value: Any, per_query: bool = False):
+    with self._lock:
+      if not per_query:
+        self._memo[key] = (version, value)
+        return
+      self._query_memo[key] = (version, value)
+      self._query_memo.move_to_end(key)
+      while len(self._query_memo) > self.max_query_memo_entries:
+        self._query_memo.popitem(last=False)
+
+  def invalidate(self):
+    """Forces the next access to reflect the schema again."""
+    with self._lock:
+      self._version = _UNSET
+
+
+_CATALOGS: dict[str, SchemaCatalog] = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+def shared_catalog(key: str) -> SchemaCatalog:
+  """Returns the process-wide catalog for the given database key, creating it if needed."""
+  with _CATALOGS_LOCK:
+    if key not in _CATALOGS:
+      _CATALOGS[key] = SchemaCatalog()
+    return _CATALOGS[key]
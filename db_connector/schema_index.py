@@ -0,0 +1,140 @@
+"""In-process BM25 index over table names, column names and sample values, to find the tables a question needs."""
+import difflib
+import math
+import re
+import threading
+from collections import Counter
+from typing import TYPE_CHECKING, NamedTuple
+
+from db_connector.schema_catalog import TableInfo
+
+if TYPE_CHECKING:
+  import pandas as pd
+
+# Table names weigh more than column names, which weigh more than sample values.
+TABLE_NAME_WEIGHT = 3
+COLUMN_NAME_WEIGHT = 2
+# Typos are matched against indexed words at most this many characters longer or shorter,
+# and against at most this many of them.
+MAX_LENGTH_DIFFERENCE = 2
+MAX_CLOSE_MATCH_CANDIDATES = 2000
+STOPWORDS = frozenset(
+  "a an and are as at be by do does each for from have how i in is it its me of on or per show "
+  "that the their them there these this to was were what when where which who whom with".split())
+
+_WORD = re.compile(r"[A-Za-z0-9]+")
+# Splits camel case and acronyms, e.g. "BillingCountry" and "HTMLPage".
+_WORD_PART = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def _stem(token: str) -> str:
+  """Drops a plural s, so "tracks" matches the table "Track"."""
+  if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+    return token[:-1]
+  return token
+
+
+def tokenize(text: str) -> list[str]:
+  """Lower cased and stemmed words and camel case parts of the text, without stopwords."""
+  tokens = []
+  for word in _WORD.findall(text):
+    parts = _WORD_PART.findall(word)
+    for part in parts if len(parts) == 1 else [word, *parts]:
+      token = _stem(part.lower())
+      if token not in STOPWORDS:
+        tokens.append(token)
+  return tokens
+
+
+class _Stats(NamedTuple):
+  """The BM25 statistics of one version of the documents, and the typo matches found against them."""
+  frequencies: dict[str, Counter]
+  lengths: dict[str, int]
+  average_length: float
+  idf: dict[str, float]
+  candidates: dict[tuple[str, int], list[str]]
+  close_matches: dict[str, list[str]]
+
+
+class SchemaIndex:
+  """
+  BM25 ranking of tables, every table being one document of its name, column names and sample values.
+
+  Sample values are added table by table with `set_samples`, whenever sample rows are fetched anyway.
+  Words of a question that appear nowhere in the schema are matched to the closest indexed word
+  of similar length and the same first letter, so small typos still find their table.
+
+  Attributes:
+    k1 (float): Term frequency saturation of BM25.
+    b (float): Document length normalization of BM25.
+  """
+
+  def __init__(self, documents: dict[str, list[str]], k1: float = 1.2, b: float = 0.75):
+    self.k1 = k1
+    self.b = b
+    self._schema_tokens = dict(documents)
+    self._sample_tokens: dict[str, list[str]] = {}
+    self._lock = threading.Lock()
+    self._build()
+
+  def _build(self):
+    """Computes the BM25 statistics and the typo candidates, swapped in at once so a search sees one version."""
+    documents = {table: tokens + self._sample_tokens.get(table, []) for table, tokens in self._schema_tokens.items()}
+    frequencies = {table: Counter(tokens) for table, tokens in documents.items()}
+    lengths = {table: len(tokens) for table, tokens in documents.items()}
+    document_frequencies = Counter(token for table_frequencies in frequencies.values() for token in table_frequencies)
+    idf = {token: math.log(1 + (len(documents) - count + 0.5) / (count + 0.5))
+           for token, count in document_frequencies.items()}
+    candidates: dict[tuple[str, int], list[str]] = {}
+    for token in idf:
+      candidates.setdefault((token[0], len(token)), []).append(token)
+    average_length = sum(lengths.values()) / len(documents) if documents else 0.0
+    self._stats = _Stats(frequencies, lengths, average_length, idf, candidates, {})
+
+  @classmethod
+  def build(cls, tables: dict[str, TableInfo]) -> "SchemaIndex":
+    """Indexes the names and column names of the reflected tables."""
+    return cls({name: tokenize(name) * TABLE_NAME_WEIGHT + tokenize(" ".join(info.column_names())) * COLUMN_NAME_WEIGHT
+                for name, info in tables.items()})
+
+  def set_samples(self, table: str, df: "pd.DataFrame"):
+    """Indexes the text values of the sample rows of the table, replacing its previous ones."""
+    tokens = []
+    for column in df.columns:
+      if df[column].dtype == object:
+        tokens += tokenize(" ".join(str(value) for value in df[column].dropna()))
+    with self._lock:
+      if table not in self._schema_tokens or self._sample_tokens.get(table) == tokens:
+        return
+      self._sample_tokens[table] = tokens
+      self._build()
+
+  @staticmethod
+  def _close_match(stats: "_Stats", token: str) -> list[str]:
+    """The closest indexed word, compared only with words of the same first letter and similar length."""
+    matches = stats.close_matches.get(token)
+    if matches is None:
+      candidates = [word for length in range(len(token) - MAX_LENGTH_DIFFERENCE, len(token) + MAX_LENGTH_DIFFERENCE + 1)
+                    for word in stats.candidates.get((token[0], length), [])]
+      matches = difflib.get_close_matches(token, candidates[:MAX_CLOSE_MATCH_CANDIDATES], n=1, cutoff=0.8)
+      stats.close_matches[token] = matches
+    return matches
+
+  def search(self, text: str, k: int, min_ratio: float = 0.2) -> list[tuple[str, float]]:
+    """
+    The `k` best matching tables with their scores. Tables scoring less than `min_ratio` of the
+    best score, usually matched by a single common word, are left out.
+    """
+    stats = self._stats
+    tokens = []
+    for token in tokenize(text):
+      tokens += [token] if token in stats.idf else self._close_match(stats, token)
+    scores = []
+    for table, frequencies in stats.frequencies.items():
+      norm = self.k1 * (1 - self.b + self.b * stats.lengths[table] / (stats.average_length or 1))
+      score = sum(stats.idf[token] * frequencies[token] * (self.k1 + 1) / (frequencies[token] + norm)
+                  for token in tokens if token in frequencies)
+      if score > 0:
+        scores.append((table, score))
+    scores.sort(key=lambda item: (-item[1], item[0]))
+    return [(table, score) for table, score in scores[:k] if score >= min_ratio * scores[0][1]]
@@ -1,32 +1,285 @@
-from typing import Optional
+import contextlib
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+from typing import Generator, Optional
 
 import pandas as pd
-from db_connector.abstract_sql_connector import AbstractSQLConnector
-from sqlalchemy import create_engine, MetaData, Engine
+import sqlparse
+from db_connector.abstract_sql_connector import AbstractSQLConnector, QueryTimeoutError, quote_identifier
+from db_connector.columnar import concat_frames, frame_from_rows
+from db_connector.schema_catalog import ColumnInfo, ForeignKeyInfo, TableInfo
+from sqlalchemy import create_engine, event, exc, inspect, Connection, Engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from sqlalchemy import text
+from sqlparse import tokens as T
+from sqlparse.sql import Identifier, IdentifierList, Parenthesis
+
+
+def _table_aliases(query: str) -> dict[str, str]:
+  """Maps the aliases of the tables in FROM and JOIN clauses, and the unaliased names, to the table names."""
+  aliases = {}
+
+  def visit(tokens):
+    after_from = False
+    for token in tokens:
+      if token.is_whitespace or token.ttype in T.Comment:
+        continue
+      if token.ttype in T.Keyword and (token.normalized == 'FROM' or token.normalized.endswith('JOIN')):
+        after_from = True
+        continue
+      if after_from:
+        for identifier in token.get_identifiers() if isinstance(token, IdentifierList) else [token]:
+          # Subqueries have no table name of their own, their tables are visited below.
+          if isinstance(identifier, Identifier) and not isinstance(identifier.token_first(), Parenthesis):
+            aliases[identifier.get_alias() or identifier.get_real_name()] = identifier.get_real_name()
+        after_from = False
+      if token.is_group:
+        visit(token.tokens)
+
+  for statement in sqlparse.parse(query):
+    visit(statement.tokens)
+  return aliases
 
 
 class SQLLiteConnector(AbstractSQLConnector):
   """A class representing a SQLLite database connector."""
 
   engine: Optional[Engine]
-  metadata: Optional[MetaData]
+  db_url: Optional[str]
+  db_path: Optional[str]
+
+  def initialize(self, db_url: str,
+                 read_only: bool = False,
+                 pool_size: Optional[int] = None,
+                 max_overflow: int = 0,
+                 mmap_size: Optional[int] = None,
+                 cache_size: Optional[int] = None,
+                 temp_store: Optional[str] = None):
+    """
+    Creates the engine. Without options this is a plain engine, the options turn it into a production engine.
+
+    Args:
+      db_url (str): SQLAlchemy url of the database, e.g. sqlite:///data/Chinook.db.
+      read_only (bool): Open the file with `mode=ro` and set `PRAGMA query_only`, so writes fail in the engine.
+      pool_size (Optional[int]): Number of connections kept open in the pool.
+      max_overflow (int): Number of connections opened on top of `pool_size` under load.
+      mmap_size (Optional[int]): `PRAGMA mmap_size` in bytes, enables memory mapped reads.
+      cache_size (Optional[int]): `PRAGMA cache_size`, in pages or in KiB when negative.
+      temp_store (Optional[str]): `PRAGMA temp_store`, e.g. MEMORY.
+    """
+    url = make_url(db_url)
+    self.db_url = db_url
+    self.db_path = url.database
+    in_memory = not self.db_path or self.db_path == ':memory:'
+
+    engine_kwargs = {}
+    if read_only and not in_memory:
+      url = url.set(database=f"file:{self.db_path}", query={**url.query, "mode": "ro", "uri": "true"})
+    if pool_size is not None and not in_memory:
+      engine_kwargs.update(poolclass=QueuePool, pool_size=pool_size, max_overflow=max_overflow,
+                           connect_args={"check_same_thread": False})
+    self.engine = create_engine(url, **engine_kwargs)
 
-  def initialize(self, db_url: str):
-    self.engine = create_engine(db_url)
-    self.metadata = MetaData()
+    pragmas = []
+    if read_only:
+      pragmas.append("PRAGMA query_only = ON")
+    if mmap_size is not None:
+      pragmas.append(f"PRAGMA mmap_size = {int(mmap_size)}")
+    if cache_size is not None:
+      pragmas.append(f"PRAGMA cache_size = {int(cache_size)}")
+    if temp_store is not None:
+      if temp_store.upper() not in ("DEFAULT", "FILE", "MEMORY"):
+        raise ValueError(f"Invalid temp_store: {temp_store}")
+      pragmas.append(f"PRAGMA temp_store = {temp_store.upper()}")
+    if pragmas:
+      @event.listens_for(self.engine, "connect")
+      def apply_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+          cursor.execute(pragma)
+        cursor.close()
+
+    self._version_connection = None
+    self._version_lock = threading.Lock()
 
   def dialect(self) -> str:
     return 'sqlite'
 
+  def catalog_key(self) -> str:
+    return self.db_url
+
+  def schema_version(self) -> int:
+    """SQLite bumps the schema version on every schema change."""
+    with self.engine.connect() as connection:
+      return connection.execute(text("PRAGMA schema_version")).scalar()
+
+  def data_version(self) -> Optional[tuple]:
+    """
+    Combines `PRAGMA data_version` with the file modification time and size.
+
+    `PRAGMA data_version` only changes when a different connection commits, so it is
+    read from a dedicated connection that is kept open and never used for queries.
+    """
+    if not self.db_path or self.db_path == ':memory:':
+      return None
+    stat = os.stat(self.db_path)
+    with self._version_lock:
+      if self._version_connection is None:
+        uri = pathlib.Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        self._version_connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+      data_version = self._version_connection.execute("PRAGMA data_version").fetchone()[0]
+    return data_version, stat.st_mtime_ns, stat.st_size
+
+  def file_version(self) -> Optional[tuple]:
+    """The file modification time and size, `PRAGMA data_version` is only meaningful to its own connection."""
+    if not self.db_path or self.db_path == ':memory:':
+      return None
+    stat = os.stat(self.db_path)
+    return stat.st_mtime_ns, stat.st_size
+
+  def table_fingerprint(self, table: str) -> Optional[tuple]:
+    """
+    The row count and the largest rowid. Inserts and deletes change it, updates that keep both
+    are only seen once another change of the table is.
+    """
+    try:
+      with self.engine.connect() as connection, self._deadline(connection):
+        return tuple(connection.execute(text(f"SELECT COUNT(*), MAX(rowid) FROM {quote_identifier(table)}")).one())
+    except exc.OperationalError:
+      # WITHOUT ROWID tables have no rowid.
+      return None
+
+  def warmup(self):
+    """Also opens the pooled connections, so their pragmas run before the first query."""
+    super().warmup()
+    pool_size = self.engine.pool.size() if isinstance(self.engine.pool, QueuePool) else 1
+    connections = [self.engine.connect() for _ in range(pool_size)]
+    for connection in connections:
+      connection.close()
+
+  def reflect_schema(self) -> dict[str, TableInfo]:
+    """Reflects all the tables over a single connection."""
+    tables = {}
+    with self.engine.connect() as connection:
+      inspector = inspect(connection)
+      for name in inspector.get_table_names():
+        primary_key = inspector.get_pk_constraint(name)["constrained_columns"]
+        columns = [ColumnInfo(name=column["name"],
+                              type=str(column["type"]),
+                              nullable=column["nullable"],
+                              primary_key=column["name"] in primary_key)
+                   for column in inspector.get_columns(name)]
+        foreign_keys = [ForeignKeyInfo(columns=fk["constrained_columns"],
+                                       referred_table=fk["referred_table"],
+                                       referred_columns=fk["referred_columns"])
+                        for fk in inspector.get_foreign_keys(name)]
+        tables[name] = TableInfo(name=name, columns=columns,
+                                 primary_key=primary_key, foreign_keys=foreign_keys)
+    return tables
+
+  def estimate_row_count(self, table: str) -> Optional[int]:
+    """Uses the largest rowid, which SQLite finds without scanning the table."""
+    try:
+      return int(self.query_cached(f"SELECT MAX(rowid) FROM {quote_identifier(table)}").iloc[0, 0] or 0)
+    except Exception:
+      return super().estimate_row_count(table)
+
+  def sample_query(self, table: str, rows: int, row_count: int) -> Optional[str]:
+    """Every n-th rowid, so the sample spreads over the whole table. None for WITHOUT ROWID tables."""
+    try:
+      with self.engine.connect() as connection:
+        connection.execute(text(f"SELECT rowid FROM {quote_identifier(table)} LIMIT 1")).close()
+    except exc.OperationalError:
+      return None
+    stride = -(-row_count // rows)
+    return f"SELECT * FROM {quote_identifier(table)} WHERE rowid % {stride} = 0"
+
+  def preflight(self, query: str) -> Optional[str]:
+    """Prepares `EXPLAIN <query>`, which compiles the statement to bytecode without running it."""
+    try:
+      with self.engine.connect() as connection, self._deadline(connection):
+        connection.exec_driver_sql(f"EXPLAIN {query}").close()
+    except exc.OperationalError as e:
+      return str(e.orig)
+    return None
+
+  def check_query_cost(self, query: str) -> list[str]:
+    """
+    Flags full table scans in `EXPLAIN QUERY PLAN` on tables with at least `cost_guard_min_rows` rows.
+    The plan names aliased tables by their alias, which is resolved from the FROM and JOIN clauses.
+    """
+    with self.engine.connect() as connection:
+      plan = connection.execute(text(f"EXPLAIN QUERY PLAN {query}")).fetchall()
+    known_tables = self.catalog.tables(self)
+    aliases = _table_aliases(query)
+    warnings = []
+    for row in plan:
+      # Older SQLite versions print "SCAN TABLE x AS y", newer ones only the alias "SCAN y".
+      match = re.match(r"SCAN (?:TABLE )?(\w+)(?: AS (\w+))?", row[-1])
+      if not match or "COVERING INDEX" in row[-1]:
+        continue
+      table = match.group(1) if match.group(2) else aliases.get(match.group(1), match.group(1))
+      if table not in known_tables:
+        continue
+      rows = self.estimate_row_count(table)
+      if rows is not None and rows >= self.cost_guard_min_rows:
+        warnings.append(f"full scan of {table} (~{rows} rows) without an index")
+    return warnings
+
+  @contextlib.contextmanager
+  def _deadline(self, connection: Connection):
+    """Interrupts the statements running on the connection once `query_timeout_ms` has passed."""
+    if not self.query_timeout_ms:
+      yield
+      return
+    dbapi_connection = connection.connection.driver_connection
+    deadline = time.monotonic() + self.remaining_timeout()
+    # The handler runs every 1000 virtual machine instructions, a non zero return aborts the query.
+    dbapi_connection.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+    try:
+      yield
+    except (exc.OperationalError, sqlite3.OperationalError) as e:
+      # Statements run on the plain sqlite3 cursor raise the driver's error, not SQLAlchemy's.
+      if "interrupted" in str(getattr(e, "orig", e)):
+        raise QueryTimeoutError(self.query_timeout_ms) from e
+      raise
+    finally:
+      dbapi_connection.set_progress_handler(None, 0)
+
   def table_names(self) -> list[str]:
-    """Uses the sql lite db metadata to return all the tables."""
-    self.metadata.reflect(bind=self.engine)
-    table_names = list(self.metadata.tables.keys())
-    return table_names
+    """Returns all the tables from the cached schema catalog."""
+    return self.catalog.table_names(self)
+
+  def _fetch_chunks(self, query: str, chunk_size: int) -> Generator[pd.DataFrame, None, None]:
+    """
+    Runs the query on a plain sqlite3 cursor and turns every `fetchmany` batch straight into typed
+    columns, so only one batch of row tuples is alive at a time.
+    """
+    with self.engine.connect() as connection, self._deadline(connection):
+      cursor = connection.connection.driver_connection.cursor()
+      try:
+        cursor.execute(query)
+        columns = [description[0] for description in cursor.description or []]
+        first_chunk = True
+        while True:
+          rows = cursor.fetchmany(chunk_size)
+          if rows or first_chunk:
+            yield frame_from_rows(rows, columns)
+          first_chunk = False
+          if len(rows) < chunk_size:
+            return
+      finally:
+        cursor.close()
 
   def query(self, query: str) -> pd.DataFrame:
-    """Run the query and compile the results into a pandas dataframe."""
-    with self.engine.connect() as connection:
-      result = connection.execute(text(query))
-      return pd.DataFrame(result.fetchall(), columns=result.keys())
+    """Run the query and compile the results into a pandas dataframe, `fetch_chunk_size` rows at a time."""
+    return concat_frames(self._fetch_chunks(query, self.fetch_chunk_size))
+
+  def query_iter(self, query: str, chunk_size: int) -> Generator[pd.DataFrame, None, None]:
+    """Streams the result in typed chunks, the connection is released when the generator closes."""
+    return self._fetch_chunks(query, chunk_size)
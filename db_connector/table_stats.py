@@ -0,0 +1,103 @@
+"""Table and column statistics computed by a background worker and shown with the table info."""
+import queue
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+
+from pydantic.v1 import BaseModel
+
+if TYPE_CHECKING:
+  from db_connector.abstract_sql_connector import AbstractSQLConnector
+
+
+class ColumnStats(BaseModel):
+  name: str
+  distinct: int
+  null_fraction: float
+  min: Optional[str] = None
+  max: Optional[str] = None
+
+
+class TableStats(BaseModel):
+  """
+  Statistics of a table. Column statistics of tables larger than the sample are computed over
+  `sampled_rows` rows, spread over the table or, if `first_rows`, the first rows only.
+  """
+  table: str
+  row_count: Optional[int] = None
+  sampled_rows: Optional[int] = None
+  first_rows: bool = False
+  columns: list[ColumnStats] = []
+  error: Optional[str] = None
+
+  def render(self) -> str:
+    """Compact lines for the table info, empty if the statistics could not be computed."""
+    if self.error is not None or self.row_count is None:
+      return ""
+    sampled = self.sampled_rows is not None and self.sampled_rows < self.row_count
+    sample = f"the first {self.sampled_rows} rows" if self.first_rows else f"a sample of {self.sampled_rows} rows"
+    lines = [f"Rows: {self.row_count}" + (f", column statistics from {sample}" if sampled else "")]
+    for column in self.columns:
+      line = f"  {column.name}: {'~' if sampled else ''}{column.distinct} distinct"
+      if column.null_fraction:
+        line += f", {column.null_fraction:.0%} null"
+      if column.min is not None:
+        line += f", min {column.min}, max {column.max}"
+      lines.append(line)
+    return "\n".join(lines)
+
+
+class StatsWorker:
+  """
+  Computes table statistics on a background thread and stores them in the schema catalog.
+
+  Requests for statistics that are already queued are dropped, so asking again on every tool
+  call is cheap. Statistics are stored with the data version they were computed at, so they
+  are computed again once the data changes.
+  """
+
+  def __init__(self):
+    self._jobs: queue.Queue = queue.Queue()
+    self._pending: set[tuple[str, str, Any]] = set()
+    self._lock = threading.Lock()
+    self._thread = threading.Thread(target=self._work_loop, name="table-stats", daemon=True)
+    self._thread.start()
+
+  def request(self, connector: "AbstractSQLConnector", table: str, data_version: Any):
+    key = (connector.catalog_key(), table, repr(data_version))
+    with self._lock:
+      if key in self._pending:
+        return
+      self._pending.add(key)
+    self._jobs.put((key, connector, table, data_version))
+
+  def _work_loop(self):
+    while True:
+      key, connector, table, data_version = self._jobs.get()
+      try:
+        try:
+          stats = connector.compute_table_stats(table)
+        except Exception as e:
+          # Stored anyway, so a failing table is not retried until the data changes.
+          stats = TableStats(table=table, error=f"{type(e).__name__}: {e}")
+        connector.catalog.memo_put(('table_stats', table), data_version, stats)
+      finally:
+        with self._lock:
+          self._pending.discard(key)
+        self._jobs.task_done()
+
+  def join(self):
+    """Blocks until every queued table has its statistics."""
+    self._jobs.join()
+
+
+_WORKER: Optional[StatsWorker] = None
+_WORKER_LOCK = threading.Lock()
+
+
+def shared_stats_worker() -> StatsWorker:
+  """Returns the process-wide statistics worker, starting it if needed."""
+  global _WORKER
+  with _WORKER_LOCK:
+    if _WORKER is None:
+      _WORKER = StatsWorker()
+    return _WORKER
@@ -0,0 +1,209 @@
+"""Persisted index of the distinct values of text columns, to map a phrase of a question to an exact value."""
+import contextlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Optional
+
+from pydantic.v1 import BaseModel
+
+from db_connector.schema_catalog import TableInfo
+
+if TYPE_CHECKING:
+  from db_connector.abstract_sql_connector import AbstractSQLConnector
+
+_TEXT_TYPE = re.compile(r"CHAR|TEXT|CLOB|STRING", re.IGNORECASE)
+_NOT_WORD = re.compile(r"[^\w]+")
+_REFRESH_LOCK = threading.Lock()
+
+
+def is_text_type(column_type: str) -> bool:
+  return bool(_TEXT_TYPE.search(column_type))
+
+
+def normalize_value(value: str) -> str:
+  """Case folded words of the value without accents, so "ac/dc" and "AC-DC" compare equal."""
+  decomposed = unicodedata.normalize("NFKD", value.casefold())
+  return " ".join(_NOT_WORD.sub(" ", "".join(c for c in decomposed if not unicodedata.combining(c))).split())
+
+
+def _trigrams(normalized: str) -> set[str]:
+  padded = f"  {normalized} "
+  return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _jsonable(value: Any) -> Any:
+  """The value as it reads back from JSON, so fingerprints of a loaded index compare equal."""
+  return json.loads(json.dumps(value, default=str))
+
+
+class ValueMatch(BaseModel):
+  table: str
+  column: str
+  value: str
+  score: float
+
+
+class IndexedTable(BaseModel):
+  """The distinct values of the indexed columns of a table, and the fingerprint they were read at."""
+  fingerprint: Any = None
+  columns: dict[str, list[str]] = {}
+
+
+class ValueIndex(BaseModel):
+  """
+  Distinct values of the low and medium cardinality text columns of a database.
+
+  Lookups go through an exact match of the normalized phrase and an inverted index of character
+  trigrams, so they never touch the database. `refresh` only reads the tables whose fingerprint
+  changed since the last refresh.
+
+  Attributes:
+    catalog_key (str): The database the values were read from.
+    schema_version (Any): The schema version they were read at.
+    data_version (Any): The data version of the last refresh.
+    file_version (Any): The file version of the last refresh, which a persisted index is checked against.
+    tables (dict[str, IndexedTable]): The indexed values per table.
+  """
+  catalog_key: str
+  schema_version: Any = None
+  data_version: Any = None
+  file_version: Any = None
+  tables: dict[str, IndexedTable] = {}
+
+  class Config:
+    underscore_attrs_are_private = True
+
+  _entries: list = []
+  _exact: dict = {}
+  _trigram_ids: dict = {}
+
+  def refresh(self, connector: "AbstractSQLConnector", tables: dict[str, TableInfo], data_version: Any,
+              max_distinct: int):
+    """Reads the distinct values of the text columns of new and changed tables, up to `max_distinct` per column."""
+
+    def read(info: TableInfo) -> Optional[IndexedTable]:
+      columns = [column.name for column in info.columns if is_text_type(column.type)]
+      if not columns:
+        return None
+      fingerprint = _jsonable(connector.table_fingerprint(info.name))
+      indexed = self.tables.get(info.name)
+      # A None fingerprint means the connector cannot tell whether the table changed.
+      if indexed is not None and fingerprint is not None and indexed.fingerprint == fingerprint:
+        return indexed
+      values = {}
+      for column in columns:
+        distinct = connector.distinct_values(info.name, column, max_distinct)
+        if distinct is not None:
+          values[column] = distinct
+      return IndexedTable(fingerprint=fingerprint, columns=values)
+
+    refreshed = connector.query_executor().map(read, tables.values())
+    self.tables = {name: indexed for name, indexed in zip(tables, refreshed) if indexed is not None}
+    self.data_version = _jsonable(data_version)
+    self.build_lookup()
+
+  def build_lookup(self):
+    entries, exact, trigram_ids = [], {}, {}
+    for table, indexed in self.tables.items():
+      for column, values in indexed.columns.items():
+        for value in values:
+          normalized = normalize_value(value)
+          if not normalized:
+            continue
+          grams = _trigrams(normalized)
+          entry_id = len(entries)
+          entries.append((table, column, value, len(grams)))
+          exact.setdefault(normalized, []).append(entry_id)
+          for gram in grams:
+            trigram_ids.setdefault(gram, []).append(entry_id)
+    self._entries, self._exact, self._trigram_ids = entries, exact, trigram_ids
+
+  def lookup(self, phrase: str, limit: int = 5, min_score: float = 0.5) -> list[ValueMatch]:
+    """
+    The values closest to the phrase, best first. Exact matches, ignoring case and punctuation,
+    score 1, others the Dice coefficient of their character trigrams.
+    """
+    normalized = normalize_value(phrase)
+    if not normalized:
+      return []
+    scores = {entry_id: 1.0 for entry_id in self._exact.get(normalized, [])}
+    grams = _trigrams(normalized)
+    shared = Counter(entry_id for gram in grams for entry_id in self._trigram_ids.get(gram, []))
+    for entry_id, count in shared.items():
+      if entry_id not in scores:
+        scores[entry_id] = 2 * count / (len(grams) + self._entries[entry_id][3])
+    best = sorted((item for item in scores.items() if item[1] >= min_score),
+                  key=lambda item: (-item[1], self._entries[item[0]][:3]))[:limit]
+    return [ValueMatch(table=self._entries[entry_id][0], column=self._entries[entry_id][1],
+                       value=self._entries[entry_id][2], score=round(score, 3)) for entry_id, score in best]
+
+  def save(self, path: str) -> bool:
+    """Writes the index to `path`, False if it could not be written, e.g. to a read only directory."""
+    tmp_path = path + ".tmp"
+    try:
+      directory = os.path.dirname(path)
+      if directory:
+        os.makedirs(directory, exist_ok=True)
+      with open(tmp_path, 'w') as file:
+        file.write(self.json())
+      os.replace(tmp_path, path)
+    except OSError:
+      with contextlib.suppress(OSError):
+        os.remove(tmp_path)
+      return False
+    return True
+
+  @classmethod
+  def load(cls, path: str, catalog_key: str, schema_version: Any) -> Optional["ValueIndex"]:
+    """The persisted index, None if there is none for this database and schema version."""
+    try:
+      index = cls.parse_file(path)
+    except (OSError, ValueError):
+      return None
+    if index.catalog_key != catalog_key or index.schema_version != _jsonable(schema_version):
+      return None
+    index.build_lookup()
+    return index
+
+
+def shared_value_index(connector: "AbstractSQLConnector", path: Optional[str] = None,
+                       max_distinct: int = 1000) -> ValueIndex:
+  """
+  The value index of the connector's database, refreshed if the data version changed.
+
+  The index lives in the schema catalog, so it is dropped when the schema changes, and is
+  persisted to `path` after every refresh so new processes start from it. A persisted index
+  is current if it was saved at the same schema version and `file_version`.
+  """
+  catalog = connector.catalog
+  tables = catalog.tables(connector)
+  data_version = _jsonable(connector.data_version())
+  index = catalog.memo_get(('value_index',), catalog.version)
+  if index is not None and index.data_version == data_version:
+    return index
+  with _REFRESH_LOCK:
+    index = catalog.memo_get(('value_index',), catalog.version)
+    if index is not None and index.data_version == data_version:
+      return index
+    file_version = _jsonable(connector.file_version())
+    if index is None and path:
+      index = ValueIndex.load(path, connector.catalog_key(), catalog.version)
+      if index is not None and file_version is not None and index.file_version == file_version:
+        index.data_version = data_version
+        catalog.memo_put(('value_index',), catalog.version, index)
+        return index
+    if index is None:
+      index = ValueIndex(catalog_key=connector.catalog_key(), schema_version=_jsonable(catalog.version))
+    # Concurrent lookups keep using the old index until the refreshed copy replaces it.
+    index = index.copy(deep=True)
+    index.refresh(connector, tables, data_version, max_distinct)
+    index.file_version = file_version
+    catalog.memo_put(('value_index',), catalog.version, index)
+    if path:
+      # Without a writable path the index still serves this process, the next one builds it again.
+      index.save(path)
+    return index
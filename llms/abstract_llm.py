@@ -1,9 +1,34 @@
 from abc import ABC, abstractmethod
-from typing import Any, List, Optional
-from langchain_core.callbacks import CallbackManagerForLLMRun
-from langchain_core.messages import BaseMessage
-from langchain_core.language_models import SimpleChatModel
+import asyncio
+import functools
+import itertools
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Tuple, TypeVar, cast
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, BaseMessageChunk
+from langchain_core.language_models import LanguageModelInput, SimpleChatModel
+from langchain_core.language_models.chat_models import agenerate_from_stream, generate_from_stream
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableConfig
 from langchain_community.adapters.openai import convert_message_to_dict
+from llms.rate_limit import TokenBucket
+
+T = TypeVar("T")
+
+
+def _start_stream(tokens: Iterator[str]) -> Tuple[List[str], Iterator[str]]:
+  """Pulls the first token, so errors opening the stream are raised before anything is yielded."""
+  for token in tokens:
+    return [token], tokens
+  return [], tokens
+
+
+async def _astart_stream(tokens: AsyncIterator[str]) -> Tuple[List[str], AsyncIterator[str]]:
+  """Async version of `_start_stream`."""
+  async for token in tokens:
+    return [token], tokens
+  return [], tokens
 
 
 class AbstractLLM(SimpleChatModel, ABC):
@@ -11,14 +36,24 @@ class AbstractLLM(SimpleChatModel, ABC):
   Abstract base class for Language Learning Models (LLMs).
 
   This class provides a common interface and structure for all LLMs.
-  Subclasses of AbstractLLM should implement the `initialize_client` and `call_internal` methods.
+  Subclasses of AbstractLLM should implement the `initialize_client` and `call_internal` methods,
+  and can implement `acall_internal` to serve async calls without blocking a thread
+  and `stream_internal` and `astream_internal` to stream tokens.
 
   Attributes:
     _llm_type (str): The type of the LLM.
+    streaming (bool): Whether to stream tokens to the callbacks through `on_llm_new_token`.
+    rate_limiter (Optional[TokenBucket]): Limits the rate of calls, shared by all concurrent calls.
+    max_retries (int): Number of times a call is retried after a rate limit error, see `is_rate_limit_error`.
+    retry_base_delay (float): Seconds to wait before the first retry, doubled on every further retry.
   """
+  streaming: bool = False
+  rate_limiter: Optional[TokenBucket] = None
+  max_retries: int = 0
+  retry_base_delay: float = 1.0
 
-  def __init__(self):
-    super().__init__()
+  def __init__(self, **kwargs: Any):
+    super().__init__(**kwargs)
     self.initialize_client()
 
   def _call(
@@ -41,7 +76,167 @@ class AbstractLLM(SimpleChatModel, ABC):
       str: The response generated by the LLM.
     """
     formatted_messages = [convert_message_to_dict(m) for m in messages]
-    return self.call_internal(messages=formatted_messages, **kwargs)
+    return self._with_retries(lambda: self.call_internal(messages=formatted_messages, **kwargs))
+
+  def _generate(
+    self,
+    messages: List[BaseMessage],
+    stop: Optional[List[str]] = None,
+    run_manager: Optional[CallbackManagerForLLMRun] = None,
+    **kwargs: Any,
+  ) -> ChatResult:
+    """Generates through `_stream` when streaming is enabled so callbacks receive every token."""
+    if self.streaming:
+      return generate_from_stream(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+    return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+  def _stream(
+    self,
+    messages: List[BaseMessage],
+    stop: Optional[List[str]] = None,
+    run_manager: Optional[CallbackManagerForLLMRun] = None,
+    **kwargs: Any,
+  ) -> Iterator[ChatGenerationChunk]:
+    """
+    Streams the response of the LLM chunk by chunk. Opening the stream is retried like `_call`
+    until the first token arrives, errors after that are raised.
+
+    Args:
+      messages (List[BaseMessage]): The list of messages to be passed to the LLM.
+      stop (Optional[List[str]]): The list of stop words to be used during the LLM call.
+      run_manager (Optional[CallbackManagerForLLMRun]): The callback manager notified of every new token.
+      **kwargs (Any): Additional keyword arguments to be passed to the LLM.
+
+    Yields:
+      ChatGenerationChunk: The next piece of the response.
+    """
+    formatted_messages = [convert_message_to_dict(m) for m in messages]
+    first, rest = self._with_retries(
+      lambda: _start_stream(iter(self.stream_internal(messages=formatted_messages, **kwargs))))
+    for token in itertools.chain(first, rest):
+      chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+      if run_manager:
+        run_manager.on_llm_new_token(token, chunk=chunk)
+      yield chunk
+
+  async def _acall(
+    self,
+    messages: List[BaseMessage],
+    stop: Optional[List[str]] = None,
+    run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+    **kwargs: Any,
+  ) -> str:
+    """
+    Async version of `_call`.
+
+    Args:
+      messages (List[BaseMessage]): The list of messages to be passed to the LLM.
+      stop (Optional[List[str]]): The list of stop words to be used during the LLM call.
+      run_manager (Optional[AsyncCallbackManagerForLLMRun]): The callback manager for the LLM run.
+      **kwargs (Any): Additional keyword arguments to be passed to the LLM.
+
+    Returns:
+      str: The response generated by the LLM.
+    """
+    formatted_messages = [convert_message_to_dict(m) for m in messages]
+    return await self._awith_retries(lambda: self.acall_internal(messages=formatted_messages, **kwargs))
+
+  async def _agenerate(
+    self,
+    messages: List[BaseMessage],
+    stop: Optional[List[str]] = None,
+    run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+    **kwargs: Any,
+  ) -> ChatResult:
+    """
+    Uses `_acall` instead of running the sync `_generate` in a thread like SimpleChatModel does,
+    or `_astream` when streaming is enabled so callbacks receive every token.
+    """
+    if self.streaming:
+      return await agenerate_from_stream(self._astream(messages, stop=stop, run_manager=run_manager, **kwargs))
+    output_str = await self._acall(messages, stop=stop, run_manager=run_manager, **kwargs)
+    return ChatResult(generations=[ChatGeneration(message=AIMessage(content=output_str))])
+
+  async def _astream(
+    self,
+    messages: List[BaseMessage],
+    stop: Optional[List[str]] = None,
+    run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+    **kwargs: Any,
+  ) -> AsyncIterator[ChatGenerationChunk]:
+    """Async version of `_stream`."""
+    formatted_messages = [convert_message_to_dict(m) for m in messages]
+    first, rest = await self._awith_retries(
+      lambda: _astart_stream(self.astream_internal(messages=formatted_messages, **kwargs)))
+    for token in first:
+      chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+      if run_manager:
+        await run_manager.on_llm_new_token(token, chunk=chunk)
+      yield chunk
+    async for token in rest:
+      chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+      if run_manager:
+        await run_manager.on_llm_new_token(token, chunk=chunk)
+      yield chunk
+
+  def stream(
+    self,
+    input: LanguageModelInput,
+    config: Optional[RunnableConfig] = None,
+    *,
+    stop: Optional[List[str]] = None,
+    **kwargs: Any,
+  ) -> Iterator[BaseMessageChunk]:
+    """
+    Yields the whole response through `invoke`, so agent steps are served from the LLM cache too.
+
+    Agents call `stream` on the LLM, which skips the cache in langchain when `_stream` is
+    implemented. Tokens still reach the callbacks through `_generate` when streaming is enabled.
+    """
+    yield cast(BaseMessageChunk, self.invoke(input, config=config, stop=stop, **kwargs))
+
+  async def astream(
+    self,
+    input: LanguageModelInput,
+    config: Optional[RunnableConfig] = None,
+    *,
+    stop: Optional[List[str]] = None,
+    **kwargs: Any,
+  ) -> AsyncIterator[BaseMessageChunk]:
+    """Async version of `stream`."""
+    yield cast(BaseMessageChunk, await self.ainvoke(input, config=config, stop=stop, **kwargs))
+
+  def is_rate_limit_error(self, error: Exception) -> bool:
+    """Whether the error means the provider rejected the call because of its rate limit."""
+    return False
+
+  def _retry_delay(self, attempt: int) -> float:
+    # Exponential backoff with jitter, so concurrent callers do not retry in lockstep.
+    return self.retry_base_delay * 2 ** attempt * (1 + random.random())
+
+  def _with_retries(self, call: Callable[[], T]) -> T:
+    """Runs the call under the rate limiter and retries it with backoff on rate limit errors."""
+    for attempt in range(self.max_retries + 1):
+      if self.rate_limiter:
+        self.rate_limiter.acquire()
+      try:
+        return call()
+      except Exception as e:
+        if attempt == self.max_retries or not self.is_rate_limit_error(e):
+          raise
+        time.sleep(self._retry_delay(attempt))
+
+  async def _awith_retries(self, call: Callable[[], Awaitable[T]]) -> T:
+    """Async version of `_with_retries`."""
+    for attempt in range(self.max_retries + 1):
+      if self.rate_limiter:
+        await self.rate_limiter.aacquire()
+      try:
+        return await call()
+      except Exception as e:
+        if attempt == self.max_retries or not self.is_rate_limit_error(e):
+          raise
+        await asyncio.sleep(self._retry_delay(attempt))
 
   @abstractmethod
   def initialize_client(self):
@@ -65,6 +260,45 @@ class AbstractLLM(SimpleChatModel, ABC):
     """
     pass
 
+  def stream_internal(self, messages: list[dict], **kwargs) -> Iterator[str]:
+    """
+    Streams the response text of the LLM. By default yields the whole `call_internal` response at once,
+    override it to deliver the first tokens before the response is complete.
+
+    Args:
+      messages (list[dict]): Representing the conversation history to be passed to the LLM.
+
+    Yields:
+      str: The next piece of the response text.
+    """
+    yield self.call_internal(messages=messages, **kwargs)
+
+  async def astream_internal(self, messages: list[dict], **kwargs) -> AsyncIterator[str]:
+    """
+    Async version of `stream_internal`. By default yields the whole `acall_internal` response at once.
+
+    Args:
+      messages (list[dict]): Representing the conversation history to be passed to the LLM.
+
+    Yields:
+      str: The next piece of the response text.
+    """
+    yield await self.acall_internal(messages=messages, **kwargs)
+
+  async def acall_internal(self, messages: list[dict], **kwargs) -> str:
+    """
+    Async version of `call_internal`. By default runs `call_internal` in a thread, override it
+    with a native async client to serve many concurrent calls without a thread each.
+
+    Args:
+      messages (list[dict]): Representing the conversation history to be passed to the LLM.
+
+    Returns:
+      str: The response text generated by the LLM.
+    """
+    call = functools.partial(self.call_internal, messages=messages, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
   @property
   def _llm_type(self) -> str:
     """
@@ -0,0 +1,204 @@
+"""Tiered LLM response cache: an in-process LRU in front of a WAL mode SQLite store."""
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+_PRUNE_EVERY_WRITES = 100
+# Set in the generation_info of served responses, so callbacks can tell cached LLM calls apart.
+CACHE_HIT_KEY = "cache_hit"
+
+
+def _cache_key(prompt: str, llm_string: str) -> str:
+  return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+
+def _mark_hit(value: RETURN_VAL_TYPE, tier: str) -> RETURN_VAL_TYPE:
+  return [generation.copy(update={"generation_info": {**(generation.generation_info or {}),
+                                                      CACHE_HIT_KEY: tier}})
+          for generation in value]
+
+
+class TieredLLMCache(BaseCache):
+  """
+  LLM cache safe to share between threads and processes.
+
+  Lookups check an in-process LRU first and then the SQLite store. The store runs in WAL
+  mode with one connection per thread, so readers never wait on each other or on the writer.
+  Updates go to the LRU right away and are written to the store in batches by a background
+  thread, so the calling thread never waits on a write lock. The store is pruned to
+  `max_entries`, least recently written first, and entries older than `ttl_seconds` are ignored
+  and deleted.
+
+  Attributes:
+    path (str): The SQLite file of the persistent tier.
+    memory_entries (int): Maximum number of responses kept in process.
+    max_entries (int): Maximum number of responses kept in the SQLite file.
+    ttl_seconds (Optional[float]): Age after which a response is no longer served, None to keep it.
+  """
+
+  def __init__(self, path: str, memory_entries: int = 1024, max_entries: int = 10_000,
+               ttl_seconds: Optional[float] = None):
+    self.path = path
+    self.memory_entries = memory_entries
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self._memory: OrderedDict[str, tuple[float, RETURN_VAL_TYPE]] = OrderedDict()
+    self._memory_lock = threading.Lock()
+    self._local = threading.local()
+    self._writes: queue.Queue = queue.Queue()
+    self._stats_lock = threading.Lock()
+    self._memory_hits = 0
+    self._store_hits = 0
+    self._misses = 0
+
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    connection = self._connection()
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS llm_responses "
+                       "(key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)")
+    connection.execute("CREATE INDEX IF NOT EXISTS llm_responses_created_at ON llm_responses (created_at)")
+    self._writer = threading.Thread(target=self._write_loop, name="llm-cache-writer", daemon=True)
+    self._writer.start()
+
+  def _connection(self) -> sqlite3.Connection:
+    """The SQLite connection of the calling thread."""
+    connection = getattr(self._local, "connection", None)
+    if connection is None:
+      connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+      connection.execute("PRAGMA synchronous=NORMAL")
+      self._local.connection = connection
+    return connection
+
+  def _expired(self, created_at: float) -> bool:
+    return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+  def _count(self, stat: str):
+    with self._stats_lock:
+      setattr(self, stat, getattr(self, stat) + 1)
+
+  def _remember(self, key: str, created_at: float, value: RETURN_VAL_TYPE):
+    with self._memory_lock:
+      self._memory[key] = (created_at, value)
+      self._memory.move_to_end(key)
+      while len(self._memory) > self.memory_entries:
+        self._memory.popitem(last=False)
+
+  def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+    key = _cache_key(prompt, llm_string)
+    with self._memory_lock:
+      entry = self._memory.get(key)
+      if entry is not None:
+        self._memory.move_to_end(key)
+    if entry is not None and not self._expired(entry[0]):
+      self._count("_memory_hits")
+      return _mark_hit(entry[1], "memory")
+
+    row = self._connection().execute("SELECT response, created_at FROM llm_responses WHERE key = ?",
+                                     (key,)).fetchone()
+    if row is None or self._expired(row[1]):
+      self._count("_misses")
+      return None
+    try:
+      value = loads(row[0])
+    except Exception:
+      # Written by an incompatible langchain version, treat it as a miss and let it be overwritten.
+      self._count("_misses")
+      return None
+    self._remember(key, row[1], value)
+    self._count("_store_hits")
+    return _mark_hit(value, "store")
+
+  def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE):
+    key = _cache_key(prompt, llm_string)
+    created_at = time.time()
+    self._remember(key, created_at, return_val)
+    self._writes.put((key, dumps(return_val), created_at))
+
+  def _write_loop(self):
+    """Writes the queued responses in batches and prunes the store, runs on the writer thread."""
+    written = 0
+    while True:
+      batch = [self._writes.get()]
+      while True:
+        try:
+          batch.append(self._writes.get_nowait())
+        except queue.Empty:
+          break
+      try:
+        rows = [row for row in batch if row is not None]
+        if rows:
+          connection = self._connection()
+          connection.executemany("INSERT OR REPLACE INTO llm_responses (key, response, created_at) "
+                                 "VALUES (?, ?, ?)", rows)
+          written += len(rows)
+          if written >= _PRUNE_EVERY_WRITES:
+            written = 0
+            self._prune(connection)
+      except sqlite3.Error:
+        # The store is only a cache, a failed write must not stop later ones.
+        pass
+      finally:
+        for _ in batch:
+          self._writes.task_done()
+
+  def _prune(self, connection: sqlite3.Connection):
+    if self.ttl_seconds is not None:
+      connection.execute("DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+    connection.execute("DELETE FROM llm_responses WHERE key IN (SELECT key FROM llm_responses "
+                       "ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+  def flush(self):
+    """Blocks until the queued writes are in the store and prunes it."""
+    self._writes.put(None)
+    self._writes.join()
+    self._prune(self._connection())
+
+  def clear(self, **kwargs: Any):
+    self._writes.join()
+    with self._memory_lock:
+      self._memory.clear()
+    self._connection().execute("DELETE FROM llm_responses")
+
+  def stats(self) -> dict[str, Any]:
+    """Hit and miss counts of both tiers since the cache was created."""
+    with self._stats_lock:
+      hits = self._memory_hits + self._store_hits
+      lookups = hits + self._misses
+      return {"memory_hits": self._memory_hits, "store_hits": self._store_hits, "misses": self._misses,
+              "hit_rate": hits / lookups if lookups else 0.0, "memory_entries": len(self._memory),
+              "pending_writes": self._writes.unfinished_tasks}
+
+
+_LLM_CACHES: dict[str, TieredLLMCache] = {}
+_LLM_CACHES_LOCK = threading.Lock()
+
+
+def shared_llm_cache(path: str, memory_entries: int = 1024, max_entries: int = 10_000,
+                     ttl_seconds: Optional[float] = None) -> TieredLLMCache:
+  """
+  Returns the process-wide cache for the given file, creating it with the given settings if needed.
+
+  Raises:
+    ValueError: If the cache of the file was created with other settings. One file has one
+      writer thread and one bound, two caches pruning it to different bounds would fight.
+  """
+  path = os.path.abspath(path)
+  settings = {"memory_entries": memory_entries, "max_entries": max_entries, "ttl_seconds": ttl_seconds}
+  with _LLM_CACHES_LOCK:
+    if path not in _LLM_CACHES:
+      _LLM_CACHES[path] = TieredLLMCache(path, **settings)
+    cache = _LLM_CACHES[path]
+  existing = {name: getattr(cache, name) for name in settings}
+  if existing != settings:
+    raise ValueError(f"The LLM cache {path} is already open with {existing}, not {settings}.")
+  return cache
@@ -1,6 +1,37 @@
+import asyncio
+import functools
+import threading
+import weakref
+
 from llms.abstract_llm import AbstractLLM
 import openai
 
+OPENAI_MODEL = "gpt-4-turbo"
+
+_ASYNC_CLIENTS_LOCK = threading.Lock()
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncClient]" = \
+    weakref.WeakKeyDictionary()
+
+
+@functools.lru_cache(maxsize=None)
+def shared_client() -> openai.Client:
+  """One long lived client per process, so connections are kept alive between calls."""
+  return openai.Client()
+
+
+def shared_async_client() -> openai.AsyncClient:
+  """
+  One long lived async client per event loop.
+
+  The connections of an async client are bound to the loop they were opened on,
+  so clients can not be shared across loops.
+  """
+  loop = asyncio.get_running_loop()
+  with _ASYNC_CLIENTS_LOCK:
+    if loop not in _ASYNC_CLIENTS:
+      _ASYNC_CLIENTS[loop] = openai.AsyncClient()
+    return _ASYNC_CLIENTS[loop]
+
 
 class OpenAILLM(AbstractLLM):
   """
@@ -8,9 +39,12 @@ class OpenAILLM(AbstractLLM):
   """
 
   def initialize_client(self):
-    """Initialize but actually do nothing here."""
+    """Initialize but actually do nothing here, the clients are shared and created on first use."""
     print('openai model initialized')
 
+  def is_rate_limit_error(self, error: Exception) -> bool:
+    return isinstance(error, openai.RateLimitError)
+
   def call_internal(self, messages: list, **kwargs):
     """calls the openai api and returns the response.
 
@@ -21,13 +55,39 @@ class OpenAILLM(AbstractLLM):
         [{'role': 'user', 'content': 'Hello, how are you?'}]
 
     """
-    client = openai.Client()
     print([m.keys()for m in messages])
     # In this case it already matches the openai format therefore no need to convert.
     openai_messages = messages
-    completion = client.chat.completions.create(model="gpt-4-turbo",
-                                                messages=openai_messages,
-                                                temperature=0)
+    completion = shared_client().chat.completions.create(model=OPENAI_MODEL,
+                                                         messages=openai_messages,
+                                                         temperature=0)
+    return completion.choices[0].message.content
+
+  def stream_internal(self, messages: list, **kwargs):
+    """Streams the chat completion and yields the content of every delta as soon as it arrives."""
+    stream = shared_client().chat.completions.create(model=OPENAI_MODEL,
+                                                     messages=messages,
+                                                     temperature=0,
+                                                     stream=True)
+    for chunk in stream:
+      if chunk.choices and chunk.choices[0].delta.content:
+        yield chunk.choices[0].delta.content
+
+  async def astream_internal(self, messages: list, **kwargs):
+    """Same as `stream_internal` but iterates the stream of the shared async client."""
+    stream = await shared_async_client().chat.completions.create(model=OPENAI_MODEL,
+                                                                 messages=messages,
+                                                                 temperature=0,
+                                                                 stream=True)
+    async for chunk in stream:
+      if chunk.choices and chunk.choices[0].delta.content:
+        yield chunk.choices[0].delta.content
+
+  async def acall_internal(self, messages: list, **kwargs):
+    """Same as `call_internal` but awaits the shared async client instead of blocking a thread."""
+    completion = await shared_async_client().chat.completions.create(model=OPENAI_MODEL,
+                                                                     messages=messages,
+                                                                     temperature=0)
     return completion.choices[0].message.content
 
 
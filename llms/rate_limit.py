@@ -0,0 +1,51 @@
+"""Token bucket rate limiter shared by concurrent LLM calls."""
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+  """
+  Allows `rate` acquisitions per second on average, with bursts of up to `capacity`.
+
+  Safe to share between threads and between coroutines of an event loop.
+
+  Attributes:
+    rate (float): Tokens added per second.
+    capacity (float): Maximum number of tokens the bucket holds.
+  """
+
+  def __init__(self, rate: float, capacity: float = 1.0):
+    if rate <= 0:
+      raise ValueError(f"rate must be positive, got: {rate}")
+    self.rate = rate
+    self.capacity = max(capacity, 1.0)
+    self._tokens = self.capacity
+    self._updated = time.monotonic()
+    self._lock = threading.Lock()
+
+  @classmethod
+  def per_minute(cls, requests_per_minute: float, burst: float = 1.0) -> "TokenBucket":
+    return cls(rate=requests_per_minute / 60.0, capacity=burst)
+
+  def _reserve(self) -> float:
+    """Takes a token and returns how many seconds the caller has to wait before using it."""
+    with self._lock:
+      now = time.monotonic()
+      self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+      self._updated = now
+      self._tokens -= 1
+      # A negative balance is a reservation of future tokens, served in arrival order.
+      return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+  def acquire(self):
+    """Blocks the thread until a token is available."""
+    wait = self._reserve()
+    if wait > 0:
+      time.sleep(wait)
+
+  async def aacquire(self):
+    """Waits without blocking the event loop until a token is available."""
+    wait = self._reserve()
+    if wait > 0:
+      await asyncio.sleep(wait)
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+from llms.abstract_llm import AbstractLLM
+
+RECORD = "record"
+REPLAY = "replay"
+
+_TRANSCRIPT_LOCK = threading.Lock()
+
+
+def prompt_hash(messages: list[dict]) -> str:
+  return hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).hexdigest()
+
+
+class RecordReplayLLM(AbstractLLM):
+  """
+  An LLM stand-in that records the responses of a real LLM to disk and replays them without network.
+
+  Transcripts are stored per session, e.g. one per benchmark question, as the ordered list of
+  responses. Replay returns them in the same order, so changes in connector, formatting or
+  callback code that alter the prompts do not break the replay. The prompt hashes are recorded
+  too, `strict=True` makes replay fail when the prompts differ from the recording.
+
+  Attributes:
+    transcript_dir (str): Directory holding one `{session}.json` transcript per session.
+    mode (str): 'record' to call `inner_llm` and save its responses, 'replay' to return saved ones.
+    inner_llm (Optional[AbstractLLM]): The real LLM, only needed to record.
+    strict (bool): Whether replay checks that the prompts match the recorded ones.
+    session (str): The current transcript, see `start_session`.
+  """
+  transcript_dir: str
+  mode: str = REPLAY
+  inner_llm: Optional[AbstractLLM] = None
+  strict: bool = False
+  session: str = "default"
+  call_index: int = 0
+
+  def initialize_client(self):
+    """Validates the mode, there is no client to create."""
+    if self.mode not in (RECORD, REPLAY):
+      raise ValueError(f"Invalid mode: {self.mode}, expected '{RECORD}' or '{REPLAY}'.")
+    if self.mode == RECORD and self.inner_llm is None:
+      raise ValueError("An inner_llm is required to record transcripts.")
+
+  def _transcript_path(self) -> str:
+    return os.path.join(self.transcript_dir, f"{self.session}.json")
+
+  def _load_calls(self) -> list[dict]:
+    path = self._transcript_path()
+    if not os.path.exists(path):
+      return []
+    with open(path, 'r') as file:
+      return json.load(file)["calls"]
+
+  def start_session(self, session: str):
+    """Switches to the transcript of the given session and restarts it from the first call."""
+    self.session = session
+    self.call_index = 0
+    if self.mode == RECORD and os.path.exists(self._transcript_path()):
+      os.remove(self._transcript_path())
+
+  def call_internal(self, messages: list, **kwargs) -> str:
+    """Returns the next recorded response, or calls `inner_llm` and records its response."""
+    with _TRANSCRIPT_LOCK:
+      calls = self._load_calls()
+      index = self.call_index
+      self.call_index += 1
+
+      if self.mode == REPLAY:
+        if index >= len(calls):
+          raise ValueError(f"Transcript {self._transcript_path()} has no response for call {index}, "
+                           "record it first.")
+        if self.strict and calls[index]["prompt_hash"] != prompt_hash(messages):
+          raise ValueError(f"Prompt of call {index} differs from transcript {self._transcript_path()}.")
+        return calls[index]["response"]
+
+      response = self.inner_llm.call_internal(messages=messages, **kwargs)
+      calls.append({"prompt_hash": prompt_hash(messages), "response": response})
+      os.makedirs(self.transcript_dir, exist_ok=True)
+      tmp_path = self._transcript_path() + ".tmp"
+      with open(tmp_path, 'w') as file:
+        json.dump({"session": self.session, "calls": calls}, file, indent=2)
+      os.replace(tmp_path, self._transcript_path())
+      return response
@@ -1,17 +1,22 @@
-from ast import literal_eval
 import re
+import time
 import pandas as pd
 import sqlparse
 from langchain.callbacks.streamlit.streamlit_callback_handler import StreamlitCallbackHandler
 from langchain_core.agents import AgentFinish
 from langchain_core.outputs import LLMResult
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional
 
 from agent_utils.extra_tools import parse_to_df_and_code
 from db_connector.abstract_sql_connector import maybe_extract_sql
+from db_connector.result_store import current_result_store, output_handle
 
 
 THOUGHT_PREFIX = "Thought: "
+# Minimum seconds between two renders of a streaming LLM output, to not flood the browser with updates.
+TOKEN_RENDER_INTERVAL = 0.1
+# Maximum number of rows of a result table rendered in the browser.
+DISPLAY_MAX_ROWS = 50
 
 
 def get_first_thought(text):
@@ -21,24 +26,31 @@ def get_first_thought(text):
   raise ValueError("No line starting with 'Thought' found")
 
 
-def to_markdown_table(d: Union[str, dict, pd.DataFrame]) -> str:
-  if isinstance(d, pd.DataFrame):
-    df = d
-  elif isinstance(d, dict):
-    df = pd.DataFrame(d)
-  else:
-    df = pd.DataFrame(literal_eval(d))
-
-  html = df.to_html(index=False)
-  return "<div style = \"overflow-x: auto; font-size: 12px;\" >" + html + "</div>"
-
-
-def replace_dict_to_markdown_table(text: str) -> str:
-  dict_strings = re.findall(r"\{[^}]*\}", text)
-  markdown_strings = [to_markdown_table(d) for d in dict_strings]
-  for i, d in enumerate(dict_strings):
-    text = text.replace(d, markdown_strings[i])
-  return text
+def dataframe_html(df: pd.DataFrame, total_rows: Optional[int] = None) -> str:
+  """Renders at most `DISPLAY_MAX_ROWS` rows in a scrollable box, with a note when rows are left out."""
+  shown = df.head(DISPLAY_MAX_ROWS)
+  html = shown.to_html(index=False)
+  total_rows = len(df) if total_rows is None else total_rows
+  note = f"\n\n*Showing {len(shown)} of {total_rows} rows.*" if total_rows > len(shown) else ""
+  return ("<div style = \"overflow: auto; max-height: 400px; font-size: 12px;\" >" + html + "</div>" + note)
+
+
+def format_output_str_based_on_tool(tool_name: str, output: str) -> str:
+  """Renders the stored payload of the tool output if it has one, otherwise the output text itself."""
+  handle = output_handle(output)
+  store = current_result_store()
+  if handle is not None and store is not None:
+    chart = store.get_chart(handle)
+    if chart is not None:
+      return center_chart_html(chart)
+    result = store.get_result(handle)
+    if result is not None:
+      # The text below the handle line may start with cost guard warnings.
+      warnings = [part for part in output.split("\n\n", 2)[1:2] if part.startswith("Warning:")]
+      return "\n\n".join(warnings + [dataframe_html(result.df, result.total_rows)])
+  if tool_name == 'visualize_data' and not output.startswith("Error"):
+    return center_chart_html(output)
+  return output
 
 
 def format_input_str_based_on_tool(tool_name: str, input_str: str) -> str:
@@ -47,14 +59,30 @@ def format_input_str_based_on_tool(tool_name: str, input_str: str) -> str:
     return f"```sql\n{sqlparse.format(input_str, reindent=True, keyword_case='upper')}\n```"
   elif tool_name == 'visualize_data':
     try:
-      df, code = parse_to_df_and_code(input_str)
-      return f"#### Data\n\n{to_markdown_table(df)}\n\n#### Code\n\n```python\n{code}\n```"
+      df, code, warning = parse_to_df_and_code(input_str)
+      data = dataframe_html(df) if warning is None else f"{warning}\n\n{dataframe_html(df)}"
+      return f"#### Data\n\n{data}\n\n#### Code\n\n```python\n{code}\n```"
     except Exception as e:
       return f"Error: {e}"
   else:
     return f"```\n{input_str}\n```\n"
 
 
+def format_partial_llm_output(text: str) -> str:
+  """Renders the thought, and the action input or final answer, of an LLM output that is still streaming."""
+  parts = re.split(r"\n(Action|Action Input|Final Answer):", text.partition(THOUGHT_PREFIX.strip())[2])
+  result = f"### Thought\n\n{parts[0].strip()}\n\n"
+  fields = dict(zip(parts[1::2], parts[2::2]))
+  action_input = fields.get("Action Input", "").strip()
+  if action_input:
+    language = "sql" if fields.get("Action", "").strip() == "query_database" else ""
+    action_input = action_input.replace("```sql", "").replace("```", "").strip()
+    result += f"### Input\n```{language}\n{action_input}\n```\n"
+  if fields.get("Final Answer", "").strip():
+    result += f"## Answer\n\n{fields['Final Answer'].strip()}\n"
+  return result
+
+
 def center_chart_html(chart_html):
   return f"""<div style="display: flex; justify-content: center; align-items: center;">{chart_html}</div>"""
 
@@ -62,10 +90,28 @@ def center_chart_html(chart_html):
 class CallbackHandlerWithVisualization(StreamlitCallbackHandler):
   """A custom callback handler that renders the agent output."""
 
+  def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+    """Starts a new thought and resets the streamed tokens."""
+    super().on_llm_start(serialized, prompts, **kwargs)
+    self._streamed_text = ""
+    self._streamed_index = None
+    self._last_render_time = 0.0
+
+  def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+    """Renders the thought and the sql progressively while the LLM is still generating."""
+    self._streamed_text += token
+    now = time.monotonic()
+    if now - self._last_render_time < TOKEN_RENDER_INTERVAL:
+      return
+    self._last_render_time = now
+    self._streamed_index = self._require_current_thought()._container.markdown(
+      format_partial_llm_output(self._streamed_text), index=self._streamed_index)
+
   def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
-    """Add thoughts to the block"""
+    """Add thoughts to the block, replacing the streamed output if any."""
     thought_str = f"### Thought\n\n{get_first_thought(response.generations[0][0].text)}\n\n"
-    self._require_current_thought()._container.markdown(thought_str)
+    self._require_current_thought()._container.markdown(thought_str, index=self._streamed_index)
+    self._streamed_index = None
     self._prune_old_thought_containers()
 
   def on_tool_start(
@@ -85,11 +131,8 @@ class CallbackHandlerWithVisualization(StreamlitCallbackHandler):
           observation_prefix: Optional[str] = None,
           llm_prefix: Optional[str] = None,
           **kwargs: Any,):
-    """Renders the tool outptu to markdown tables."""
-    if self._current_thought._last_tool.name == 'visualize_data':
-      output_str = center_chart_html(output)
-    else:
-      output_str = replace_dict_to_markdown_table(str(output))
+    """Renders the tool output, from its stored payload when it has one."""
+    output_str = format_output_str_based_on_tool(self._current_thought._last_tool.name, str(output))
 
     self._require_current_thought()._container.markdown(
       f"### Output\n\n{output_str}\n\n___", unsafe_allow_html=True)
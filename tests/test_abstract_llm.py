@@ -0,0 +1,45 @@
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig
+
+from llms.abstract_llm import AbstractLLM
+
+
+class RateLimited(Exception):
+  pass
+
+
+class TokenCollector(BaseCallbackHandler):
+  def __init__(self):
+    self.tokens = []
+
+  def on_llm_new_token(self, token, **kwargs):
+    self.tokens.append(token)
+
+
+class FlakyLLM(AbstractLLM):
+  """Fails with a rate limit error on the first `failures` calls, then streams two tokens."""
+  failures: int = 1
+  calls: int = 0
+
+  def initialize_client(self):
+    pass
+
+  def is_rate_limit_error(self, error):
+    return isinstance(error, RateLimited)
+
+  def call_internal(self, messages, **kwargs):
+    return "".join(self.stream_internal(messages, **kwargs))
+
+  def stream_internal(self, messages, **kwargs):
+    self.calls += 1
+    if self.calls <= self.failures:
+      raise RateLimited()
+    yield "ans"
+    yield "wer"
+
+
+def test_streaming_retries_until_the_first_token():
+  llm = FlakyLLM(streaming=True, max_retries=2, retry_base_delay=0.0, cache=False)
+  collector = TokenCollector()
+  assert llm.invoke("question", config=RunnableConfig(callbacks=[collector])).content == "answer"
+  assert llm.calls == 2 and collector.tokens == ["ans", "wer"]
@@ -0,0 +1,30 @@
+import asyncio
+import json
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from agent import SQLAgent
+from config import Config
+
+TRANSCRIPTS = "benchmarks/transcripts"
+
+
+class TokenCollector(BaseCallbackHandler):
+  def __init__(self):
+    self.tokens = []
+
+  def on_llm_new_token(self, token, **kwargs):
+    self.tokens.append(token)
+
+
+def test_arun_streams_the_tokens_of_every_step():
+  config = Config.create_record_replay_custom_sqllite_with_chart(transcript_dir=TRANSCRIPTS)
+  config.llm.streaming = True
+  config.llm.start_session("revenue_by_country")
+  collector = TokenCollector()
+  result = asyncio.run(SQLAgent(config).arun("What are the top 5 billing countries by total invoice revenue?",
+                                              callbacks=[collector]))
+  with open(f"{TRANSCRIPTS}/revenue_by_country.json") as file:
+    responses = [call["response"] for call in json.load(file)["calls"]]
+  assert collector.tokens == responses
+  assert result["output"].startswith("The top 5 billing countries")
@@ -0,0 +1,54 @@
+import asyncio
+import io
+import json
+
+from batch_runner import read_questions, run_batch
+
+
+class FakeAgent:
+  """Answers after the delay in the question, fails on questions starting with "fail"."""
+
+  def __init__(self):
+    self.in_flight = 0
+    self.max_in_flight = 0
+
+  async def arun(self, question, callbacks=None):
+    self.in_flight += 1
+    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+    try:
+      await asyncio.sleep(float(question.split()[-1]))
+      if question.startswith("fail"):
+        raise RuntimeError("agent failed")
+      return {"output": f"answer to {question}", "intermediate_steps": []}
+    finally:
+      self.in_flight -= 1
+
+
+def test_read_questions_gives_plain_lines_their_line_number(tmp_path):
+  path = tmp_path / "questions.txt"
+  path.write_text('first 0\n\n{"id": "q2", "question": "second 0"}\nthird 0\n')
+  assert read_questions(str(path)) == [{"question": "first 0", "id": "1"}, {"id": "q2", "question": "second 0"},
+                                       {"question": "third 0", "id": "4"}]
+
+
+def test_results_are_written_as_they_complete_and_errors_stay_isolated():
+  questions = [{"id": "slow", "question": "slow 0.3"}, {"id": "fail", "question": "fail 0.1"},
+               {"id": "fast", "question": "fast 0.0"}]
+  agent, output = FakeAgent(), io.StringIO()
+  summary = asyncio.run(run_batch(agent, questions, output, concurrency=3))
+  records = [json.loads(line) for line in output.getvalue().splitlines()]
+  assert [record["id"] for record in records[:-1]] == ["fast", "fail", "slow"]
+  assert records[1]["error"] == "RuntimeError: agent failed" and records[1]["output"] is None
+  assert records[2]["output"] == "answer to slow 0.3" and records[2]["error"] is None
+  assert records[-1] == summary
+  assert summary["type"] == "summary" and summary["questions"] == 3 and summary["errors"] == 1
+
+
+def test_concurrency_limits_the_questions_in_flight():
+  questions = [{"id": str(number), "question": f"q {0.01 * (number % 3)}"} for number in range(10)]
+  agent, output = FakeAgent(), io.StringIO()
+  summary = asyncio.run(run_batch(agent, questions, output, concurrency=2))
+  assert agent.max_in_flight == 2
+  assert sorted(json.loads(line)["id"] for line in output.getvalue().splitlines()[:-1]) == \
+         sorted(question["id"] for question in questions)
+  assert summary["errors"] == 0 and summary["p50_latency_s"] <= summary["max_latency_s"]
@@ -0,0 +1,83 @@
+import sys
+import threading
+import time
+import types
+
+import pandas as pd
+import pytest
+
+from agent_utils import chart_renderer
+from agent_utils.chart_renderer import ChartRenderer, ChartTimeoutError
+
+# Chart code that ignores the worker's own timer, so only killing the worker stops it.
+HANGING_CODE = "import signal\nsignal.signal(signal.SIGALRM, signal.SIG_IGN)\nimport time\ntime.sleep(30)\nhtml_str = ''"
+
+
+@pytest.fixture
+def renderer(monkeypatch):
+  monkeypatch.setattr(chart_renderer, "_KILL_GRACE_SECONDS", 0.5)
+  renderer = ChartRenderer(max_workers=2, timeout_seconds=2.0)
+  renderer.warmup()
+  yield renderer
+  renderer.shutdown()
+
+
+def test_a_hanging_chart_only_kills_its_own_worker(renderer):
+  df = pd.DataFrame({"x": [1, 2, 3]})
+  outcomes = {}
+
+  def render(name, code, delay=0.0):
+    time.sleep(delay)
+    try:
+      outcomes[name] = renderer.render(df, code)
+    except Exception as e:
+      outcomes[name] = e
+
+  threads = [threading.Thread(target=render, args=("hanging", HANGING_CODE)),
+             # Still running when the hanging worker is killed, 2.5 seconds in.
+             threading.Thread(target=render, args=("ok", "import time\ntime.sleep(1)\nhtml_str = str(len(df))", 2.0))]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert isinstance(outcomes["hanging"], ChartTimeoutError)
+  assert outcomes["ok"] == "3"
+  assert renderer.render(df, "html_str = 'after'") == "after"
+
+
+def test_errors_and_timer_timeouts_keep_the_worker(renderer):
+  df = pd.DataFrame({"x": [1]})
+  with pytest.raises(ValueError, match="bad"):
+    renderer.render(df, "raise ValueError('bad')")
+  with pytest.raises(ChartTimeoutError):
+    renderer.render(df, "while True: pass")
+  assert len(renderer._idle) == 2
+
+
+def test_workers_do_not_run_an_unguarded_main(tmp_path, monkeypatch):
+  # Like `streamlit run client.py`, the app script is __main__ and has no main guard.
+  marker = tmp_path / "main_ran"
+  script = tmp_path / "app.py"
+  script.write_text(f"open({str(marker)!r}, 'w').close()\n")
+  main = types.ModuleType("__main__")
+  main.__file__ = str(script)
+  monkeypatch.setitem(sys.modules, "__main__", main)
+  renderer = ChartRenderer(max_workers=1, timeout_seconds=5.0)
+  try:
+    assert renderer.render(pd.DataFrame({"x": [1, 2]}), "html_str = str(len(df))") == "2"
+  finally:
+    renderer.shutdown()
+  assert not marker.exists()
+
+
+def test_an_interrupted_job_kills_its_worker(renderer, monkeypatch):
+  worker = renderer._idle[-1]
+
+  def interrupted_run(function, args, timeout_seconds):
+    raise KeyboardInterrupt
+
+  monkeypatch.setattr(worker, "run", interrupted_run)
+  with pytest.raises(KeyboardInterrupt):
+    renderer.render(pd.DataFrame({"x": [1]}), "html_str = 'interrupted'")
+  assert worker not in renderer._idle and worker.process.poll() is not None
+  assert renderer.render(pd.DataFrame({"x": [1]}), "html_str = 'next'") == "next"
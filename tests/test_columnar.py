@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from db_connector.columnar import arrow_table, concat_frames, frame_from_rows
+
+
+def chunked(rows, columns, chunk_size):
+  return concat_frames(frame_from_rows(rows[start:start + chunk_size], columns)
+                       for start in range(0, len(rows), chunk_size))
+
+
+def test_chunks_have_the_dtypes_of_a_single_frame():
+  rows = [(1, 1.5, "a", None), (2, None, None, None), (None, 2.5, "c", None), (4, 3.5, "d", None)]
+  columns = ["id", "price", "name", "empty"]
+  expected = pd.DataFrame(rows, columns=columns)
+  for chunk_size in (1, 2, 3, 4):
+    df = chunked(rows, columns, chunk_size)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_integers_with_nulls_only_in_a_later_chunk_become_floats():
+  rows = [(1,), (2,), (None,), (None,)]
+  df = chunked(rows, ["n"], 2)
+  assert df["n"].dtype == np.float64
+  assert df["n"].tolist()[:2] == [1.0, 2.0] and df["n"].isna().tolist() == [False, False, True, True]
+
+
+def test_mixed_types_stay_objects():
+  df = chunked([(1,), ("a",), (None,)], ["v"], 1)
+  assert df["v"].dtype == object and df["v"].tolist() == [1, "a", None]
+
+
+def test_duplicate_column_names_are_kept():
+  df = chunked([(1, 2), (3, 4)], ["id", "id"], 1)
+  assert list(df.columns) == ["id", "id"] and df.iloc[:, 1].tolist() == [2, 4]
+
+
+def test_arrow_table_reads_mixed_columns_as_strings():
+  pa = pytest.importorskip("pyarrow")
+  chunks = [frame_from_rows([(1, 1, "a"), (2, None, 1.5)], ["id", "n", "mixed"]),
+            frame_from_rows([(3, 2.5, "c")], ["id", "n", "mixed"]),
+            frame_from_rows([(4, None, 7)], ["id", "n", "mixed"])]
+  table = arrow_table(chunks)
+  assert table.schema.types == [pa.int64(), pa.float64(), pa.string()]
+  assert table.column("mixed").to_pylist() == ["a", "1.5", "c", "7"]
+  assert table.column("n").to_pylist() == [1.0, None, 2.5, None]
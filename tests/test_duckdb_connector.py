@@ -0,0 +1,82 @@
+import os
+
+import pandas as pd
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+from db_connector.abstract_sql_connector import QueryPreflightError, QueryTimeoutError  # noqa: E402
+from db_connector.duckdb_connector import DuckDBConnector  # noqa: E402
+
+
+@pytest.fixture
+def extracts(tmp_path):
+  os.makedirs(tmp_path / "sales")
+  pd.DataFrame({"id": [1, 2, 3], "region": ["EU", "US", "EU"], "amount": [10.5, 20.0, None]}) \
+    .to_parquet(tmp_path / "sales" / "part-0.parquet")
+  pd.DataFrame({"id": [4], "region": ["US"], "amount": [5.0]}).to_parquet(tmp_path / "sales" / "part-1.parquet")
+  pd.DataFrame({"id": [1, 2], "name": ["Ann", "Bob"]}).to_csv(tmp_path / "customers.csv", index=False)
+  return tmp_path
+
+
+@pytest.fixture
+def connector(extracts):
+  return DuckDBConnector.create(source_dirs=[str(extracts)], table_stats_enabled=False)
+
+
+def test_sources_become_tables(connector):
+  assert connector.table_names() == ["customers", "sales"]
+  sales = connector.catalog.tables(connector)["sales"]
+  assert [(column.name, column.type) for column in sales.columns] == \
+         [("id", "BIGINT"), ("region", "VARCHAR"), ("amount", "DOUBLE")]
+
+
+def test_query_and_query_iter(connector):
+  df = connector.query("SELECT region, SUM(amount) AS total FROM sales GROUP BY region ORDER BY region")
+  assert df.to_dict("list") == {"region": ["EU", "US"], "total": [10.5, 25.0]}
+  chunks = list(connector.query_iter("SELECT * FROM sales ORDER BY id", 3))
+  assert [len(chunk) for chunk in chunks] == [3, 1]
+  empty = list(connector.query_iter("SELECT * FROM customers WHERE id < 0", 3))
+  assert len(empty) == 1 and list(empty[0].columns) == ["id", "name"]
+
+
+def test_preflight_errors_are_rewritten(connector):
+  assert connector.checked_preflight("SELECT amout FROM sales") == "no such column: amout. Did you mean: sales.amount?"
+  assert connector.checked_preflight("SELECT * FROM sale").startswith("no such table: sale")
+  with pytest.raises(QueryPreflightError):
+    connector.guarded_fetch("SELECT nme FROM customers")
+
+
+def test_queries_time_out(connector):
+  connector.query_timeout_ms = 100
+  with pytest.raises(QueryTimeoutError):
+    connector.query("SELECT COUNT(*) FROM range(1000000000) a, range(1000) b WHERE a.range % 7 = b.range")
+
+
+def test_database_file_is_attached_read_only(extracts):
+  path = str(extracts / "shop.duckdb")
+  with duckdb.connect(path) as connection:
+    connection.execute("CREATE TABLE artist (id INTEGER PRIMARY KEY, name VARCHAR)")
+    connection.execute("INSERT INTO artist VALUES (1, 'AC/DC')")
+  modified = os.stat(path).st_mtime_ns
+  connector = DuckDBConnector.create(database=path, source_dirs=[str(extracts)], table_stats_enabled=False)
+  assert connector.table_names() == ["artist", "customers", "sales"]
+  assert connector.catalog.tables(connector)["artist"].primary_key == ["id"]
+  assert connector.query("SELECT name FROM artist").iloc[0, 0] == "AC/DC"
+  with pytest.raises(duckdb.Error):
+    connector.query("INSERT INTO artist VALUES (2, 'Accept')")
+  assert os.stat(path).st_mtime_ns == modified
+
+
+def test_data_version_skips_removed_files(connector, extracts):
+  before = connector.data_version()
+  os.remove(extracts / "sales" / "part-1.parquet")
+  after = connector.data_version()
+  assert len(after) == len(before) - 1
+
+
+def test_table_stats_sample_large_tables(connector):
+  connector.stats_sample_rows = 2
+  stats = connector.compute_table_stats("sales")
+  assert stats.row_count == 4 and stats.sampled_rows == 2 and not stats.first_rows
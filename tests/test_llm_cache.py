@@ -0,0 +1,83 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+from langchain_core.outputs import Generation
+
+from llms.llm_cache import CACHE_HIT_KEY, TieredLLMCache, shared_llm_cache
+
+
+def response(text):
+  return [Generation(text=text)]
+
+
+def stored_prompts(cache):
+  with sqlite3.connect(cache.path) as connection:
+    return connection.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+
+
+def test_writer_thread_persists_responses_for_other_caches(tmp_path):
+  path = str(tmp_path / "llm.db")
+  cache = TieredLLMCache(path)
+  cache.update("prompt", "llm", response("answer"))
+  assert cache.lookup("prompt", "llm")[0].generation_info[CACHE_HIT_KEY] == "memory"
+  cache.flush()
+  # Another process has an empty memory tier and reads the store.
+  hit = TieredLLMCache(path).lookup("prompt", "llm")
+  assert hit[0].text == "answer" and hit[0].generation_info[CACHE_HIT_KEY] == "store"
+
+
+def test_store_is_pruned_to_max_entries_oldest_first(tmp_path):
+  cache = TieredLLMCache(str(tmp_path / "llm.db"), memory_entries=1, max_entries=3)
+  for number in range(5):
+    cache.update(f"prompt {number}", "llm", response(str(number)))
+    time.sleep(0.01)
+  cache.flush()
+  assert stored_prompts(cache) == 3
+  assert cache.lookup("prompt 0", "llm") is None
+  assert cache.lookup("prompt 3", "llm")[0].text == "3"
+
+
+def test_expired_responses_are_not_served_and_pruned(tmp_path):
+  cache = TieredLLMCache(str(tmp_path / "llm.db"), ttl_seconds=0.05)
+  cache.update("prompt", "llm", response("answer"))
+  time.sleep(0.1)
+  assert cache.lookup("prompt", "llm") is None
+  cache.flush()
+  assert stored_prompts(cache) == 0
+
+
+def test_concurrent_lookups_and_updates(tmp_path):
+  cache = TieredLLMCache(str(tmp_path / "llm.db"), memory_entries=8)
+  for number in range(16):
+    cache.update(f"prompt {number}", "llm", response(str(number)))
+  cache.flush()
+  errors = []
+
+  def work(thread_number):
+    try:
+      for round_number in range(50):
+        number = (thread_number + round_number) % 16
+        assert cache.lookup(f"prompt {number}", "llm")[0].text == str(number)
+        cache.update(f"thread {thread_number}", "llm", response(str(round_number)))
+    except Exception as e:
+      errors.append(e)
+
+  threads = [threading.Thread(target=work, args=(number,)) for number in range(8)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  cache.flush()
+  assert errors == []
+  stats = cache.stats()
+  assert stats["memory_hits"] + stats["store_hits"] == 400 and stats["misses"] == 0
+  assert stored_prompts(cache) == 24
+
+
+def test_shared_cache_rejects_other_settings(tmp_path):
+  path = str(tmp_path / "llm.db")
+  assert shared_llm_cache(path, max_entries=10) is shared_llm_cache(path, max_entries=10)
+  with pytest.raises(ValueError, match="already open"):
+    shared_llm_cache(path, max_entries=20)
@@ -0,0 +1,50 @@
+import json
+import uuid
+
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.messages import AIMessage
+
+from agent import SQLAgent
+from agent_utils.perf_metrics import PerfCallbackHandler, PerfMetrics, sql_hash
+from config import Config
+
+QUESTION = "What are the top 5 billing countries by total invoice revenue?"
+
+
+def test_agent_run_exports_a_span_per_step(tmp_path):
+  config = Config.create_record_replay_custom_sqllite_with_chart(transcript_dir="benchmarks/transcripts")
+  config.llm.start_session("revenue_by_country")
+  metrics = PerfMetrics(jsonl_path=str(tmp_path / "spans.jsonl"))
+  SQLAgent(config).run(QUESTION, callbacks=[PerfCallbackHandler(metrics, run_label="revenue")])
+
+  with open(tmp_path / "spans.jsonl") as file:
+    spans = [json.loads(line) for line in file]
+  assert [span["kind"] for span in spans] == ["llm", "tool", "llm", "tool", "llm", "run"]
+  assert all(span["run_label"] == "revenue" and span["duration_s"] >= 0 for span in spans)
+  run = spans[-1]
+  assert run["question"] == QUESTION and run["iterations"] == 2
+  assert run["root_run_id"] and all(span["root_run_id"] == run["root_run_id"] for span in spans)
+  for llm in (span for span in spans if span["kind"] == "llm"):
+    assert llm["prompt_tokens"] > 0 and llm["completion_tokens"] > 0 and llm["tokens_estimated"]
+  query = spans[3]
+  assert query["name"] == "query_database" and query["rows"] == 5 and query["error"] is None
+  recorded_sql = config.llm._load_calls()[1]["response"].split("Action Input:")[1]
+  assert query["sql_hash"] == sql_hash(recorded_sql)
+
+  prometheus = metrics.prometheus_text()
+  assert 'sql_agent_span_seconds_count{kind="llm",name="RecordReplayLLM"} 3' in prometheus
+  assert 'sql_agent_rows_total{kind="tool",name="query_database"} 5' in prometheus
+  assert metrics.report().splitlines()[0].startswith("kind | name | count")
+
+
+def test_provider_token_usage_replaces_the_estimate():
+  metrics = PerfMetrics()
+  handler = PerfCallbackHandler(metrics)
+  run_id = uuid.uuid4()
+  handler.on_llm_start({"name": "llm"}, ["a prompt"], run_id=run_id)
+  handler.on_llm_end(LLMResult(generations=[[ChatGeneration(message=AIMessage(content="an answer"))]],
+                               llm_output={"token_usage": {"prompt_tokens": 12, "completion_tokens": 3}}),
+                     run_id=run_id)
+  prometheus = metrics.prometheus_text()
+  assert 'sql_agent_prompt_tokens_total{kind="llm",name="llm"} 12' in prometheus
+  assert 'sql_agent_completion_tokens_total{kind="llm",name="llm"} 3' in prometheus
@@ -0,0 +1,44 @@
+import json
+import os
+
+from langchain_core.agents import AgentAction
+
+from agent_utils.plan_cache import PlanCache
+
+
+def steps(sql):
+  return [(AgentAction(tool="query_database", tool_input=sql, log=""), "[(1,)]")]
+
+
+def test_plan_matches_other_values():
+  cache = PlanCache()
+  cache.record("albums by Queen", steps("SELECT Title FROM Album WHERE Name = 'Queen'"), 1)
+  assert cache.lookup("albums by AC/DC", 1) == "SELECT Title FROM Album WHERE Name = 'AC/DC'"
+  assert cache.lookup("tracks by AC/DC", 1) is None
+  assert cache.lookup("albums by AC/DC", 2) is None
+
+
+def test_plan_starting_with_a_slot_is_always_tried():
+  cache = PlanCache()
+  cache.record("Queen albums", steps("SELECT Title FROM Album WHERE Name = 'Queen'"), 1)
+  assert cache.lookup("Abba albums", 1) == "SELECT Title FROM Album WHERE Name = 'Abba'"
+
+
+def test_least_recently_used_plans_are_evicted():
+  cache = PlanCache(max_plans=2)
+  cache.record("albums by Queen", steps("SELECT 1 FROM Album WHERE Name = 'Queen'"), 1)
+  cache.record("tracks by Queen", steps("SELECT 2 FROM Track WHERE Name = 'Queen'"), 1)
+  assert cache.lookup("albums by Abba", 1) is not None
+  cache.record("genres by Queen", steps("SELECT 3 FROM Genre WHERE Name = 'Queen'"), 1)
+  assert cache.lookup("albums by Abba", 1) is not None
+  assert cache.lookup("tracks by Abba", 1) is None
+  assert cache.lookup("genres by Abba", 1) is not None
+
+
+def test_plans_are_persisted_without_leftover_files(tmp_path):
+  path = str(tmp_path / "plans.json")
+  cache = PlanCache(path=path)
+  cache.record("albums by Queen", steps("SELECT Title FROM Album WHERE Name = 'Queen'"), 1)
+  assert os.listdir(tmp_path) == ["plans.json"]
+  assert len(json.load(open(path))) == 1
+  assert PlanCache(path=path).lookup("albums by Abba", 1) == "SELECT Title FROM Album WHERE Name = 'Abba'"
@@ -0,0 +1,38 @@
+from db_connector.result_cache import ResultCache, normalize_sql, shared_result_cache
+
+
+def test_normalize_sql_collapses_whitespace_comments_and_keyword_case():
+  assert normalize_sql("select Name\n  from   Track -- all tracks\nwhere TrackId = 1;") == \
+         "SELECT Name FROM Track WHERE TrackId = 1"
+
+
+def test_normalize_sql_keeps_string_literals():
+  assert normalize_sql("SELECT 'A  B' AS v") != normalize_sql("SELECT 'A B' AS v")
+  assert normalize_sql("SELECT 'Rock' AS v") != normalize_sql("SELECT 'rock' AS v")
+
+
+def test_normalize_sql_keeps_aliases_and_quoted_identifiers():
+  assert normalize_sql("SELECT Name AS TrackName FROM Track") != normalize_sql("SELECT Name AS trackname FROM Track")
+  assert normalize_sql('SELECT "My  Col" FROM t') == 'SELECT "My  Col" FROM t'
+
+
+def test_normalize_sql_keeps_select_lists_as_written():
+  # Keywords used as aliases and unaliased expressions name the result columns.
+  assert normalize_sql("SELECT d AS Year FROM t") != normalize_sql("SELECT d AS year FROM t")
+  assert normalize_sql("SELECT count(*) FROM t") != normalize_sql("SELECT COUNT(*) FROM t")
+  assert normalize_sql("select * from (select d  AS Year from t) as x order by 1") == \
+         "SELECT * FROM (SELECT d  AS Year FROM t) AS x ORDER BY 1"
+
+
+def test_result_cache_drops_entries_on_new_data_version():
+  cache = ResultCache(max_bytes=100, ttl_seconds=60)
+  cache.put("q", 1, "result", 10)
+  assert cache.get("q", 1) == "result"
+  assert cache.get("q", 2) is None
+
+
+def test_shared_result_cache_is_keyed_on_its_settings():
+  cache = shared_result_cache("sqlite:///settings.db", max_bytes=100, ttl_seconds=60)
+  assert shared_result_cache("sqlite:///settings.db", max_bytes=100, ttl_seconds=60) is cache
+  other = shared_result_cache("sqlite:///settings.db", max_bytes=200, ttl_seconds=60)
+  assert other is not cache and other.max_bytes == 200
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from agent_utils.extra_tools import parse_to_df_and_code
+from db_connector.result_format import BoundedResult
+from db_connector.result_store import result_store_scope
+
+CHART = "<df>{}</df>\n<chart>```python\nhtml_str = str(len(df))\n```</chart>"
+
+
+def test_charts_of_truncated_results_are_drawn_from_the_refetched_rows():
+  refetches = []
+
+  def refetch():
+    refetches.append(1)
+    return BoundedResult(df=pd.DataFrame({"x": range(50)}))
+
+  with result_store_scope() as store:
+    handle = store.put(BoundedResult(df=pd.DataFrame({"x": range(10)}), truncated=True, total_rows=50),
+                       "SELECT x FROM t", refetch)
+    df, code, warning = parse_to_df_and_code(CHART.format(handle))
+    assert len(df) == 50 and warning is None
+    assert len(store.chart_data(handle).df) == 50 and len(refetches) == 1
+    assert len(store.get(handle)) == 50
+
+
+def test_charts_of_results_that_stay_truncated_warn():
+  with result_store_scope() as store:
+    handle = store.put(BoundedResult(df=pd.DataFrame({"x": range(10)}), truncated=True, min_total_rows=100),
+                       "SELECT x FROM t")
+    df, code, warning = parse_to_df_and_code(CHART.format(handle))
+  assert len(df) == 10 and code == "html_str = str(len(df))"
+  assert warning.startswith(f"Warning: the chart only shows the first 10 of more than 100 rows of {handle}")
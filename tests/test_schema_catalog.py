@@ -0,0 +1,35 @@
+import shutil
+
+from config import EXAMPLE
+from db_connector.schema_catalog import SchemaCatalog
+from db_connector.sqllite_connector import SQLLiteConnector
+
+
+def test_query_memo_evicts_least_recently_used_entries():
+  catalog = SchemaCatalog(max_query_memo_entries=2)
+  catalog.memo_put(('preflight', "SELECT 1"), 1, "", per_query=True)
+  catalog.memo_put(('preflight', "SELECT 2"), 1, "", per_query=True)
+  assert catalog.memo_get(('preflight', "SELECT 1"), 1, per_query=True) == ""
+  catalog.memo_put(('preflight', "SELECT 3"), 1, "", per_query=True)
+  assert catalog.memo_get(('preflight', "SELECT 1"), 1, per_query=True) == ""
+  assert catalog.memo_get(('preflight', "SELECT 2"), 1, per_query=True) is None
+  assert catalog.memo_get(('preflight', "SELECT 3"), 1, per_query=True) == ""
+
+
+def test_memo_is_stale_at_another_version():
+  catalog = SchemaCatalog()
+  catalog.memo_put(('table_stats', "Track"), 1, "stats")
+  assert catalog.memo_get(('table_stats', "Track"), 2) is None
+  assert catalog.memo_get(('table_stats', "Track"), 1) == "stats"
+
+
+def test_preflight_outcomes_do_not_evict_the_indexes(tmp_path):
+  path = tmp_path / "Chinook.db"
+  shutil.copy(EXAMPLE.db_url.removeprefix("sqlite:///"), path)
+  connector = SQLLiteConnector.create(db_url=f"sqlite:///{path}", table_stats_enabled=False)
+  connector.catalog.max_query_memo_entries = 5
+  value_index, schema_index = connector.value_index(), connector.schema_index()
+  for number in range(20):
+    connector.checked_preflight(f"SELECT {number} FROM Artist")
+  assert connector.value_index() is value_index
+  assert connector.schema_index() is schema_index
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from config import EXAMPLE
+from db_connector.schema_catalog import ColumnInfo, TableInfo
+from db_connector.schema_index import SchemaIndex, tokenize
+from db_connector.sqllite_connector import SQLLiteConnector
+
+
+def table(name, *columns):
+  return TableInfo(name=name, columns=[ColumnInfo(name=column, type="TEXT", nullable=True, primary_key=False)
+                                       for column in columns])
+
+
+def test_tokenize_splits_camel_case_and_stems_plurals():
+  assert tokenize("BillingCountry of the tracks") == ["billingcountry", "billing", "country", "track"]
+
+
+def test_search_ranks_by_names_and_matches_typos():
+  index = SchemaIndex.build({"Invoice": table("Invoice", "BillingCountry", "Total"),
+                             "Track": table("Track", "Name", "Composer"),
+                             "Album": table("Album", "Title")})
+  assert index.search("total invoices per billing country", k=2)[0][0] == "Invoice"
+  assert index.search("which composser wrote the most trakcs", k=1)[0][0] == "Track"
+
+
+def test_samples_are_added_and_replaced_per_table():
+  index = SchemaIndex.build({"Artist": table("Artist", "Name"), "Genre": table("Genre", "Name")})
+  assert index.search("queen", k=2) == []
+  index.set_samples("Artist", pd.DataFrame({"Name": ["Queen", None]}))
+  assert [name for name, _ in index.search("queen", k=2)] == ["Artist"]
+  index.set_samples("Artist", pd.DataFrame({"Name": ["Accept"]}))
+  assert index.search("queen", k=2) == []
+
+
+def test_connector_indexes_sample_rows_when_they_are_fetched():
+  connector = SQLLiteConnector.create(db_url=EXAMPLE.db_url, table_stats_enabled=False)
+  connector.sample_rows("Artist", 3)
+  assert connector.relevant_tables("songs of AC/DC")[0] == "Artist"
+  assert connector.catalog.memo_get(('schema_index',), connector.catalog.version) is connector.schema_index()
@@ -0,0 +1,27 @@
+from langchain_core.agents import AgentAction
+
+from agent_utils.scratchpad import MIN_OBSERVATION_CHARS, compact_steps
+
+
+def step(tool, tool_input, observation):
+  return AgentAction(tool=tool, tool_input=tool_input, log=f"Action: {tool}"), observation
+
+
+def test_recent_observations_are_kept_verbatim_over_budget():
+  steps = [step("query_database", "SELECT 1", "a" * 4000),
+           step("list_table_names", "", "b" * 4000),
+           step("query_database", "SELECT 2", "c" * 4000)]
+  compacted = compact_steps(steps, token_budget=100, keep_recent=2)
+  assert compacted[1][1] == "b" * 4000 and compacted[2][1] == "c" * 4000
+  assert compacted[0][1].startswith("a" * MIN_OBSERVATION_CHARS)
+  assert len(compacted[0][1]) < MIN_OBSERVATION_CHARS + 100
+
+
+def test_old_observations_are_truncated_oldest_first():
+  steps = [step("list_table_names", "", "a" * 4000),
+           step("list_table_names", "", "b" * 4000),
+           step("list_table_names", "", "c" * 100)]
+  compacted = compact_steps(steps, token_budget=1300, keep_recent=1)
+  assert len(compacted[0][1]) < 1200
+  assert compacted[1][1].startswith("b" * 3900)
+  assert compacted[2][1] == "c" * 100
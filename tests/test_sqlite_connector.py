@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from config import EXAMPLE
+from db_connector.abstract_sql_connector import QueryTimeoutError
+from db_connector.sqllite_connector import SQLLiteConnector
+
+
+@pytest.fixture(scope="module")
+def connector():
+  return SQLLiteConnector.create(db_url=EXAMPLE.db_url, result_cache_enabled=False, table_stats_enabled=False)
+
+
+def test_fetch_bounded_counts_truncated_results(connector):
+  result = connector.fetch_bounded("SELECT * FROM Track", max_rows=10)
+  assert result.truncated and len(result.df) == 10
+  assert result.total_rows == 3503
+
+
+def test_fetch_bounded_caps_the_count(connector):
+  connector.count_rows_limit = 100
+  try:
+    result = connector.fetch_bounded("SELECT * FROM Track", max_rows=10)
+  finally:
+    connector.count_rows_limit = 10_000
+  assert result.total_rows is None and result.min_total_rows == 100
+  assert "of more than 100 rows" in result.render()
+
+
+def test_fetch_bounded_keeps_an_explicit_zero(connector):
+  result = connector.fetch_bounded("SELECT * FROM Track", max_rows=0)
+  assert result.truncated and len(result.df) == 0
+  assert list(result.df.columns)[:2] == ["TrackId", "Name"]
+
+
+def test_count_rows_with_limit(connector):
+  assert connector.count_rows("SELECT * FROM Track;") == 3503
+  assert connector.count_rows("SELECT * FROM Track", limit=50) == 51
+  assert connector.count_rows("SELECT * FROM Track LIMIT 5", limit=50) == 5
+
+
+def test_check_query_cost_resolves_aliases(connector):
+  connector.cost_guard_min_rows = 1000
+  try:
+    warnings = connector.check_query_cost("SELECT t.Name FROM Track t JOIN Album AS a ON a.AlbumId = t.AlbumId")
+  finally:
+    connector.cost_guard_min_rows = 100_000
+  assert warnings == ["full scan of Track (~3503 rows) without an index"]
+
+
+def test_queries_share_the_deadline(connector):
+  connector.query_timeout_ms = 50
+  try:
+    with connector.shared_deadline():
+      time.sleep(0.1)
+      with pytest.raises(QueryTimeoutError):
+        connector.query("SELECT SUM(Milliseconds) FROM Track")
+    assert connector.query("SELECT COUNT(*) FROM Track").iloc[0, 0] == 3503
+  finally:
+    connector.query_timeout_ms = 30_000
+
+
+def test_query_arrow_reads_mixed_columns_as_strings(connector):
+  pytest.importorskip("pyarrow")
+  table = connector.query_arrow("SELECT 1 AS v UNION ALL SELECT 'a' UNION ALL SELECT NULL", chunk_size=2)
+  assert table.column("v").to_pylist() == ["1", "a", None]
+  assert connector.query_arrow("SELECT TrackId, Name FROM Track").num_rows == 3503
@@ -0,0 +1,26 @@
+import json
+import subprocess
+import sys
+
+# Modules only the factories, agents or connectors in use should load.
+HEAVY_MODULES = ["langchain.agents", "langchain_community.agent_toolkits.sql", "openai", "langchain_openai",
+                 "anthropic", "langchain_anthropic", "duckdb", "pandas", "sqlalchemy", "db_connector"]
+
+
+def loaded_modules(statement: str) -> list[str]:
+  """The heavy modules loaded by the statement in a fresh interpreter."""
+  code = f"import json, sys\n{statement}\nprint(json.dumps(sorted(sys.modules)))"
+  modules = json.loads(subprocess.run([sys.executable, "-c", code], check=True, capture_output=True,
+                                      text=True).stdout.splitlines()[-1])
+  return [module for module in modules if any(module == heavy or module.startswith(heavy + ".")
+                                              for heavy in HEAVY_MODULES)]
+
+
+def test_importing_config_loads_no_provider_toolkit_or_connector():
+  assert loaded_modules("import config") == []
+
+
+def test_factory_loads_only_its_own_provider_and_connector():
+  modules = loaded_modules("import config\nconfig.Config.create_record_replay_custom_sqllite_with_chart('/tmp')")
+  assert "db_connector.sqllite_connector" in modules
+  assert not [module for module in modules if module.startswith(("openai", "langchain_openai", "anthropic", "duckdb"))]
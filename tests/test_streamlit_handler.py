@@ -0,0 +1,49 @@
+import pytest
+
+from config import EXAMPLE
+from db_connector.result_store import result_store_scope
+from db_connector.sqllite_connector import SQLLiteConnector
+from streamlit_lib.streamlit_handler import DISPLAY_MAX_ROWS, format_output_str_based_on_tool
+
+
+@pytest.fixture(scope="module")
+def connector():
+  return SQLLiteConnector.create(db_url=EXAMPLE.db_url, result_cache_enabled=False, table_stats_enabled=False)
+
+
+def test_query_output_is_rendered_from_the_stored_rows(connector):
+  with result_store_scope():
+    output = connector.guarded_fetch("SELECT GenreId, Name FROM Genre ORDER BY GenreId")
+    html = format_output_str_based_on_tool("query_database", output)
+  assert "Result handle" not in html and "<table" in html
+  assert html.count("<tr>") == 25 and "<td>Rock</td>" in html
+
+
+def test_large_results_show_the_total_row_count(connector):
+  with result_store_scope():
+    html = format_output_str_based_on_tool("query_database", connector.guarded_fetch("SELECT * FROM Track"))
+  assert html.count("<tr>") == DISPLAY_MAX_ROWS
+  assert html.endswith(f"*Showing {DISPLAY_MAX_ROWS} of 3503 rows.*")
+
+
+def test_cost_guard_warnings_are_kept_above_the_table(connector, monkeypatch):
+  monkeypatch.setattr(connector, "cost_guard_min_rows", 1000)
+  with result_store_scope():
+    html = format_output_str_based_on_tool("query_database", connector.guarded_fetch("SELECT * FROM Track"))
+  assert html.startswith("Warning: full scan of Track")
+  assert "<table" in html
+
+
+def test_outputs_without_a_stored_result_are_rendered_as_text(connector):
+  output = connector.guarded_fetch("SELECT Name FROM Genre WHERE GenreId = 1")
+  assert format_output_str_based_on_tool("query_database", output) == output
+  with result_store_scope():
+    assert format_output_str_based_on_tool("query_database", "Result handle: result_9 (0 rows)") == \
+           "Result handle: result_9 (0 rows)"
+
+
+def test_chart_output_is_rendered_from_the_stored_chart():
+  with result_store_scope() as store:
+    handle = store.put_chart("<img src='chart'>", "html_str = ...")
+    html = format_output_str_based_on_tool("visualize_data", f"Chart handle: {handle}. The chart was rendered.")
+  assert "<img src='chart'>" in html and "Chart handle" not in html
@@ -0,0 +1,34 @@
+import pytest
+
+from config import EXAMPLE
+from db_connector.sqllite_connector import SQLLiteConnector
+
+
+@pytest.fixture
+def connector():
+  return SQLLiteConnector.create(db_url=EXAMPLE.db_url, table_stats_enabled=False)
+
+
+def test_small_tables_are_read_in_full(connector):
+  stats = connector.compute_table_stats("Genre")
+  assert stats.row_count == stats.sampled_rows == 25
+  assert stats.render().splitlines()[0] == "Rows: 25"
+  assert stats.render().splitlines()[1] == "  GenreId: 25 distinct, min 1, max 25"
+
+
+def test_large_tables_are_sampled_across_the_table(connector):
+  connector.stats_sample_rows = 1000
+  stats = connector.compute_table_stats("Track")
+  assert stats.row_count == 3503 and stats.sampled_rows == 875 and not stats.first_rows
+  track_id = stats.columns[0]
+  # Every 4th rowid, the first rows only would end at 1000.
+  assert (track_id.min, track_id.max) == ("4", "3500")
+  assert stats.render().startswith("Rows: 3503, column statistics from a sample of 875 rows\n  TrackId: ~875 distinct")
+
+
+def test_connectors_without_sampling_say_they_read_the_first_rows(connector, monkeypatch):
+  monkeypatch.setattr(SQLLiteConnector, "sample_query", lambda self, table, rows, row_count: None)
+  connector.stats_sample_rows = 1000
+  stats = connector.compute_table_stats("Track")
+  assert stats.first_rows and stats.sampled_rows == 1000
+  assert "column statistics from the first 1000 rows" in stats.render()
@@ -0,0 +1,46 @@
+import shutil
+
+import pytest
+
+from config import EXAMPLE
+from db_connector.sqllite_connector import SQLLiteConnector
+from db_connector.value_index import ValueIndex
+
+
+@pytest.fixture
+def db_url(tmp_path):
+  path = tmp_path / "Chinook.db"
+  shutil.copy(EXAMPLE.db_url.removeprefix("sqlite:///"), path)
+  return f"sqlite:///{path}"
+
+
+def test_lookup_finds_exact_and_close_values(db_url):
+  connector = SQLLiteConnector.create(db_url=db_url, table_stats_enabled=False)
+  matches = connector.value_index().lookup("ac-dc")
+  assert (matches[0].table, matches[0].column, matches[0].value, matches[0].score) == ("Artist", "Name", "AC/DC", 1.0)
+  assert connector.value_index().lookup("Sao Paolo")[0].value == "São Paulo"
+
+
+def test_persisted_index_is_reused_by_a_new_process(db_url, tmp_path, monkeypatch):
+  path = str(tmp_path / "cache" / "value_index.json")
+  connector = SQLLiteConnector.create(db_url=db_url, value_index_path=path, table_stats_enabled=False)
+  connector.value_index()
+  assert ValueIndex.parse_file(path).file_version == list(connector.file_version())
+
+  # A new process has a catalog of its own and reads a different PRAGMA data_version.
+  connector.catalog.invalidate()
+  data_version = SQLLiteConnector.data_version
+  monkeypatch.setattr(SQLLiteConnector, "data_version", lambda self: (-1, *data_version(self)[1:]))
+
+  def distinct_values(self, table, column, limit):
+    raise AssertionError("the persisted index should not be refreshed")
+
+  monkeypatch.setattr(SQLLiteConnector, "distinct_values", distinct_values)
+  assert connector.value_index().lookup("Queen")[0].value == "Queen"
+
+
+def test_unwritable_index_path_keeps_the_index_in_memory(db_url, tmp_path):
+  (tmp_path / "not_a_directory").write_text("")
+  connector = SQLLiteConnector.create(db_url=db_url, value_index_path=str(tmp_path / "not_a_directory" / "index.json"),
+                                      table_stats_enabled=False)
+  assert connector.value_index().lookup("Queen")[0].value == "Queen"